@@ -0,0 +1,651 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import heapq
+import itertools
+import math
+import multiprocessing
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Networks up to this number of nodes are solved with dense linear algebra, larger ones with sparse solvers
+DENSE_LIMIT = 500
+
+CENTRALITY_ENGINES = ('sparse', 'networkx')
+centrality_engine = 'sparse' # Engine used by Network.networkx_ranking, see set_centrality_engine()
+
+
+def set_centrality_engine(engine):
+    """ Sets the engine for the centralities in Network.networkx_ranking: 'sparse' (this module) or 'networkx'
+
+    """
+    global centrality_engine
+    if not engine in CENTRALITY_ENGINES:
+        raise ValueError('unknown centrality engine: ' + str(engine))
+    centrality_engine = engine
+
+
+def get_centrality_engine():
+    return centrality_engine
+
+
+
+centrality_approximation = None # Settings of approximate betweenness and closeness, None for exact scores, see set_centrality_approximation()
+
+
+def set_centrality_approximation(sample_size=None, epsilon=None, seed=0):
+    """ Switches approximate betweenness and closeness in Network.networkx_ranking on (see approximate_shortest_path_centralities)
+    or off (no sample_size and no epsilon)
+
+    Arguments:
+        sample_size: number of source nodes (pivots) from which shortest paths are searched
+        epsilon: target error of the scores, used to choose the sample size if sample_size is not given
+        seed: seed of the random sample, so that runs can be repeated
+
+    """
+    global centrality_approximation
+    if sample_size is None and epsilon is None:
+        centrality_approximation = None
+    else:
+        centrality_approximation = {'sample_size': sample_size, 'epsilon': epsilon, 'seed': seed}
+
+
+def get_centrality_approximation():
+    return centrality_approximation
+
+
+
+betweenness_workers = multiprocessing.cpu_count() # Number of worker processes for betweenness and closeness of large networks
+betweenness_threshold = 1000 # Networks with at least this number of nodes are computed by the worker processes
+
+
+def set_betweenness_workers(workers, threshold=None):
+    """ Sets the number of worker processes among which the source nodes of betweenness and closeness are divided
+    (see shortest_path_centralities), and the number of nodes from which on they are used
+
+    """
+    global betweenness_workers, betweenness_threshold
+    betweenness_workers = workers
+    if threshold is not None:
+        betweenness_threshold = threshold
+
+
+
+
+# 2. ADJACENCY
+
+def adjacency_matrix(nodes, edges):
+    """ Builds the symmetric weighted adjacency matrix (CSR) of an undirected network
+
+    Arguments:
+        nodes: list of node names, the order of the rows and columns
+        edges: list of tuples (source, target, weight); when an edge is listed twice (in either direction),
+            the last weight counts, just as with networkx Graph.add_weighted_edges_from
+
+    """
+
+    index = {}
+    for nr, node in enumerate(nodes):
+        index[node] = nr
+
+    weights = {}
+    for source, target, weight in edges:
+        i = index[source]
+        j = index[target]
+        if i > j:
+            i, j = j, i
+        weights[(i, j)] = weight
+
+    rows = []
+    columns = []
+    data = []
+    for (i, j), weight in weights.items():
+        rows.append(i)
+        columns.append(j)
+        data.append(weight)
+        if i != j:
+            rows.append(j)
+            columns.append(i)
+            data.append(weight)
+
+    n = len(nodes)
+    return scipy.sparse.csr_matrix((np.array(data, dtype=float), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))), shape=(n, n))
+
+
+
+
+# 3. CENTRALITY MEASURES
+
+def degree_centrality(nodes, adjacency):
+    """ Unweighted degree divided by n-1, as nx.degree_centrality (a self-loop counts twice)
+
+    """
+
+    n = len(nodes)
+    if n <= 1:
+        return {node: 1 for node in nodes}
+    structure = adjacency.copy()
+    structure.data = np.ones_like(structure.data)
+    degrees = np.asarray(structure.sum(axis=1)).ravel() + structure.diagonal()
+    scale = 1.0 / (n - 1)
+    return dict(zip(nodes, (degrees * scale).tolist()))
+
+
+
+def eigenvector_centrality(nodes, adjacency):
+    """ Weighted eigenvector centrality, as nx.eigenvector_centrality_numpy: the eigenvector of the largest eigenvalue,
+    scaled to unit length and with a positive sum
+
+    Small networks are solved with a dense symmetric eigensolver, larger ones with a sparse one (ARPACK)
+
+    Output:
+        (eigenvector_dict, spectral_radius)
+
+    """
+
+    n = len(nodes)
+    if n == 0:
+        return {}, 0.0
+
+    if adjacency.nnz == 0: # Every vector is an eigenvector, take the uniform one
+        return dict(zip(nodes, [1.0 / np.sqrt(n)] * n)), 0.0
+
+    if n <= DENSE_LIMIT:
+        eigenvalues, eigenvectors = np.linalg.eigh(adjacency.toarray())
+        spectral_radius = eigenvalues[-1]
+        largest = eigenvectors[:, -1]
+    else:
+        eigenvalues, eigenvectors = scipy.sparse.linalg.eigsh(adjacency, k=1, which='LA')
+        spectral_radius = eigenvalues[0]
+        largest = eigenvectors[:, 0]
+
+    norm = np.sign(largest.sum()) * np.linalg.norm(largest)
+    if norm == 0:
+        norm = np.linalg.norm(largest)
+    return dict(zip(nodes, (largest / norm).tolist())), float(spectral_radius)
+
+
+
+def katz_alpha(spectral_radius, alpha=0.1):
+    """ Chooses the attenuation factor of Katz centrality
+
+    The Katz series only converges for alpha < 1/spectral_radius. The networkx default (0.1) is kept when it converges,
+    so the results equal nx.katz_centrality; otherwise alpha is set to 90% of the limit.
+
+    """
+
+    if spectral_radius > 0 and alpha >= 1.0 / spectral_radius:
+        return 0.9 / spectral_radius
+    return alpha
+
+
+
+def katz_centrality(nodes, adjacency, spectral_radius, alpha=0.1, beta=1.0):
+    """ Weighted Katz centrality, solved directly from (I - alpha A) x = beta instead of with power iteration,
+    and scaled to unit length (as nx.katz_centrality with normalized=True)
+
+    Output:
+        (katz_dict, alpha) with alpha the attenuation factor that was used (see katz_alpha)
+
+    """
+
+    n = len(nodes)
+    if n == 0:
+        return {}, alpha
+
+    alpha = katz_alpha(spectral_radius, alpha)
+    system = scipy.sparse.identity(n, format='csc') - alpha * adjacency.T.tocsc()
+    righthand = np.full(n, float(beta))
+
+    if n <= DENSE_LIMIT:
+        x = np.linalg.solve(system.toarray(), righthand)
+    else:
+        x = scipy.sparse.linalg.spsolve(system, righthand)
+
+    norm = np.linalg.norm(x)
+    if norm == 0:
+        norm = 1.0
+    return dict(zip(nodes, (x / norm).tolist())), alpha
+
+
+
+def batch_eigenvectors(adjacencies):
+    """ Computes the largest eigenvalue and its eigenvector (as eigenvector_centrality) of many small adjacency matrices at once
+
+    The matrices are padded with zeros to a common size per group (powers of two) and stacked, so that every group is solved
+    with one batched call of the dense symmetric eigensolver (matrices larger than DENSE_LIMIT are solved one by one). Padding adds isolated nodes, which do not change the largest
+    eigenvalue nor (with zeros on the padded nodes) its eigenvector.
+
+    Output:
+        list of (eigenvector as array, spectral_radius) in the order of adjacencies
+
+    """
+
+    results = [None] * len(adjacencies)
+    groups = {}
+    for nr, adjacency in enumerate(adjacencies):
+        n = adjacency.shape[0]
+        if n == 0:
+            results[nr] = (np.zeros(0), 0.0)
+        elif adjacency.nnz == 0: # Every vector is an eigenvector, take the uniform one
+            results[nr] = (np.full(n, 1.0 / np.sqrt(n)), 0.0)
+        elif n > DENSE_LIMIT: # Large networks are solved one by one with the sparse eigensolver
+            eigenvector_dict, spectral_radius = eigenvector_centrality(list(range(n)), adjacency)
+            results[nr] = (np.array([eigenvector_dict[node] for node in range(n)]), spectral_radius)
+        else:
+            groups.setdefault(1 << (n - 1).bit_length(), []).append(nr)
+
+    for size, nrs in groups.items():
+        stack = np.zeros((len(nrs), size, size))
+        for position, nr in enumerate(nrs):
+            n = adjacencies[nr].shape[0]
+            stack[position, :n, :n] = adjacencies[nr].toarray()
+        eigenvalues, eigenvectors = np.linalg.eigh(stack) # Eigenvalues in ascending order, per matrix
+        for position, nr in enumerate(nrs):
+            n = adjacencies[nr].shape[0]
+            largest = eigenvectors[position, :n, -1]
+            norm = np.sign(largest.sum()) * np.linalg.norm(largest)
+            if norm == 0:
+                norm = np.linalg.norm(largest)
+            results[nr] = (largest / norm, float(eigenvalues[position, -1]))
+
+    return results
+
+
+
+def batch_centralities(networks, alpha=0.1, beta=1.0):
+    """ Computes degree, eigenvector and Katz centrality of many networks at once, e.g. of all books of the corpus
+
+    The adjacency matrices of all networks are stacked into one block-diagonal sparse matrix. Degree is computed for all nodes
+    in one go, the eigenvectors with batch_eigenvectors, and Katz with one sparse solve of the whole block-diagonal system, with
+    for every network its own alpha (see katz_alpha). The scores equal those of degree_centrality, eigenvector_centrality and
+    katz_centrality per network (up to rounding).
+
+    Arguments:
+        networks: list of (nodes, edges) per network, as for adjacency_matrix
+
+    Output:
+        list of dictionaries {'degree': degree_dict, 'eigenvector': eigenvector_dict, 'katz': katz_dict, 'alpha': alpha} per network
+
+    """
+
+    adjacencies = [adjacency_matrix(nodes, edges) for nodes, edges in networks]
+    sizes = np.array([len(nodes) for nodes, edges in networks], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    total = int(offsets[-1])
+
+    eigenvectors = batch_eigenvectors(adjacencies)
+    alphas = [katz_alpha(spectral_radius, alpha) for eigenvector, spectral_radius in eigenvectors]
+
+    results = [{'degree': {}, 'eigenvector': {}, 'katz': {}, 'alpha': networkalpha} for networkalpha in alphas]
+    if total == 0:
+        return results
+
+    blockdiagonal = scipy.sparse.block_diag([adjacency for adjacency in adjacencies if adjacency.shape[0] > 0], format='csr')
+
+    structure = blockdiagonal.copy()
+    structure.data = np.ones_like(structure.data)
+    degrees = np.asarray(structure.sum(axis=1)).ravel() + structure.diagonal()
+    nodesizes = np.repeat(sizes, sizes)
+    degrees = np.where(nodesizes > 1, degrees / np.maximum(nodesizes - 1, 1), 1.0) # A network of one node has degree 1, as with networkx
+
+    nodealphas = np.repeat(np.array(alphas), sizes)
+    system = scipy.sparse.identity(total, format='csc') - scipy.sparse.diags(nodealphas) @ blockdiagonal.T.tocsc()
+    katz = scipy.sparse.linalg.spsolve(system.tocsc(), np.full(total, float(beta)))
+    katz = np.atleast_1d(katz)
+
+    for nr, (nodes, edges) in enumerate(networks):
+        start = offsets[nr]
+        end = offsets[nr+1]
+        if start == end:
+            continue
+        networkkatz = katz[start:end]
+        norm = np.linalg.norm(networkkatz)
+        if norm == 0:
+            norm = 1.0
+        results[nr]['degree'] = dict(zip(nodes, degrees[start:end].tolist()))
+        results[nr]['eigenvector'] = dict(zip(nodes, eigenvectors[nr][0].tolist()))
+        results[nr]['katz'] = dict(zip(nodes, (networkkatz / norm).tolist()))
+
+    return results
+
+
+
+
+# 4. SHORTEST PATHS: BETWEENNESS AND CLOSENESS CENTRALITY
+
+def adjacency_lists(graph, weight='weight'):
+    """ Returns the neighbours of every node of a networkx Graph as a dictionary with node as key and a list of (neighbour, weight) as value
+
+    The order of nodes and neighbours is that of the Graph, so the shortest paths are searched in the same order as by networkx
+
+    """
+
+    adjacency = {}
+    for node, neighbours in graph.adjacency():
+        adjacency[node] = [(neighbour, edgedata.get(weight, 1)) for neighbour, edgedata in neighbours.items()]
+    return adjacency
+
+
+
+def single_source_dijkstra(adjacency, source):
+    """ Searches the weighted shortest paths from source to all other nodes (Dijkstra), keeping the number of shortest paths
+    and the predecessors of every node (as in Brandes' algorithm for betweenness)
+
+    Output:
+        S: list of reached nodes in order of increasing distance
+        P: dictionary with node as key and a list of its predecessors on shortest paths from source as value
+        sigma: dictionary with node as key and the number of shortest paths from source to the node as value
+        D: dictionary with node as key and the distance from source as value
+
+    """
+
+    S = []
+    P = {source: []}
+    sigma = {source: 1.0}
+    D = {}
+    seen = {source: 0}
+    counter = itertools.count() # Breaks ties between equal distances in the order in which nodes were found, as networkx does
+    Q = [(0, next(counter), source, source)]
+    while Q:
+        dist, _, pred, v = heapq.heappop(Q)
+        if v in D:
+            continue # Already searched this node
+        if v != source:
+            sigma[v] += sigma[pred] # Count paths
+        S.append(v)
+        D[v] = dist
+        for w, weight in adjacency[v]:
+            vw_dist = dist + weight
+            if not w in D and (not w in seen or vw_dist < seen[w]):
+                seen[w] = vw_dist
+                heapq.heappush(Q, (vw_dist, next(counter), v, w))
+                sigma[w] = 0.0
+                P[w] = [v]
+            elif vw_dist == seen[w]: # Another shortest path
+                sigma[w] += sigma[v]
+                P[w].append(v)
+    return S, P, sigma, D
+
+
+
+def dependencies(S, P, sigma):
+    """ Returns the dependencies of the source on all nodes it reaches (the accumulation step of Brandes' algorithm)
+
+    """
+
+    delta = dict.fromkeys(S, 0)
+    for w in reversed(S):
+        coefficient = (1 + delta[w]) / sigma[w]
+        for v in P[w]:
+            delta[v] += sigma[v] * coefficient
+    return delta
+
+
+
+def accumulate_dependencies(betweenness, S, P, sigma, source, squares=None):
+    """ Adds the dependencies of source on every other node to betweenness, and their squares to squares if given
+    (for the variance of sampled betweenness)
+
+    """
+
+    delta = dependencies(S, P, sigma)
+    for w in reversed(S):
+        if w != source:
+            betweenness[w] += delta[w]
+            if squares is not None:
+                squares[w] += delta[w] * delta[w]
+
+
+
+def closeness_from_distances(D, n):
+    """ Closeness centrality of a source node from its distances D to all nodes it reaches, with the correction for
+    disconnected networks of Wasserman and Faust (as nx.closeness_centrality with wf_improved=True)
+
+    """
+
+    total = sum(D.values())
+    if total > 0.0 and n > 1:
+        reached = len(D) - 1.0
+        return (reached / total) * (reached / (n - 1))
+    return 0.0
+
+
+
+def shortest_path_centralities(graph, weight='weight'):
+    """ Computes weighted betweenness and closeness centrality with one shortest path search from every node, instead of
+    one search per node for each of the two measures (as nx.betweenness_centrality and nx.closeness_centrality do)
+
+    The edge weights are used as distances by both measures, as in Network.networkx_ranking. Networks with at least
+    betweenness_threshold nodes are divided among betweenness_workers processes (see set_betweenness_workers), which
+    gives the same scores.
+
+    Arguments:
+        graph: networkx Graph object (undirected)
+        weight: the edge attribute with the distance
+
+    Output:
+        (betweenness_dict, closeness_dict), normalized as by networkx
+
+    """
+
+    adjacency = adjacency_lists(graph, weight)
+    n = len(adjacency)
+
+    if betweenness_workers > 1 and n >= betweenness_threshold and not multiprocessing.current_process().daemon:
+        betweenness, closeness = parallel_shortest_path_centralities(adjacency, betweenness_workers)
+    else:
+        betweenness = dict.fromkeys(adjacency, 0.0)
+        closeness = {}
+        for source in adjacency:
+            S, P, sigma, D = single_source_dijkstra(adjacency, source)
+            closeness[source] = closeness_from_distances(D, n)
+            accumulate_dependencies(betweenness, S, P, sigma, source)
+
+    if n > 2: # Divide by the number of pairs of other nodes, as nx.betweenness_centrality(normalized=True)
+        scale = 1 / ((n - 1) * (n - 2))
+        for node in betweenness:
+            betweenness[node] *= scale
+
+    return betweenness, closeness
+
+
+
+worker_adjacency = None # Adjacency lists of the network in a worker process of parallel_shortest_path_centralities
+worker_index = None
+
+
+def init_shortest_path_worker(adjacency):
+    """ Stores the network in a worker process once, instead of sending it with every part of the source nodes
+
+    """
+    global worker_adjacency, worker_index
+    worker_adjacency = adjacency
+    worker_index = {}
+    for nr, node in enumerate(adjacency):
+        worker_index[node] = nr
+
+
+
+def source_dependencies(sources):
+    """ Searches the shortest paths from a part of the source nodes in a worker process
+
+    Output:
+        (closeness, deltas) with closeness a list of the closeness of every source, and deltas an array with one row per source
+        holding its dependencies on all nodes (0 for the source itself and for nodes it does not reach)
+
+    """
+
+    n = len(worker_adjacency)
+    closeness = []
+    deltas = np.zeros((len(sources), n))
+    for row, source in enumerate(sources):
+        S, P, sigma, D = single_source_dijkstra(worker_adjacency, source)
+        closeness.append(closeness_from_distances(D, n))
+        delta = dependencies(S, P, sigma)
+        for w in S:
+            if w != source:
+                deltas[row, worker_index[w]] = delta[w]
+    return closeness, deltas
+
+
+
+def parallel_shortest_path_centralities(adjacency, workers):
+    """ Divides the source nodes of the shortest path searches of shortest_path_centralities among a pool of worker processes
+
+    The workers return the dependencies per source instead of their sums, and the main process adds them in the order of
+    the source nodes. Every score is therefore the sum of the same numbers in the same order as in the serial computation,
+    so the results are identical to it (and do not depend on the number of workers).
+
+    Output:
+        (betweenness, closeness), betweenness not yet normalized
+
+    """
+
+    nodes = list(adjacency)
+    n = len(nodes)
+    partsize = max(1, min(-(-n // (4 * workers)), (4 * 1024 * 1024) // n)) # At least 4 parts per worker, parts of at most 32 MB of dependencies
+    parts = [nodes[start:start+partsize] for start in range(0, n, partsize)]
+
+    betweenness = np.zeros(n)
+    closeness = {}
+    with ProcessPoolExecutor(workers, initializer=init_shortest_path_worker, initargs=(adjacency,)) as executor:
+        for sources, (partcloseness, deltas) in zip(parts, executor.map(source_dependencies, parts)):
+            for source, sourcecloseness, delta in zip(sources, partcloseness, deltas):
+                closeness[source] = sourcecloseness
+                betweenness += delta
+
+    return dict(zip(nodes, betweenness.tolist())), closeness
+
+
+
+
+
+# 5. APPROXIMATE BETWEENNESS AND CLOSENESS CENTRALITY
+
+def sample_size_for_error(n, epsilon, delta=0.1):
+    """ Number of pivots for which, with probability 1-delta, the sampled betweenness of all n nodes is within epsilon of the exact
+    (normalized) betweenness (Hoeffding's inequality with a union bound over the nodes), at most n (all nodes, the exact scores)
+
+    """
+
+    if n < 2:
+        return n # Nothing to sample
+    return min(int(math.ceil(math.log(2.0 * n / delta) / (2.0 * epsilon * epsilon))), n)
+
+
+
+def sample_standard_error(total, squares, m, population):
+    """ Standard error of the mean of a sample of m values (given their sum and sum of squares), drawn without replacement
+    from a population of the given size
+
+    """
+
+    if m < 2:
+        return float('nan') # A variance can not be estimated from one value
+    mean = total / m
+    variance = max(squares - m * mean * mean, 0.0) / (m - 1)
+    return math.sqrt(variance / m * (1.0 - m / population))
+
+
+
+def approximate_shortest_path_centralities(graph, sample_size=None, epsilon=None, weight='weight', seed=0):
+    """ Estimates weighted betweenness and closeness centrality from the shortest paths of a random sample of source nodes (pivots),
+    for networks that are too large for the exact scores of shortest_path_centralities
+
+    Betweenness of a node is estimated from the mean dependency of the pivots on it (Brandes and Pich 2007), closeness from the
+    share of pivots that reach it and their mean distance to it (Eppstein and Wang 2004), with the same correction for disconnected
+    networks as closeness_from_distances. The closeness of the pivots themselves is exact. When the sample contains all nodes,
+    the scores equal those of shortest_path_centralities.
+
+    Arguments:
+        graph: networkx Graph object (undirected)
+        sample_size: number of pivots
+        epsilon: target error, used to choose the number of pivots (see sample_size_for_error) if sample_size is None
+        weight: the edge attribute with the distance
+        seed: seed of the random sample of pivots
+
+    Output:
+        (betweenness_dict, closeness_dict, betweenness_error_dict, closeness_error_dict, sample_size), with the errors the
+        estimated standard errors of the scores (nan if they can not be estimated)
+
+    """
+
+    adjacency = adjacency_lists(graph, weight)
+    nodes = list(adjacency)
+    n = len(nodes)
+
+    if sample_size is None:
+        sample_size = sample_size_for_error(n, epsilon)
+    sample_size = max(sample_size, 2)
+
+    if sample_size >= n:
+        betweenness, closeness = shortest_path_centralities(graph, weight)
+        return betweenness, closeness, dict.fromkeys(nodes, 0.0), dict.fromkeys(nodes, 0.0), n
+
+    pivots = random.Random(seed).sample(nodes, sample_size)
+
+    dependencies = dict.fromkeys(nodes, 0.0)
+    dependencies_squares = dict.fromkeys(nodes, 0.0)
+    reached = dict.fromkeys(nodes, 0) # Number of pivots that reach a node
+    distances = dict.fromkeys(nodes, 0.0)
+    distances_squares = dict.fromkeys(nodes, 0.0)
+    closeness = {}
+
+    for pivot in pivots:
+        S, P, sigma, D = single_source_dijkstra(adjacency, pivot)
+        closeness[pivot] = closeness_from_distances(D, n) # Exact
+        accumulate_dependencies(dependencies, S, P, sigma, pivot, dependencies_squares)
+        for node, distance in D.items():
+            if node != pivot:
+                reached[node] += 1
+                distances[node] += distance
+                distances_squares[node] += distance * distance
+
+    pivotset = set(pivots)
+    population = n - 1 # Every node can be reached from the n-1 other nodes
+    scale = 1.0 / (n - 2) # The exact betweenness is the mean dependency of the other nodes on a node, divided by the n-2 possible targets
+    betweenness = {}
+    betweenness_error = {}
+    closeness_error = {}
+
+    for node in nodes:
+        m = sample_size - 1 if node in pivotset else sample_size # Number of pivots other than the node itself
+        betweenness[node] = dependencies[node] / m * scale
+        betweenness_error[node] = sample_standard_error(dependencies[node], dependencies_squares[node], m, population) * scale
+
+        if node in pivotset:
+            closeness_error[node] = 0.0
+            continue
+
+        """ closeness = p*p/mu, with p the share of the other nodes that reach the node and mu the mean distance of the other
+        nodes to the node (0 for nodes that do not reach it); its standard error follows from those of p and mu (delta method)
+
+        """
+        p = reached[node] / m
+        mu = distances[node] / m
+        if mu == 0:
+            closeness[node] = 0.0
+            closeness_error[node] = 0.0 if reached[node] == m else float('nan') # No pivot reaches the node
+            continue
+        closeness[node] = p * p / mu
+        if m < 2:
+            closeness_error[node] = float('nan')
+            continue
+        correction = m / (m - 1.0)
+        variance_p = p * (1 - p) * correction
+        variance_mu = max(distances_squares[node] / m - mu * mu, 0.0) * correction
+        covariance = (mu - p * mu) * correction # The distance of a pivot is 0 when it does not reach the node
+        gradient_p = 2 * p / mu
+        gradient_mu = -p * p / (mu * mu)
+        variance = gradient_p * gradient_p * variance_p + gradient_mu * gradient_mu * variance_mu + 2 * gradient_p * gradient_mu * covariance
+        closeness_error[node] = math.sqrt(max(variance, 0.0) / m * (1.0 - m / population))
+
+    return betweenness, closeness, betweenness_error, closeness_error, sample_size
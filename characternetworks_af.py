@@ -17,6 +17,7 @@ from networkx.algorithms.community import k_clique_communities
 import matplotlib.pyplot as plt
 import re
 import pandas as pd
+import numpy as np
 import os
 import glob
 import sys
@@ -24,12 +25,88 @@ import errno
 import csv
 import math
 from operator import itemgetter
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left
 #import community
-import ucto 
 import codecs
+import io
+import locale
+import mmap
+from namematcher_af import NameVariantMatcher
+from tokenizer_af import get_tokenizer_pool, tokenizer_fingerprint
+from tokencache_af import get_sentence_cache, set_sentence_cache
+from sparseweights_af import WeightMatrix, RelationMatrix
+from networkstats_af import ASSORTATIVITY_ATTRIBUTES, network_statistics
+from communities_af import DISTRIBUTION_CATEGORIES, run_algorithms, community_distributions
+from centrality_af import CENTRALITY_ENGINES, get_centrality_engine, adjacency_matrix, degree_centrality, eigenvector_centrality, katz_centrality, shortest_path_centralities, \
+    get_centrality_approximation, approximate_shortest_path_centralities
 
 
-# 2. CLASS CHARACTER
+# 2. SUBBOOK WORKERS
+
+subbook_workers = 1 # Number of worker processes for the subbooks of multi-novels (perspective 3)
+subbook_executor = None # Process pool for the subbooks, created when it is first needed
+
+
+def set_subbook_workers(workers):
+    """ Sets the number of worker processes that compute the subbooks of a multi-novel concurrently (1 = one after another)
+
+    """
+    global subbook_workers, subbook_executor
+    if subbook_executor is not None and workers != subbook_workers:
+        subbook_executor.shutdown()
+        subbook_executor = None
+    subbook_workers = workers
+
+
+
+def compute_subbook(subbook):
+    """ Computes the weights of one subbook, without ranking its characters (only the weights are composed into the 'mother' Book-object)
+
+    Output:
+        (weights, node_ids, word_count) of the subbook, with weights a WeightMatrix and node_ids the character_id's of its indices
+
+    """
+    subbook.compute_network(rank=False)
+    return (subbook.network.weights, subbook.network.node_ids, subbook.word_count)
+
+
+
+def compute_subbooks(subbooks):
+    """ Computes the weights of all subbooks, in a pool of subbook_workers processes if there is more than one subbook
+
+    Inside a worker process of another pool (e.g. superscript_af.py --workers) the subbooks are computed one after another,
+    because such (daemonic) processes can not start processes of their own.
+
+    Output:
+        list of (weights, node_ids, word_count) per subbook, in the order of subbooks
+
+    """
+    global subbook_executor
+
+    if subbook_workers < 2 or len(subbooks) < 2 or multiprocessing.current_process().daemon:
+        return [compute_subbook(subbook) for subbook in subbooks]
+
+    if subbook_executor is None:
+        subbook_executor = ProcessPoolExecutor(subbook_workers, initializer=set_sentence_cache, initargs=(get_sentence_cache(),))
+
+    for subbook in subbooks:
+        subbook.detach_textview() # Copy only the range of the subbook, instead of sending the whole text of the 'mother' Book-object to a worker
+
+    return list(subbook_executor.map(compute_subbook, subbooks))
+
+
+
+
+# Categories of the distribution tables of a Network object (e.g. gender_distribution_book), for the whole book and for two communities
+DISTRIBUTION_SCOPES = ('book', 'community_a', 'community_b')
+
+
+
+
+# 3. CLASS CHARACTER
 
 class Character:
 
@@ -44,15 +121,18 @@ class Character:
         age: An integer representing a code for age (1 = <25, 2 = 26-35, 3 = 36-45, 4= 46-55, 5 = 56-64, 6 = 65+)
         education: An integer representing a code for education (1= highly educated, 2= lowly educated)
         profession: A string representing a profession
+        index: An integer representing the position of the character in its Book object (0, 1, 2, ...), used instead of character_id inside computations
     """
 
+    __slots__ = ('namevariants', 'book_id', 'character_id', 'index', 'name', 'gender', 'isfirstperson', 'marked_name', 'namecode') # No __dict__ per Character object
 
 
 
-    def __init__(self, book_id, character_id, name, gender):
+    def __init__(self, book_id, character_id, name, gender, index=None):
         self.namevariants = []
         self.book_id = book_id
         self.character_id = character_id
+        self.index = index
         self.name = name
         self.gender = gender
         #self.descent = descent
@@ -80,9 +160,12 @@ class Character:
         
     
 
-# 2.1. SUBCLASS Character_Centrality
+# 3.1. SUBCLASS Character_Centrality
 
 class Character_Centrality(Character):
+
+    __slots__ = ('degree', 'betweenness', 'closeness', 'eigenvector', 'katz', 'conflictscore')
+
     def __init__(self, book_id, character_id, name, gender, degree, betweenness, closeness, eigenvector, katz):
         Character.__init__(self, book_id, character_id, name, gender)
         self.degree = degree
@@ -102,7 +185,7 @@ class Character_Centrality(Character):
 
 
 
-# 3. CLASS BOOKS 
+# 4. CLASS BOOKS 
 
 
 class Book:
@@ -119,15 +202,20 @@ class Book:
         perspective = An integer representing a code for the narrative situtation in the novel (1 = 1stpers, 2 = 3rdpers, 3 = multi, 4 = other)
         filename =  A string representing the name of the plain text file of the novel, ending with '_clean.txt'
         word_count = An integer representing the number of words the book has
+        character_ids = A list of the character_id's in order of Character.index, to convert the indices back to character_id's
     """
 
+    __slots__ = ('allcharacters', 'character_ids', 'textview', '_originaltext', 'originaltext_word_count', '_markedtext', '_markedtext_char', '_markedtext_words',
+                 '_markedtext_lower', '_markedtext_sentences', 'book_id', 'title', 'name_author', 'gender_author', 'nationality_author', 'publisher',
+                 'perspective', 'filename', 'word_count', 'name_counts', 'mentions', 'mention_counts', 'namematcher', 'network') # No __dict__ per Book object
+
     def __init__(self, book_id, title, name_author, gender_author, nationality_author, publisher, perspective, filename):
         self.allcharacters = {}
+        self.character_ids = []
+        self.textview = None # For subbooks: (text, start, end), the range of the text of the 'mother' Book-object that is the text of the subbook
         self.originaltext = ""
-        self.markedtext = ""
-        self.markedtext_char = ""
-        self.markedtext_words = []
-        self.markedtext_sentences = []
+        self.originaltext_word_count = None
+        self.markedtext = "" # Setting markedtext also (re)sets the derived text views markedtext_char, markedtext_words, markedtext_lower and markedtext_sentences
         self.book_id = book_id
         self.title = title
         self.name_author = name_author
@@ -138,33 +226,189 @@ class Book:
         self.filename = filename
         self.word_count = 0
         self.name_counts = {}
+        self.mentions = {}
+        self.mention_counts = {}
+        self.namematcher = None
         self.network = Network(book_id, self.word_count, self.gender_author, self.nationality_author) # Every time a book object is created, a Network object is also created
     
 
 
 
+    @property
+    def originaltext(self):
+        """ The text of the Book object (for subbooks a copy of the range in textview, made when it is asked for)
+
+        """
+        if self._originaltext is None:
+            text, start, end = self.textview
+            return text[start:end]
+        return self._originaltext
+
+    @originaltext.setter
+    def originaltext(self, text):
+        self._originaltext = text
+        self.textview = None
+
+
+
+    def set_textview(self, text, start, end):
+        """ Makes text[start:end] the text of the Book object without copying it (used for subbooks)
+
+        """
+        self._originaltext = None
+        self.textview = (text, start, end)
+        self._markedtext = None # Copied from the view the first time it is used, unless replace_namevariants can read the view directly
+        self.free_text_views()
+
+
+
+    def detach_textview(self):
+        """ Copies the range in textview into originaltext (and markedtext, if that was still a view), so the Book object does not refer to the text of the 'mother' Book-object anymore
+
+        """
+        if self.textview is not None:
+            text = self.originaltext # One copy of the range, shared by originaltext and markedtext
+            if self._markedtext is None:
+                self._markedtext = text
+            self.originaltext = text
+
+
+
+    @property
+    def markedtext(self):
+        """ The text of the Book object in which the names are replaced with namecodes
+
+        """
+        if self._markedtext is None:
+            text, start, end = self.textview
+            self._markedtext = text[start:end]
+        return self._markedtext
+
+    @markedtext.setter
+    def markedtext(self, text):
+        self._markedtext = text
+        self.free_text_views() # All derived text views are invalid as soon as markedtext changes
+
+
+
+    @property
+    def markedtext_char(self):
+        """ markedtext as a string of characters (computed once, on first use)
+
+        """
+        if self._markedtext_char is None:
+            self._markedtext_char = self.markedtext # A string already is a sequence of characters, so no copy is needed
+        return self._markedtext_char
+
+    @property
+    def markedtext_words(self):
+        """ markedtext as a list of words (computed once, on first use)
+
+        """
+        if self._markedtext_words is None:
+            self._markedtext_words = self.markedtext.split()
+        return self._markedtext_words
+
+    @property
+    def markedtext_lower(self):
+        """ markedtext in lowercase (computed once, on first use)
+
+        """
+        if self._markedtext_lower is None:
+            self._markedtext_lower = self.markedtext.lower()
+        return self._markedtext_lower
+
+    @property
+    def markedtext_sentences(self):
+        """ markedtext as a list of sentences (tokenized with tokenize_text on first use)
+
+        """
+        if self._markedtext_sentences is None:
+            self.tokenize_text()
+        return self._markedtext_sentences
+
+    @markedtext_sentences.setter
+    def markedtext_sentences(self, sentences):
+        self._markedtext_sentences = sentences
+        self.mentions = {} # The mention index belongs to the old sentences
+        self.mention_counts = {}
+
+
+
+    def free_text_views(self):
+        """ Frees the derived text views of markedtext (and the mention index built on the sentences)
+
+        They are computed again when they are used after this
+
+        """
+        self._markedtext_char = None
+        self._markedtext_words = None
+        self._markedtext_lower = None
+        self._markedtext_sentences = None
+        self.mentions = {}
+        self.mention_counts = {}
+
+
+
     def addcharacter(self, book_id, character_id, name, gender):
         """ Adds instances of Character to instances of Book
 
         """
         
-        self.allcharacters[character_id] = Character(book_id, character_id, name, gender)
+        if character_id in self.allcharacters:
+            index = self.allcharacters[character_id].index # A character that is added again keeps its index
+        else:
+            index = len(self.character_ids)
+            self.character_ids.append(character_id)
+        self.allcharacters[character_id] = Character(book_id, character_id, name, gender, index)
+        self.network.add_node(character_id) # The same index in the Network object
 
         if self.perspective == 1:
             self.allcharacters['1'].isfirstperson=True 
         
 
 
-    def readfile(self, path):
+    def readfile(self, path, chunksize=1024*1024):
         """ Reads files from instances of Book
 
+        The file is memory-mapped and decoded in chunks (with the same encoding and newline handling as open(path, 'rt')),
+        and the words are counted in the same pass, so novel_word_count does not have to walk through the text again.
+
         """
         try:
-            with open(path+'/'+self.filename, 'rt') as f:
-                self.originaltext = f.readlines()
-                self.originaltext = "".join(self.originaltext)
+            with open(path+'/'+self.filename, 'rb') as f:
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError: # Empty files can not be memory-mapped
+                    data = b''
+
+                decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(locale.getpreferredencoding(False))(), translate=True)
+                chunks = []
+                word_count = 0
+                endsinword = False # Whether the previous chunk ended in the middle of a word
+
+                for start in range(0, len(data), chunksize):
+                    chunk = decoder.decode(data[start:start+chunksize])
+                    if chunk:
+                        word_count += len(chunk.split())
+                        if endsinword and not chunk[0].isspace():
+                            word_count -= 1 # The first word of this chunk was already counted as the last word of the previous chunk
+                        endsinword = not chunk[-1].isspace()
+                        chunks.append(chunk)
+                chunk = decoder.decode(b'', final=True)
+                if chunk:
+                    word_count += len(chunk.split())
+                    if endsinword and not chunk[0].isspace():
+                        word_count -= 1
+                    chunks.append(chunk)
+
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+                self.originaltext = "".join(chunks)
                 #self.markedtext = "".join(self.originaltext)
                 self.markedtext = self.originaltext
+                self.originaltext_word_count = (self.originaltext, word_count) # Word count of exactly this text
         except IOError as exc:
             print ("SOMETHING GOES WRONG IN READING THE FILE of book_id:", self.book_id)
             if exc.errno != errno.EISDIR: # Do not fail if a directory is found, just ignore it.
@@ -179,19 +423,23 @@ class Book:
 
         'book_id_character_id_name_namevariant'
 
+        All name variants are replaced in one scan of the text with a NameVariantMatcher, which is compiled once per Book object.
+        When the one-pass scan could give a different result, the name variants are replaced one by one with str.replace.
+
         """    
 
-        for character_id in self.allcharacters:
-            character = self.allcharacters[character_id]
-            #print(character.namevariants)
-            for namevariant in sorted(character.namevariants,key=len,reverse=True): # Start with the longest namevariant per character
-                marked_name = list(character.name) 
-                marked_name = '|'.join(marked_name) # Alter each name so that names won't be overwritten multiple times
-                marked_namevariant = list(namevariant) 
-                marked_namevariant ='|'.join(marked_namevariant) # Alter each namevariant so that namevariant won't be overwritten multiple times
-                
+        if self.namematcher is None:
+            self.namematcher = NameVariantMatcher(self.allcharacters) # Compile all name variants of all characters into one matcher
 
-                self.markedtext = self.markedtext.replace(namevariant, self.book_id+'_'+character.character_id+'_'+marked_name.replace(' ','+++')+'_'+marked_namevariant.replace(' ','+++'))
+        if self.namematcher.is_exact:
+            if self._markedtext is None: # A subbook of which the text has not been copied yet, so read it from the text of the 'mother' Book-object
+                text, start, end = self.textview
+                self.markedtext = self.namematcher.sub(text, start, end)
+            else:
+                self.markedtext = self.namematcher.sub(self.markedtext)
+        else:
+            for namevariant, marker in self.namematcher.order: # Longest namevariant per character first
+                self.markedtext = self.markedtext.replace(namevariant, marker)
 
 
     
@@ -204,7 +452,10 @@ class Book:
 
         """
 
-        self.word_count = sum(len(line.split()) for line in self.originaltext)
+        if self.originaltext_word_count is not None and self.originaltext_word_count[0] is self.originaltext:
+            self.word_count = self.originaltext_word_count[1] # Already counted by readfile
+        else:
+            self.word_count = len(self.originaltext.split()) # originaltext is one string, so split it as a whole (iterating over it would count characters)
         self.network.word_count = self.word_count
 
         
@@ -229,76 +480,123 @@ class Book:
 
 
 
+    def multinovel_markers(self):
+        """ Finds all subbooks of a multi-novel (perspective 3) in one scan over the markers in self.originaltext
+
+        A subbook starts with a marker [START_bookid_characterid_perspective] and ends at the first [END after it, which should be 
+        a marker [END_bookid_characterid_perspective]. A START marker that is not followed by a valid END marker is skipped.
+
+        Output:
+            markers: a list of tuples (start, end, startgroups, endgroups), with start and end the offsets of the text 
+            of the subbook in self.originaltext and startgroups/endgroups tuples (bookid, characterid, perspective) of both markers
+
+        """
+
+        text = self.originaltext
+        startpattern = re.compile(r"\[START_(\d+)_(\d+)_([^\]]+)\]")
+        endpattern = re.compile(r"\[END_(\d+)_(\d+)_([^\]]+)\]")
+
+        markers = []
+        position = 0
+        nextend = -1 # Position of the first '[END' at or after nextendfrom
+        nextendfrom = len(text) + 1
+
+        while True:
+            start = startpattern.search(text, position)
+            if start is None:
+                break
+
+            if not (nextendfrom <= start.end() <= nextend): # Only look for the next '[END' again when the START marker is past the previous one
+                nextend = text.find('[END', start.end())
+                nextendfrom = start.end()
+            if nextend == -1:
+                break # No END markers anymore, so no more subbooks
+
+            end = endpattern.match(text, nextend)
+            if end is None:
+                position = start.start() + 1 # This START marker is not closed by a valid END marker, try the next one
+                continue
+
+            markers.append((start.end(), end.start(), start.groups(), end.groups()))
+            position = end.end()
+
+        return markers
+
+
+
+
+
     def split_multinovel(self):
         """ Function to split multi-novels (perspective 3) in separate subbooks
 
+        The subbooks are views on self.originaltext (see set_textview), their text is not copied.
+        All markers are checked first, all errors are printed and a ValueError is raised if there are any.
+
         """
 
         subbooks = []
-        subbooknr = 0
-
-        booktext = re.sub(r"\n","<NL>",self.originaltext) # Replace newlines with something else in order for the pattern matching to work
-        patterns = re.findall(r"\[START_(\d+)_(\d+)_([^\]]+)\](((?!\[END).)*)\[END_(\d+)_(\d+)_([^\]]+)\]",booktext)
-
-
-        if patterns:
-            for pat in patterns:
-                subbooknr += 1
-                startbookid = pat[0]
-                startcharacterid = pat[1]
-                startperspective = pat[2]
-                text = re.sub("<NL>","\n",pat[3])
-                endbookid = pat[5]
-                endcharacterid = pat[6]
-                endperspective = pat[7]
-
-                if not startbookid == endbookid:
-                    print ('book_id causing ERROR =,', self.book_id, '### startbookid does not equal endbookid ###,', 'startbookid =', startbookid, 'endbookid =', endbookid)
-                    exit(0)
-                if not startcharacterid == endcharacterid:
-                    print ('book_id causing ERROR =', self.book_id,'### startcharacterid does not equal endcharacterid ###,', 'startcharacterid =', startcharacterid, 'endcharacterid =', endcharacterid)
-                    exit(0)
-                if not startperspective == endperspective:
-                    print ('book_id causing ERROR =', self.book_id,'### startperspective does not equal endperspective ###,', 'startperspective =', startperspective, 'endperspective =', endperspective)
-                    exit(0)
-
-                book_id = self.book_id + '+' + str(subbooknr) # Create specific book_id for subbook
-
-                if startperspective == 'pers3':
-                    perspective = '2'
-                else:
-                    perspective = '1'
+        errors = []
 
-                subbook = Book(self.book_id, self.title, self.name_author, self.gender_author, self.nationality_author, self.publisher, perspective, 'subbook')
-                subbook.originaltext = text
-                subbook.markedtext = text
-                subbook.novel_word_count()
-                            
+        if self.namematcher is None:
+            self.namematcher = NameVariantMatcher(self.allcharacters) # Compile the name variants once for all subbooks
 
+        text = self.originaltext
 
-                for character_id in self.allcharacters:
-                    #subbook.addcharacter(self.allcharacters[character].book_id, self.allcharacters[character].character_id, self.allcharacters[character].name, self.allcharacters[character].gender, self.allcharacters[character].descent, self.allcharacters[character].age, self.allcharacters[character].education, self.allcharacters[character].profession)
-                    subbook.allcharacters[character_id] = self.allcharacters[character_id]
-                    
+        for subbooknr, (start, end, startgroups, endgroups) in enumerate(self.multinovel_markers(), 1):
+            startbookid, startcharacterid, startperspective = startgroups
+            endbookid, endcharacterid, endperspective = endgroups
 
-                    if subbook.allcharacters[character_id].name == startperspective: # Multi-novels are annotated as bookid_characterid_namefirstperson when the subbook is 1stpers
-                        subbook.allcharacters[character_id].isfirstperson = True
-                        firstcharacterfound = True
-                        #print ('CHARACTER = 1stpers')
-                    else:
-                        subbook.allcharacters[character_id].isfirstperson = False
+            if not startbookid == endbookid:
+                errors.append(('book_id causing ERROR =,', self.book_id, '### startbookid does not equal endbookid ###,', 'startbookid =', startbookid, 'endbookid =', endbookid))
+            if not startcharacterid == endcharacterid:
+                errors.append(('book_id causing ERROR =', self.book_id,'### startcharacterid does not equal endcharacterid ###,', 'startcharacterid =', startcharacterid, 'endcharacterid =', endcharacterid))
+            if not startperspective == endperspective:
+                errors.append(('book_id causing ERROR =', self.book_id,'### startperspective does not equal endperspective ###,', 'startperspective =', startperspective, 'endperspective =', endperspective))
+
+            book_id = self.book_id + '+' + str(subbooknr) # Create specific book_id for subbook
+
+            if startperspective == 'pers3':
+                perspective = '2'
+            else:
+                perspective = '1'
 
-                if perspective == 1 and not firstcharacterfound:
-                    print('book_id causing ERROR =', self.book_id,"ERROR: first person character not found")
-                    exit(0)
+            subbook = Book(self.book_id, self.title, self.name_author, self.gender_author, self.nationality_author, self.publisher, perspective, 'subbook')
+            subbook.set_textview(text, start, end) # The text of the subbook is a range of the text of the 'mother' Book-object
+            subbook.namematcher = self.namematcher # Subbooks share the characters, and thus the name variants, of the 'mother' Book-object
+            subbook.character_ids = self.character_ids # And the indices of the characters
+            subbook.novel_word_count()
+                        
+
+            firstcharacterfound = False
 
+            for character_id in self.allcharacters:
+                #subbook.addcharacter(self.allcharacters[character].book_id, self.allcharacters[character].character_id, self.allcharacters[character].name, self.allcharacters[character].gender, self.allcharacters[character].descent, self.allcharacters[character].age, self.allcharacters[character].education, self.allcharacters[character].profession)
+                subbook.allcharacters[character_id] = copy.copy(self.allcharacters[character_id]) # Own copy, so that isfirstperson of one subbook does not change the other subbooks
+                subbook.network.add_node(character_id) # Same indices as in the 'mother' Book-object
+                
+
+                if subbook.allcharacters[character_id].name == startperspective: # Multi-novels are annotated as bookid_characterid_namefirstperson when the subbook is 1stpers
+                    subbook.allcharacters[character_id].isfirstperson = True
+                    firstcharacterfound = True
+                    #print ('CHARACTER = 1stpers')
+                else:
+                    subbook.allcharacters[character_id].isfirstperson = False
 
-                #subbook.replace_namevariants() 
+            if perspective == '1' and not firstcharacterfound:
+                errors.append(('book_id causing ERROR =', self.book_id, 'subbook =', subbooknr, "ERROR: first person character not found:", startperspective))
 
 
-                subbooks.append(subbook) # Append eash subbook Book object to a list        
+            #subbook.replace_namevariants() 
 
 
+            subbooks.append(subbook) # Append eash subbook Book object to a list        
+
+
+        if errors:
+            for error in errors:
+                print (*error)
+            raise ValueError('book_id ' + str(self.book_id) + ' has ' + str(len(errors)) + ' error(s) in the markers of its subbooks')
+
         return (subbooks)
 
 
@@ -310,23 +608,66 @@ class Book:
     def count_names(self):
         """Computes occurrenes of namecode of every Character object in Book object
 
+        The counts are read from the mention index built by index_mentions()
 
         """
 
+        if not self.mention_counts:
+            self.index_mentions()
+
         for character_id in self.allcharacters: 
-            namecode = self.allcharacters[character_id].namecode
-            count = self.markedtext.count(namecode) 
-            #print (namecode, count) 
-            self.name_counts[character_id] = count
+            self.name_counts[character_id] = self.mention_counts[character_id]
         #print (self.name_counts)
 
 
 
 
 
+    def index_mentions(self):
+        """ Builds an index of the sentences in which the namecode of every Character object occurs, by scanning self.markedtext_sentences once
+
+        Output:
+            self.mentions: a dictionary with character_id as key and a sorted list of sentence numbers in which the namecode occurs as value
+            self.mention_counts: a dictionary with character_id as key and the total number of occurrences of the namecode as value
+
+        """
+
+        if self._markedtext_sentences is None:
+            self.tokenize_text() # Tokenizing builds the index as well
+            return
+
+        self.mentions = {}
+        self.mention_counts = {}
+        namecodes = {}
+
+        for character_id in self.allcharacters:
+            self.mentions[character_id] = []
+            self.mention_counts[character_id] = 0
+            namecodes[self.allcharacters[character_id].namecode] = character_id
+
+        if not namecodes:
+            return
+
+        pattern = re.compile('|'.join(re.escape(namecode) for namecode in sorted(namecodes, key=len, reverse=True))) # One pattern for all namecodes
+
+        for sentencenr, sentence in enumerate(self.markedtext_sentences):
+            for namecode in pattern.findall(sentence):
+                character_id = namecodes[namecode]
+                self.mention_counts[character_id] += 1
+                positions = self.mentions[character_id]
+                if not positions or positions[-1] != sentencenr: # Every sentence is listed only once per character
+                    positions.append(sentencenr)
+
+
+
+
+
     def tokenize_text(self):
         """ Tokenizes self.markedtext using the Ucto library from LaMachine. 
 
+        The tokenizer is taken from the TokenizerPool of the process, so the configuration is loaded only once per run.
+        If a SentenceCache is set (see tokencache_af.set_sentence_cache), sentences of an unchanged markedtext are read from the cache instead.
+
         Output:
             self.markedtext_sentences: a list of strings, each string represents a sentence
 
@@ -337,8 +678,16 @@ class Book:
         
 
         configurationfile = "tokconfig-nld" 
-        tokenizer = ucto.Tokenizer(configurationfile)
-        tokenizer.process(self.markedtext)
+
+        sentencecache = get_sentence_cache()
+        if sentencecache is not None:
+            sentences = sentencecache.get(self.markedtext, tokenizer_fingerprint(configurationfile))
+            if sentences is not None: # Same markedtext, Ucto version and configuration as in an earlier run, so skip tokenization
+                self.markedtext_sentences = sentences
+                self.index_mentions()
+                return
+
+        tokenizerpool = get_tokenizer_pool(configurationfile)
 
 
         #Print number of words of the text
@@ -359,16 +708,24 @@ class Book:
 
 
 
-        for sentence in tokenizer.sentences():
+        sentences = []
+        for sentence in tokenizerpool.sentences(self.markedtext):
             sentence = re.sub('\s*\|\s*','|',sentence)
             if '\n' in sentence:
                 print ('LINE BREAK:', sentence)
             sentence = sentence.replace('\n', ' ')
-            self.markedtext_sentences.append(sentence)
+            sentences.append(sentence)
             #print(sentence)
         # for sentence in self.markedtext_sentences:
         #     print (sentence)
 
+        self.markedtext_sentences = sentences
+
+        if sentencecache is not None:
+            sentencecache.put(self.markedtext, tokenizer_fingerprint(configurationfile), sentences)
+
+        self.index_mentions() # Index the sentences in which each character is mentioned
+
     
 
 
@@ -389,54 +746,101 @@ class Book:
         character2 = self.allcharacters[str(characternr2)]
 
 
+        positions1 = self.mentions[character1.character_id] # Sorted sentence numbers in which character1 is mentioned
+        positions2 = self.mentions[character2.character_id] # Sorted sentence numbers in which character2 is mentioned
+
         co_occurrence_count = 0
 
-        skipthis = False
+        # markedtext_char, markedtext_words and markedtext_sentences are computed once per markedtext, see the properties above
 
-        self.markedtext_char = "".join(self.markedtext) # Splits markedtext into a string of characters
-        self.markedtext_words = self.markedtext.split() # Splits markedtext into a list of words
-        # Or use: self.markedtext_sentences 
-      
+        lastnr = len(self.markedtext_sentences)-windowsize
+        startnr = 0
+
+        while startnr < lastnr:
+            endnr = startnr + windowsize
+            character1pos = -1
+            character2pos = -1
 
-        for startnr in range(0,len(self.markedtext_sentences)-windowsize):
-            if not skipthis:
-                secondfound = -1
-                character1pos = -1
-                character2pos = -1
-                for startnr2 in range(startnr, startnr+windowsize):
-                    # print(character1.namecode)
-                    # print(character2.namecode)
-                    # print(self.markedtext_sentences[startnr2])
-                    if self.markedtext_sentences[startnr2].find(character1.namecode) > -1:
-                        #print("Found!")
-                        character1pos = startnr2
-                    if self.markedtext_sentences[startnr2].find(character2.namecode) > -1:
-                        #print("Found!")
-                        character2pos = startnr2
-
-                # searchtext = self.markedtext_sentences[startnr:startnr+windowsize]
-                # character1pos = searchtext.find(character1.namecode)
-                # character2pos = searchtext.find(character2.namecode)
-
-
-                if character1pos > -1 and character2pos > -1:
-                    co_occurrence_count += 1
-                    secondfound = max(character1pos,character2pos)
-                    skipthis = True
-                    # print(startnr, windowsize)
-                    # print('===')
-                    # print (" ".join(self.markedtext_sentences[startnr:startnr+windowsize]))
-                    # print('=============================')
+            index1 = bisect_left(positions1, endnr) - 1 # Last mention of character1 before the end of the window
+            if index1 >= 0 and positions1[index1] >= startnr:
+                character1pos = positions1[index1]
+            index2 = bisect_left(positions2, endnr) - 1 # Last mention of character2 before the end of the window
+            if index2 >= 0 and positions2[index2] >= startnr:
+                character2pos = positions2[index2]
+
+            if character1pos > -1 and character2pos > -1:
+                co_occurrence_count += 1
+                secondfound = max(character1pos,character2pos)
+                startnr += secondfound + 2 # Skip the next secondfound+1 windows (same as counting secondfound down below zero)
 
             else:
-                secondfound -= 1
-                if secondfound < 0:
-                    skipthis = False
+                index1 = bisect_left(positions1, startnr) # Next mention of character1
+                index2 = bisect_left(positions2, startnr) # Next mention of character2
+                if index1 == len(positions1) or index2 == len(positions2):
+                    break
+                startnr = max(startnr + 1, max(positions1[index1], positions2[index2]) - windowsize + 1) # Jump to the first window that can contain both
 
         return (co_occurrence_count)
 
 
 
+    def co_occurrence_matrix (self, windowsize=2):
+        """ Computes counts of co_occurences of names in sliding window for all pairs of characters (without I-narrator) in one sweep over the sentences
+
+        Gives the same counts as calling sliding_window_co_occurrence for every pair: after a co-occurrence 
+        the windows of that pair are skipped in the same way (skipthis/secondfound), but only windows in which 
+        at least one character is mentioned are visited.
+
+        Output:
+            co_occurrences: a list with a dictionary for every Character.index, with the indices of the other characters as keys and
+            co-occurrence counts as values (symmetric, only counts > 0)
+
+        """
+
+        nrofcharacters = len(self.character_ids)
+        co_occurrences = [{} for index in range(nrofcharacters)]
+        sentence_mentions = {} # Sentence number as key, list of indices of the characters (without I-narrator) mentioned in it as value
+
+        for index, character_id in enumerate(self.character_ids):
+            if self.allcharacters[character_id].isfirstperson:
+                continue
+            for sentencenr in self.mentions[character_id]:
+                if not sentencenr in sentence_mentions:
+                    sentence_mentions[sentencenr] = []
+                sentence_mentions[sentencenr].append(index)
+
+        lastnr = len(self.markedtext_sentences)-windowsize
+
+        startnrs = set() # Start of all windows in which a character is mentioned
+        for sentencenr in sentence_mentions:
+            startnrs.update(range(max(0, sentencenr-windowsize+1), min(sentencenr+1, lastnr)))
+
+        skipuntil = {} # For every pair of characters (index1 * nrofcharacters + index2), the first window that is not skipped after their last co-occurrence
+
+        for startnr in sorted(startnrs):
+            characterpos = {} # Last sentence in the window in which a character is mentioned
+            for startnr2 in range(startnr, startnr+windowsize):
+                for index in sentence_mentions.get(startnr2, ()):
+                    characterpos[index] = startnr2
+
+            if len(characterpos) < 2:
+                continue
+
+            for index1, index2 in itertools.combinations(characterpos, 2):
+                if index1 > index2:
+                    index1, index2 = index2, index1
+                pair = index1 * nrofcharacters + index2
+                if skipuntil.get(pair, 0) <= startnr:
+                    count = co_occurrences[index1].get(index2, 0) + 1
+                    co_occurrences[index1][index2] = count
+                    co_occurrences[index2][index1] = count
+                    secondfound = max(characterpos[index1], characterpos[index2])
+                    skipuntil[pair] = startnr + secondfound + 2 # Skip the next secondfound+1 windows, as in sliding_window_co_occurrence
+
+        return (co_occurrences)
+
+
+
     # print ('The cooccurrence of name character1 and name character2 in the novel is:', sliding_window_co_occurrence(text, 'Nathan', 'Kareltje', windowsize=1000))
 
 
@@ -445,12 +849,15 @@ class Book:
 
 
 
-    def compute_network(self):
+    def compute_network(self, rank=True):
         """    Function for computing the weight of character relations
 
         Book objects are sorted on the basis of perspective (1, 2, 3). 
         For each perspective another method for computing the weight is used.
 
+        Arguments:
+            rank: if False, only the weights are computed (not normalized, no ranking with networkx), as needed for subbooks
+
         """
             
 
@@ -463,40 +870,39 @@ class Book:
             self.tokenize_text() # Transform the text into a list of sentences
             self.count_names() # Call count_names to compute all occurences of namecodes per Character object
 
-            nrofcharacters = len(self.allcharacters)
-
-            for characternr1 in range(1,nrofcharacters+1): # Start at character_id 1, end at nrocharacters+1 in order to keep the range going for the second for loop
-                characternr1str = str(characternr1) # Transform the integer into a string
-                #print("char1str = "+characternr1str)
-                for characternr2 in range(characternr1+1,nrofcharacters+1): # Start at characternr+1 to skip self loops
-                    characternr2str = str(characternr2) # Transform the integer into a string
-                    #print("char2str = "+characternr2str)
-                    if self.allcharacters[characternr1str].isfirstperson:
-                        weight = self.name_counts[characternr2str]  # Weight is the occurences of a character (namecode) in the text
-                        #print ('count_names weight', characternr1str, characternr2str, weight)
+            co_occurrences = self.co_occurrence_matrix() # Count co-occurrences of all pairs of characters (without I-narrator) at once
+
+            weights = [] # List of tuples (source, target, weight) to add to the Network object in one go
+
+            characters = [self.allcharacters[character_id] for character_id in self.character_ids] # Characters in order of their index
+            nrofcharacters = len(characters)
+
+            for index1 in range(nrofcharacters):
+                character1 = characters[index1]
+                for index2 in range(index1+1, nrofcharacters): # Start at index1+1 to skip self loops
+                    character2 = characters[index2]
+                    if character1.isfirstperson:
+                        weight = self.name_counts[character2.character_id]  # Weight is the occurences of a character (namecode) in the text
                         if weight > 0:
-                            self.network.add_weight(characternr1str, characternr2str, weight) # Add the weights of firstpersonnarrator ['1'] with all the character to Network object in Book object
-                            #self.network.normalize_weights(characternr1str, characternr2str, weight, self.word_count)
+                            weights.append((character1.character_id, character2.character_id, weight)) # Add the weights of firstpersonnarrator ['1'] with all the character to Network object in Book object
 
-                    elif self.allcharacters[characternr2str].isfirstperson:
-                        weight = self.name_counts[characternr1str]  # Weight is the occurences of a character (namecode) in the text
-                        #print ('count_names weight', characternr2str, characternr1str, weight)
+                    elif character2.isfirstperson:
+                        weight = self.name_counts[character1.character_id]  # Weight is the occurences of a character (namecode) in the text
                         if weight > 0:
-                            self.network.add_weight(characternr2str, characternr1str, weight) # Add the weights of firstpersonnarrator ['1'] with all the character to Network object in Book object
-                            #self.network.normalize_weights(characternr1str, characternr2str, weight, self.word_count)
+                            weights.append((character2.character_id, character1.character_id, weight)) # Add the weights of firstpersonnarrator ['1'] with all the character to Network object in Book object
                             
                     else:
-                        weight = self.sliding_window_co_occurrence(characternr1str, characternr2str) # Count weight relation characters with other characters
-                        #print ('sliding_window weight', characternr1str, characternr2str, weight)
+                        weight = co_occurrences[index1].get(index2, 0) # Count weight relation characters with other characters
                         if weight > 0:
-                            self.network.add_weight(characternr1str, characternr2str, weight) # Add the weights of all the characters to Network object in Book object
-                            #self.network.normalize_weights(characternr1str, characternr2str, weight, self.word_count)
-                            self.network.add_weight(characternr2str, characternr1str, weight) # Add the weights of all the characters to Network object in Book object
-                            #self.network.normalize_weights(characternr2str, characternr1str, weight, self.word_count)
-                        
-            self.network.normalize_weights(self.word_count) # Normalize weights by dividing through word_count 
+                            weights.append((character1.character_id, character2.character_id, weight)) # Add the weights of all the characters to Network object in Book object
+                            weights.append((character2.character_id, character1.character_id, weight)) # Add the weights of all the characters to Network object in Book object
+
+            self.network.add_weights(weights)
 
-            self.network.networkx_ranking(self.allcharacters) # Rank all characters in Book objects with networkx
+            if rank:
+                self.network.normalize_weights(self.word_count) # Normalize weights by dividing through word_count 
+
+                self.network.networkx_ranking(self.allcharacters) # Rank all characters in Book objects with networkx
 
 
         elif self.perspective == '3': 
@@ -511,26 +917,27 @@ class Book:
             subbooks = self.split_multinovel() # Split Book object in list of subbooks based on separate character perspectives
         
 
-            for subbook in subbooks:
+            for subbook_weights, subbook_node_ids, subbook_word_count in compute_subbooks(subbooks):
                 """ Parameters:
 
                 1: firstperson approach
                 2: 3rdperson approach
 
-                """
-                subbook.compute_network() # Call compute_network() to compute the weights for each subbook according to its narrative mode
+                The weights of each subbook are computed according to its narrative mode (concurrently if set_subbook_workers > 1)
 
-                self.network.compose_network(subbook) # Compose network of separate subbooks by summing all the separate weights to self.composed(weights)
-                self.word_count += subbook.word_count # Add all the separate subbook.word_count to the 'mother' Book self.word_count
+                """
+                self.network.compose_weights(subbook_weights, subbook_node_ids) # Compose network of separate subbooks by summing all the separate weights to self.composed(weights)
+                self.word_count += subbook_word_count # Add all the separate subbook.word_count to the 'mother' Book self.word_count
             #     print ('subbook word_count = ',subbook.word_count)
             #     print ('**************************************')
 
             # print ('mother book word_count =', self.word_count)
 
 
-            self.network.normalize_weights(self.word_count) # Normalize weights for 'mother' Book-object
+            if rank:
+                self.network.normalize_weights(self.word_count) # Normalize weights for 'mother' Book-object
 
-            self.network.networkx_ranking(self.allcharacters) # Rank all characters in 'mother' Book-object with networkx
+                self.network.networkx_ranking(self.allcharacters) # Rank all characters in 'mother' Book-object with networkx
 
 
 
@@ -561,15 +968,24 @@ class Network():
         word_count = An integer representing the number of words per Book object
         gender_author = An integer representing a code for the gender of the author (1 = male, 2 = female)
         age_author = An integer representing a code for the age of the author (1 = <25, 2 = 26-35, 3 = 36-45, 4= 46-55, 5 = 56-64, 6 = 65+)
+
+    The distribution tables (e.g. gender_distribution_book, age_distribution_community_a) are created the first time they are used
         
     """
 
+    __slots__ = ('node_ids', 'node_index', 'weights', 'relation_type', 'normalized_weights', 'Graph', 'book_id', 'word_count', 'gender_author', 'nationality_author',
+                 'number_of_nodes', 'number_of_edges', 'density', 'triadic_closure', 'clustering_coefficient', 'is_connected', 'diameter',
+                 'gender_assortativity', 'descent_assortativity', 'age_assortativity', 'education_assortativity', 'statistics', 'partitions', 'communities', 'community_a', 'community_b') + \
+                tuple(characteristic + '_distribution_' + scope for characteristic in DISTRIBUTION_CATEGORIES for scope in DISTRIBUTION_SCOPES) # No __dict__ per Network object
+
 
     
     def __init__(self, book_id, word_count, gender_author, nationality_author):
-        self.weights = {}
-        self.relation_type = {}
-        self.normalized_weights = {}
+        self.node_ids = [] # character_id of every index of the weights
+        self.node_index = {} # character_id as key, index as value
+        self.weights = WeightMatrix() # Sparse weights between the characters, by index
+        self.relation_type = RelationMatrix('geen') # Types of relation between the characters, by index ('geen' if not set)
+        self.normalized_weights = WeightMatrix()
         #self.composed_weights = Counter()
         self.Graph = nx.Graph() # networkx Graph object
         self.book_id = book_id
@@ -587,25 +1003,44 @@ class Network():
         self.descent_assortativity = 0
         self.age_assortativity = 0
         self.education_assortativity = 0
+        self.statistics = None # Cached result of network_statistics, see compute_networkstats
+        self.partitions = {} # Cached communities per (algorithm, seed), see community_partitions
         self.communities = []
         self.community_a = set()
         self.community_b = set()
-        self.gender_distribution_book = {'male': 0, 'female': 0, 'unknown': 0}
-        self.descent_distribution_book = {'non-migrant': 0, 'migrant': 0, 'unknown': 0}
-        self.education_distribution_book = {'high education': 0, 'low education': 0, 'unknown': 0}
-        self.age_distribution_book = {'<25': 0, '26-35': 0, '36-45': 0, '46-55': 0, '56-64': 0, '65+': 0, 'unknown': 0}
-        self.gender_distribution_community_a = {'male': 0, 'female': 0, 'unknown': 0}
-        self.descent_distribution_community_a = {'non-migrant': 0, 'migrant': 0, 'unknown': 0}
-        self.education_distribution_community_a = {'high education': 0, 'low education': 0, 'unknown': 0}
-        self.age_distribution_community_a = {'<25': 0, '26-35': 0, '36-45': 0, '46-55': 0, '56-64': 0, '65+': 0, 'unknown': 0}
-        self.gender_distribution_community_b = {'male': 0, 'female': 0, 'unknown': 0}
-        self.descent_distribution_community_b = {'non-migrant': 0, 'migrant': 0, 'unknown': 0}
-        self.education_distribution_community_b = {'high education': 0, 'low education': 0, 'unknown': 0}
-        self.age_distribution_community_b = {'<25': 0, '26-35': 0, '36-45': 0, '46-55': 0, '56-64': 0, '65+': 0, 'unknown': 0}
+        # The distribution tables are created on first use, see __getattr__
+
+
+
+    def __getattr__(self, attribute):
+        """ Creates a distribution table (e.g. gender_distribution_book) with all counts 0 the first time it is used
+
+        Only called for attributes that are not set (yet)
+
+        """
+        characteristic, separator, scope = attribute.partition('_distribution_')
+        if separator and characteristic in DISTRIBUTION_CATEGORIES and scope in DISTRIBUTION_SCOPES:
+            table = dict.fromkeys(DISTRIBUTION_CATEGORIES[characteristic], 0)
+            setattr(self, attribute, table)
+            return table
+        raise AttributeError("'Network' object has no attribute '" + attribute + "'")
 
 
 
         
+    def add_node(self, character_id):
+        """ Returns the index of a character in the weights, a new character gets the next index
+
+        """
+        index = self.node_index.get(character_id)
+        if index is None:
+            index = len(self.node_ids)
+            self.node_index[character_id] = index
+            self.node_ids.append(character_id)
+        return index
+
+
+
     def add_edge(self,source, target, relation_type):
         """ Function for adding eges in every Book object 
 
@@ -616,15 +1051,8 @@ class Network():
 
 
         """
-        if not source in self.relation_type: # If source is not already in self.relation_type ...
-            self.relation_type[source] = {} # Create empty dictionary by defining the source as key in self.relation_type
-        self.relation_type[source][target] = relation_type # Define relation_type in EDGES-csv as dictionary with source as key and target as value
-        
-        # for source1 in self.relation_type:
-        #     for target1 in self.relation_type[source1]:
-        #         #pass
-        #          print(source1,target1, self.relation_type[source1][target1])
-        # print('============================')
+        self.relation_type.set(self.add_node(source), self.add_node(target), relation_type) # Pairs without a relation_type have 'geen'
+
 
 
     def add_weight(self, source, target, weight):
@@ -633,42 +1061,46 @@ class Network():
          Arguments:
             source: An integer representing a charracter_id
             target: An integer representing a charracter_id
-            relation_type: A string representing a type of relation between two characters (lover, friend, enemy, colleage, family (with subclasses))
-            word_count = An integer representing the word count of the file in the Book object
+            weight: A number that is added to the weight of the pair
 
 
         """
-    
+        self.weights.add(self.add_node(source), self.add_node(target), weight)
 
-        if source in self.relation_type: # In case source has a relation_type
-            if not target in self.relation_type[source]: # In case target has no relation_type
-                self.add_edge(source,target,'geen') # Add 'geen' as relation_type between source and target
-        else:
-            self.relation_type[source] = {} # Otherwise, create a dictionary for source which does NOT have a relation_type
-            self.add_edge(source,target,'geen') # And add 'geen' between source and target 
-
-        if not source in self.weights: # If a character is not listed as having an edge in EDGES_complete, than still add weight between character and other characters
-            self.weights[source] = {}
-        if not target in self.weights[source]:
-            self.weights[source][target] = 0
-        self.weights[source][target] += weight
-
-
-        # Block of code to print the weights to check if everything works
-        # for source1 in self.normalized_weights:
-        #     for target1 in self.normalized_weights[source1]:
-        #         #pass
-        #         print(source1,target1) 
-        #         if target1 in self.normalized_weights[source1]:
-        #             #pass
-        #             print("%.7f" % self.normalized_weights[source1][target1])
-        #             print (self.weights[source1][target1])
-        #         if target1 in self.relation_type[source1]:
-        #             #pass
-        #             print(self.relation_type[source1][target1])
-        # print('------------------------------')
 
-            
+
+    def weights_dict(self, weights=None):
+        """ Returns weights (self.weights if None, or e.g. self.normalized_weights) as a dictionary of dictionaries with character_id's as keys,
+        for inspection
+
+        """
+        if weights is None:
+            weights = self.weights
+        weightsdict = {}
+        rows, columns, values = weights.pairs()
+        for row, column, value in zip(rows.tolist(), columns.tolist(), values.tolist()):
+            weightsdict.setdefault(self.node_ids[row], {})[self.node_ids[column]] = value
+        return weightsdict
+
+
+
+    def add_weights(self, weights):
+        """ Function for adding the weights of many pairs of Character objects at once
+
+         Arguments:
+            weights: An iterable of tuples (source, target, weight), which are added in order
+
+        """
+
+        rows = []
+        columns = []
+        values = []
+        for source, target, weight in weights:
+            rows.append(self.add_node(source))
+            columns.append(self.add_node(target))
+            values.append(weight)
+        self.weights.add_many(rows, columns, values)
+
 
 
     def compose_network(self, subbook):
@@ -678,9 +1110,22 @@ class Network():
         """
 
 
-        for source in subbook.network.weights: # For every source in the weights dict of each subbook network
-            for target in subbook.network.weights[source]: # For every target in the weights dict of each subbook network
-                self.add_weight(source, target, subbook.network.weights[source][target]) # Add the weights to self.weights of the 'mother' Book-object [SUM OR ADD?]
+        self.compose_weights(subbook.network.weights, subbook.network.node_ids)
+
+
+
+    def compose_weights(self, weights, node_ids):
+        """
+        Add the weights (a WeightMatrix) of a subbook network to the weights of the 'mother' Book-object, as a matrix sum
+
+        Arguments:
+            weights: WeightMatrix of the subbook network
+            node_ids: the character_id's of the indices of weights
+
+        """
+
+        mapping = np.array([self.add_node(character_id) for character_id in node_ids], dtype=np.int64) # Subbook index to index in the 'mother' Book-object
+        self.weights.add_matrix(weights, mapping)
 
 
 
@@ -691,11 +1136,7 @@ class Network():
 
         """
 
-        for source in self.weights: 
-            for target in self.weights[source]:
-                if not source in self.normalized_weights:
-                    self.normalized_weights[source] = {}    
-                self.normalized_weights[source][target] = self.weights[source][target] / word_count # Compute normalized_weights by dividing weights through word_count
+        self.normalized_weights = self.weights.divide(word_count) # Compute normalized_weights by dividing weights through word_count
 
         #print (self.book_id, self.weights)
         #print ('&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&')
@@ -708,14 +1149,49 @@ class Network():
 
 
     
-    def networkx_ranking (self, allcharacters):
+    def nodes_and_edges(self, allcharacters):
+        """ Returns the nodes and edges of the network in the order in which networkx_ranking adds them to the Graph object
+
+        Output:
+            (nodes, edges), with nodes the character_id's of allcharacters followed by any other character_id in the weights,
+            and edges a list of tuples (source, target, normalized weight)
+
+        """
+
+        rows, columns, values = self.normalized_weights.pairs() # Summed weights per pair, in order of first addition
+        edges = list(zip([self.node_ids[row] for row in rows.tolist()], [self.node_ids[column] for column in columns.tolist()], values.tolist()))
+
+        nodes = list(allcharacters)
+        known = set(nodes)
+        for source, target, weight in edges: # Characters that are not in allcharacters are added by their edges
+            for character_id in (source, target):
+                if not character_id in known:
+                    known.add(character_id)
+                    nodes.append(character_id)
+
+        return nodes, edges
+
+
+
+    def networkx_ranking (self, allcharacters, engine=None, centralities=None):
         """ Function for ranking Character objects within Network object using Python library networkx
 
+        The centralities are computed with the engine of centrality_af.py ('sparse': one CSR adjacency matrix for degree, eigenvector
+        and Katz, and one shortest path search per node for both betweenness and closeness) or with networkx
+
         Arguments:
             allcharacters: dictionary containing Character objects
+            engine: 'sparse' or 'networkx', the engine set with set_centrality_engine() if None
+            centralities: dictionary with degree, eigenvector and Katz centrality computed beforehand (see batch_centralities in centrality_af.py),
+                only betweenness and closeness are computed if given
 
         """
 
+        if engine is None:
+            engine = get_centrality_engine()
+        if not engine in CENTRALITY_ENGINES:
+            raise ValueError('unknown centrality engine: ' + str(engine))
+
 
         nodeslist = [] # Create empty list for nodes (networkx needs nodes as a list)
         for character_id in allcharacters:
@@ -730,15 +1206,13 @@ class Network():
         # print ('//////////////////')
 
 
-        edgestuplelist = [] # Create empyt list for tuples of edge-pairs + weight
-        for source1 in self.normalized_weights: # Or use self.normalized_weights??? 
-            for target1 in self.normalized_weights[source1]: # Or use self.normalized_weights??? 
-                edgestuple = (source1, target1, self.normalized_weights[source1][target1])    # Convert to tuple / # Or use self.normalized_weights??? 
-                edgestuplelist.append(edgestuple)
+        nodes, edgestuplelist = self.nodes_and_edges(allcharacters) # List of tuples of edge-pairs + weight
             
         
         self.Graph.add_nodes_from(nodeslist)
         self.Graph.add_weighted_edges_from(edgestuplelist) # Tuple of list containing node pairs + float weights
+        self.statistics = None # The Graph changed, so the cached network statistics and communities are outdated
+        self.partitions = {}
 
         
         # Create empty dictionaries for node attributes
@@ -826,8 +1300,18 @@ class Network():
 
        
 
+        if engine == 'sparse' and centralities is None:
+            nodes = list(self.Graph.nodes()) # Same order of nodes as networkx
+            adjacency = adjacency_matrix(nodes, edgestuplelist)
+
+
         # 1. DEGREE CENTRALITY
-        degree_dict = nx.degree_centrality(self.Graph) # Compute degree centrality of all nodes in the Graph object. IMPORTANT: parameter 'weight' cannot be set, scores are thus unweighted degree
+        if centralities is not None:
+            degree_dict = centralities['degree']
+        elif engine == 'sparse':
+            degree_dict = degree_centrality(nodes, adjacency) # Unweighted degree, as with networkx
+        else:
+            degree_dict = nx.degree_centrality(self.Graph) # Compute degree centrality of all nodes in the Graph object. IMPORTANT: parameter 'weight' cannot be set, scores are thus unweighted degree
         #degree_dict = self.Graph.degree(self.Graph.nodes(), weight='weight') # Compute degree centrality of all nodes in the Graph object
         nx.set_node_attributes(self.Graph, degree_dict, 'degree') # Put degree as an attribute in the Graph object
         #print (self.Graph.node['1']) # print degree of specific nodes
@@ -840,7 +1324,18 @@ class Network():
 
 
         # 2. BETWEENESS CENTRALITY
-        betweenness_dict = nx.betweenness_centrality(self.Graph, weight='weight') # Run betweenness centrality
+        approximation = get_centrality_approximation()
+        if approximation is not None: # Estimates from a sample of source nodes, for large networks
+            betweenness_dict, closeness_dict, betweenness_error_dict, closeness_error_dict, sample_size = approximate_shortest_path_centralities(self.Graph, weight='weight', **approximation)
+            nx.set_node_attributes(self.Graph, betweenness_error_dict, 'betweenness_error') # Put the standard errors as attributes in the Graph object (see error_rows)
+            nx.set_node_attributes(self.Graph, closeness_error_dict, 'closeness_error')
+            if sample_size < self.Graph.number_of_nodes():
+                print ('book_id =', self.book_id, 'approximate betweenness and closeness from', sample_size, 'of', self.Graph.number_of_nodes(), 'nodes, largest standard error', \
+                       'betweenness', '%.2e' % max(betweenness_error_dict.values()), 'closeness', '%.2e' % max(closeness_error_dict.values()))
+        elif engine == 'sparse':
+            betweenness_dict, closeness_dict = shortest_path_centralities(self.Graph, weight='weight') # One shortest path search per node for both betweenness and closeness
+        else:
+            betweenness_dict = nx.betweenness_centrality(self.Graph, weight='weight') # Run betweenness centrality
         nx.set_node_attributes(self.Graph, betweenness_dict, 'betweenness') # Put betweenness as an attribute in the Graph object
         #sorted_betweenness = sorted(betweenness_dict.items(), key=itemgetter(1), reverse=True)
         
@@ -851,7 +1346,8 @@ class Network():
         #print ('===============')
 
         # 3. CLOSENESS CENTRALITY
-        closeness_dict = nx.closeness_centrality(self.Graph, distance='weight') # Run betweenness centrality
+        if engine != 'sparse' and approximation is None: # Otherwise already computed together with betweenness
+            closeness_dict = nx.closeness_centrality(self.Graph, distance='weight') # Run betweenness centrality
         nx.set_node_attributes(self.Graph, closeness_dict, 'closeness') # Put betweenness as an attribute in the Graph object
         #sorted_closeness = sorted(closeness_dict.items(), key=itemgetter(1), reverse=True)
         
@@ -863,7 +1359,12 @@ class Network():
 
 
         # 4. EIGENVECTOR CENTRALITY
-        eigenvector_dict = nx.eigenvector_centrality_numpy(self.Graph, weight='weight') # Run eigenvector centrality
+        if centralities is not None:
+            eigenvector_dict = centralities['eigenvector']
+        elif engine == 'sparse':
+            eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency) # Also returns the largest eigenvalue, which bounds alpha of Katz centrality
+        else:
+            eigenvector_dict = nx.eigenvector_centrality_numpy(self.Graph, weight='weight') # Run eigenvector centrality
         nx.set_node_attributes(self.Graph, eigenvector_dict, 'eigenvector') # Put eigenvector as an attribute in the Graph object
         #sorted_eigenvector = sorted(eigenvector_dict.items(), key=itemgetter(1), reverse=True)
 
@@ -873,7 +1374,16 @@ class Network():
         #print ('===============')
 
         # 5. KATZ CENTRALITY
-        katz_dict = nx.katz_centrality(self.Graph, weight='weight') # Run eigenvector centrality
+        if centralities is not None:
+            katz_dict = centralities['katz']
+            if centralities['alpha'] != 0.1:
+                print ('book_id =', self.book_id, 'Katz centrality: alpha 0.1 does not converge, alpha', '%.4f' % centralities['alpha'], 'is used')
+        elif engine == 'sparse':
+            katz_dict, alpha = katz_centrality(nodes, adjacency, spectral_radius) # Solved directly, so no power iteration that fails to converge
+            if alpha != 0.1:
+                print ('book_id =', self.book_id, 'Katz centrality: alpha 0.1 does not converge (spectral radius', '%.4f' % spectral_radius + '), alpha', '%.4f' % alpha, 'is used')
+        else:
+            katz_dict = nx.katz_centrality(self.Graph, weight='weight') # Run eigenvector centrality
         nx.set_node_attributes(self.Graph, katz_dict, 'katz') # Put eigenvector as an attribute in the Graph object
         #sorted_katz = sorted(katz_dict.items(), key=itemgetter(1), reverse=True)
 
@@ -903,27 +1413,78 @@ class Network():
         - katz
 
         """
-        balbla = False
+        rows = self.rankings_rows()
         with open (filename, 'a', newline='') as f:
             csvwriter = csv.writer(f)
             #csvwriter.writerow(['book_id', 'character_id', 'name', 'gender', 'degree', 'betweenness', 'closeness', 'eigenvector', 'katz'])
+            csvwriter.writerows(rows)
+
+
+
+    def rankings_rows(self, corpus='corpus_ES-1960s'):
+        """
+        Returns the rows that write_to_csv writes, one list per character (sorted on character_id), see RANKINGS_COLUMNS in results_af.py
+
+        The attributes of every node are read directly, instead of building a dictionary of an attribute of all nodes for every value
+
+        """
+
+        rows = []
+        for character_id in sorted(list(self.Graph.nodes)):
+            attributes = self.Graph.nodes[character_id]
+            rows.append([self.book_id, \
+                        character_id, \
+                        attributes['name'], \
+                        attributes['gender'], \
+                        attributes['degree'], \
+                        attributes['betweenness'], \
+                        attributes['closeness'], \
+                        attributes['eigenvector'], \
+                        attributes['katz'], \
+                        attributes['gender_author'], \
+                        corpus]
+                        )
+        return rows
+
+
+
+
+
+    def error_rows(self):
+        """
+        Returns one row per character (sorted on character_id) with the approximate betweenness and closeness and their
+        standard errors: book_id, character_id, betweenness, betweenness_error, closeness, closeness_error
+
+        The errors are 0 when the scores are exact (see set_centrality_approximation in centrality_af.py)
 
-            for character_id in sorted(list(self.Graph.nodes)):
-                csvwriter.writerow([self.book_id, \
-                            character_id, \
-                            nx.get_node_attributes(self.Graph, 'name')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'gender')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'degree')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'betweenness')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'closeness')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'eigenvector')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'katz')[character_id], \
-                            nx.get_node_attributes(self.Graph, 'gender_author')[character_id], \
-                            'corpus_ES-1960s']
-                            )
+        """
+
+        betweenness_error = nx.get_node_attributes(self.Graph, 'betweenness_error')
+        closeness_error = nx.get_node_attributes(self.Graph, 'closeness_error')
+        rows = []
+        for character_id in sorted(list(self.Graph.nodes)):
+            rows.append([self.book_id, \
+                        character_id, \
+                        self.Graph.nodes[character_id]['betweenness'], \
+                        betweenness_error.get(character_id, 0.0), \
+                        self.Graph.nodes[character_id]['closeness'], \
+                        closeness_error.get(character_id, 0.0)]
+                        )
+        return rows
 
 
 
+    def write_errors_to_csv(self, filename='character-rankings-errors.csv'):
+        """
+        Appends the rows of error_rows to filename, next to the rankings of write_to_csv (whose columns stay the same)
+
+        """
+
+        with open (filename, 'a', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            csvwriter.writerows(self.error_rows())
+
+
 
 
     def compute_networkstats(self, filename='networkstats.csv'):
@@ -938,27 +1499,31 @@ class Network():
                 - diameter
                 - assortativity per node attribute
 
-            And writes the results to networkstats.csv 
+            And writes the results to networkstats.csv (not written if filename is None, e.g. when the rows of all networks are written at once with write_networkstats)
+
+            The statistics are computed once per Graph from one sparse adjacency matrix (see networkstats_af.py)
 
 
         """
 
-        self.number_of_nodes = len(self.Graph) # Returns number of nodes
+        statistics = self.network_statistics()
+
+        self.number_of_nodes = statistics['number_of_nodes'] # Returns number of nodes
         print ("Number of nodes for book", self.book_id, '=', self.number_of_nodes)
 
-        self.number_of_edges = self.Graph.number_of_edges()  # Returns number of edges
+        self.number_of_edges = statistics['number_of_edges']  # Returns number of edges
         print ("Number of edges for book", self.book_id, '=', self.number_of_edges)
 
-        self.density = nx.density(self.Graph) # Computes density of the network: the ratio of actual edges in the network to all possible edges in the network (scale 0-1)
+        self.density = statistics['density'] # Computes density of the network: the ratio of actual edges in the network to all possible edges in the network (scale 0-1)
         print("Network density for book", self.book_id, '=', self.density)
 
-        self.triadic_closure = nx.transitivity(self.Graph) # Computes transitivity: how interconnected a graph is in terms of a ratio of actual over possible connections (scale 0-1), all the relationships in your graph that may exist but currently do not
+        self.triadic_closure = statistics['triadic_closure'] # Computes transitivity: how interconnected a graph is in terms of a ratio of actual over possible connections (scale 0-1), all the relationships in your graph that may exist but currently do not
         print("Triadic closure for book", self.book_id, '=', self.triadic_closure) 
 
-        self.clustering_coefficient = nx.average_clustering(self.Graph, weight='weight') # Computes the degree to which nodes in a graph tend to cluster together
+        self.clustering_coefficient = statistics['clustering_coefficient'] # Computes the degree to which nodes in a graph tend to cluster together
         print ('The clustering coefficient for book', self.book_id, '=', self.clustering_coefficient)
 
-        self.is_connected = nx.is_connected(self.Graph)
+        self.is_connected = statistics['is_connected']
         print ('Is the network of book', self.book_id, 'connected?', self.is_connected)
 
 
@@ -966,341 +1531,137 @@ class Network():
 
      
 
-        self.gender_assortativity = nx.attribute_assortativity_coefficient(self.Graph, 'gender')
-        self.descent_assortativity = nx.attribute_assortativity_coefficient(self.Graph, 'descent')
-        self.age_assortativity = nx.attribute_assortativity_coefficient(self.Graph, 'age')
-        self.education_assortativity = nx.attribute_assortativity_coefficient(self.Graph, 'education')
+        self.gender_assortativity = statistics['gender_assortativity'] # NaN if undefined, e.g. for attributes that are not set (descent, age, education)
+        self.descent_assortativity = statistics['descent_assortativity']
+        self.age_assortativity = statistics['age_assortativity']
+        self.education_assortativity = statistics['education_assortativity']
         print ('Gender assortativity for book', self.book_id, '=', self.gender_assortativity)
         print ('Descent assortativity for book', self.book_id, '=', self.descent_assortativity)
         print ('Age assortativity for book', self.book_id, '=', self.age_assortativity)
         print ('Education assortativity for book', self.book_id, '=', self.education_assortativity)
 
 
+        if filename is not None:
+            with open (filename, 'a', newline='') as f:
+                csvwriter = csv.writer(f)
+                csvwriter.writerow(self.networkstats_row())
 
 
-        with open (filename, 'a', newline='') as f:
-            csvwriter = csv.writer(f)
 
-            csvwriter.writerow([self.book_id, \
-                        self.word_count, \
-                        self.gender_author, \
-                        self.number_of_nodes, \
-                        self.number_of_edges, \
-                        self.density, \
-                        self.triadic_closure, \
-                        self.clustering_coefficient, \
-                        self.is_connected, \
-                        self.gender_assortativity, \
-                        self.descent_assortativity, \
-                        self.age_assortativity, \
-                        self.education_assortativity])
-
-
-    def detect_communities(self, filename='communities_frequency_distributions.csv'):
+    def network_statistics(self):
+        """ Returns the network statistics of the Graph (see network_statistics in networkstats_af.py), computed once per Graph and cached
+
         """
-        Divides the Network object into communities using the Clauset-Newman-Moore modularity maximization, the Girvan-Newman algorithm, the Kernighan–Lin algorithm, or other methods. 
 
-        Greedy modularity maximization begins with each node in its own community and joins the pair of communities that most increases modularity until no such pair exists.
+        if self.statistics is None:
+            self.statistics = network_statistics(self.Graph, ASSORTATIVITY_ATTRIBUTES)
+        return self.statistics
 
-        The Girvan–Newman algorithm detects communities by progressively removing edges from the original graph. The algorithm removes the “most valuable” edge, traditionally the edge with the highest betweenness centrality, at each step. As the graph breaks down into pieces, the tightly knit community structure is exposed and the result can be depicted as a dendrogram.
 
-        The Kernighan–Lin algorithm paritions a network into two sets by iteratively swapping pairs of nodes to reduce the edge cut between the two sets.
 
-        Outputs the results to communities_distributions.csv to use in further statistical analysis
+    def networkstats_row(self):
+        """ Returns the row of the Network object in networkstats.csv (see write_networkstats in networkstats_af.py)
 
+        """
+
+        statistics = self.network_statistics()
+        return [self.book_id, \
+                self.word_count, \
+                self.gender_author, \
+                statistics['number_of_nodes'], \
+                statistics['number_of_edges'], \
+                statistics['density'], \
+                statistics['triadic_closure'], \
+                statistics['clustering_coefficient'], \
+                statistics['is_connected'], \
+                statistics['gender_assortativity'], \
+                statistics['descent_assortativity'], \
+                statistics['age_assortativity'], \
+                statistics['education_assortativity']]
+
+
+    def community_partitions(self, algorithms, seed=None):
+        """ Returns the communities of the Graph found by several algorithms (see COMMUNITY_ALGORITHMS in communities_af.py)
+
+        Only algorithms that did not run on this Graph yet are run (side by side if set_community_workers > 1), the results are cached
+
+        Output:
+            dictionary with algorithm as key and its list of communities (sets of character_id's) as value
 
         """
 
-        # communities = list(greedy_modularity_communities(self.Graph))
-        # for community in communities:
-        #     print ('Communities of book', self.book_id, sorted(community))
+        missing = [algorithm for algorithm in algorithms if not (algorithm, seed) in self.partitions]
+        if missing:
+            for algorithm, communities in run_algorithms(self.Graph, missing, seed).items():
+                self.partitions[(algorithm, seed)] = communities
+        return {algorithm: self.partitions[(algorithm, seed)] for algorithm in algorithms}
 
-        #communities = girvan_newman(self.Graph)
-        #print ('Communities of book', self.book_id,tuple(sorted(c) for c in next(communities)))
-        #print ('Communities of book', self.book_id,tuple(sorted(communities)))
 
-        # communities = label_propagation_communities(self.Graph)
-        # for community in communities:
-        #     print ('Communities of book', self.book_id, sorted(community))
 
-        # communities = asyn_lpa_communities(self.Graph)
-        # for community in communities:
-        #     print ('Communities of book', self.book_id, sorted(community))
+    def detect_communities(self, filename='communities_frequency_distributions.csv', algorithm='kernighan_lin', algorithms=None, seed=None):
+        """
+        Divides the Network object into communities using the Clauset-Newman-Moore modularity maximization, the Girvan-Newman algorithm, the Kernighan–Lin algorithm, or other methods. 
 
+        Greedy modularity maximization begins with each node in its own community and joins the pair of communities that most increases modularity until no such pair exists.
 
-        # communities = list(k_clique_communities(self.Graph, 2))
-        # for community in communities:
-        #     print ('Communities of book', self.book_id, sorted(community))
+        The Girvan–Newman algorithm detects communities by progressively removing edges from the original graph. The algorithm removes the “most valuable” edge, traditionally the edge with the highest betweenness centrality, at each step. As the graph breaks down into pieces, the tightly knit community structure is exposed and the result can be depicted as a dendrogram.
 
+        The Kernighan–Lin algorithm paritions a network into two sets by iteratively swapping pairs of nodes to reduce the edge cut between the two sets.
 
-        self.communities = kernighan_lin_bisection(self.Graph, weight='weight')
-        print ('Communities of book', self.book_id, ':', sorted(self.communities))
+        Outputs the results to communities_distributions.csv to use in further statistical analysis
 
-        self.community_a = self.communities[0]
-        self.community_b = self.communities[1]
-        print ('Community a of book', self.book_id, ':', self.community_a)
-        print ('Community b of book', self.book_id, ':', self.community_b)
+        Arguments:
+            algorithm: the algorithm whose communities are stored in communities, community_a and community_b (see COMMUNITY_ALGORITHMS in communities_af.py)
+            algorithms: other algorithms to run on the same Graph at the same time, their communities are cached (see community_partitions)
+            seed: seed of the randomized algorithms (kernighan_lin, asyn_lpa, louvain), random if None
 
-        gender_nx = nx.get_node_attributes(self.Graph, 'gender')
-        descent_nx = nx.get_node_attributes(self.Graph, 'descent')
-        education_nx = nx.get_node_attributes(self.Graph, 'education')
-        age_nx = nx.get_node_attributes(self.Graph, 'age')
+        The distributions are counted for any number of communities, community_a and community_b are the first two
 
-        for community in self.communities:
-            for character_id in community:
-                """
-                    For the book as a whole, store demographic info in four dictionaries (gender, descent, education, age) to compute distributions
 
+        """
 
-                """
-                # print ('character_id:', character_id, 'gender:', gender_nx[character_id])
-                # print ('character_id:', character_id, 'descent:', descent_nx[character_id])
-                # print ('character_id:', character_id, 'education:', education_nx[character_id])
-                # print ('character_id:', character_id, 'age:', age_nx[character_id])
-                if gender_nx[character_id] == '1':
-                    self.gender_distribution_book['male'] += 1
-                elif gender_nx[character_id] == '2':
-                    self.gender_distribution_book['female'] += 1
-                elif gender_nx[character_id] == '99':
-                    self.gender_distribution_book['unknown'] += 1
-
-                if descent_nx[character_id] == '0':
-                    self.descent_distribution_book['non-migrant'] += 1
-                elif descent_nx[character_id] == '1':
-                    self.descent_distribution_book['migrant'] += 1
-                elif descent_nx[character_id] == '99':
-                    self.descent_distribution_book['unknown'] += 1
-                
-                if education_nx[character_id] == '1':
-                    self.education_distribution_book['high education'] += 1
-                elif education_nx[character_id] == '2':
-                    self.education_distribution_book['low education'] += 1
-                elif education_nx[character_id] == '99':
-                    self.education_distribution_book['unknown'] += 1
-
-                if age_nx[character_id] == '1':
-                    self.age_distribution_book['<25'] += 1
-                elif age_nx[character_id] == '2':
-                    self.age_distribution_book['26-35'] += 1
-                elif age_nx[character_id] == '3':
-                    self.age_distribution_book['36-45'] += 1
-                elif age_nx[character_id] == '4':
-                    self.age_distribution_book['46-55'] += 1
-                elif age_nx[character_id] == '5':
-                    self.age_distribution_book['56-64'] += 1
-                elif age_nx[character_id] == '6':
-                    self.age_distribution_book['65+'] += 1
-                elif age_nx[character_id] == '99':
-                    self.age_distribution_book['unknown'] += 1
-
-
-        print ('male characters in book', self.book_id, self.gender_distribution_book['male'])
-        print ('female characters in book', self.book_id, self.gender_distribution_book['female'])
-        print ('unknown gender characters in book', self.book_id, self.gender_distribution_book['unknown'])
-
-        print ('non-migrant characters in book', self.book_id, self.descent_distribution_book['non-migrant'])
-        print ('migrant characters in book', self.book_id, self.descent_distribution_book['migrant'])
-        print ('unknown descent characters in book', self.book_id, self.descent_distribution_book['unknown'])
-
-        print ('higher educated characters in book', self.book_id, self.education_distribution_book['high education'])
-        print ('lower educated characters in book', self.book_id, self.education_distribution_book['low education'])
-        print ('unknown education characters in book', self.book_id, self.education_distribution_book['unknown'])
-
-        print ('age <25 characters in book', self.book_id, self.age_distribution_book['<25'])
-        print ('age 26-35 characters in book', self.book_id, self.age_distribution_book['26-35'])
-        print ('age 36-45 characters in book', self.book_id, self.age_distribution_book['36-45'])
-        print ('age 46-55 characters in book', self.book_id, self.age_distribution_book['46-55'])
-        print ('age 56-64 characters in book', self.book_id, self.age_distribution_book['56-64'])
-        print ('age unknown characters in book', self.book_id, self.age_distribution_book['unknown'])
-
-
-
-        for character_id in self.community_a:
-            """
-                For community_a, store demographic info in four dictionaries (gender, descent, education, age) to compute distribution
+        if algorithms is None:
+            algorithms = (algorithm,)
+        elif not algorithm in algorithms:
+            algorithms = tuple(algorithms) + (algorithm,)
 
+        partitions = self.community_partitions(algorithms, seed) # All algorithms on the same Graph, in parallel if set_community_workers > 1
+        for name in algorithms:
+            print ('Communities of book', self.book_id, 'found by', name, ':', [sorted(members) for members in partitions[name]])
 
+        self.communities = partitions[algorithm]
+        self.community_a = self.communities[0] if len(self.communities) > 0 else set()
+        self.community_b = self.communities[1] if len(self.communities) > 1 else set()
+
+
+        distributions = community_distributions(self.Graph, self.communities) # One grouped count per characteristic, rows are communities
+
+        for characteristic, categories in DISTRIBUTION_CATEGORIES.items():
             """
-            # print ('character_id:', character_id, 'gender:', gender_nx[character_id])
-            # print ('character_id:', character_id, 'descent:', descent_nx[character_id])
-            # print ('character_id:', character_id, 'education:', education_nx[character_id])
-            # print ('character_id:', character_id, 'age:', age_nx[character_id])
-            if gender_nx[character_id] == '1':
-                self.gender_distribution_community_a['male'] += 1
-            elif gender_nx[character_id] == '2':
-                self.gender_distribution_community_a['female'] += 1
-            elif gender_nx[character_id] == '99':
-                self.gender_distribution_community_a['unknown'] += 1
-
-            if descent_nx[character_id] == '0':
-                self.descent_distribution_community_a['non-migrant'] += 1
-            elif descent_nx[character_id] == '1':
-                self.descent_distribution_community_a['migrant'] += 1
-            elif descent_nx[character_id] == '99':
-                self.descent_distribution_community_a['unknown'] += 1
-            
-            if education_nx[character_id] == '1':
-                self.education_distribution_community_a['high education'] += 1
-            elif education_nx[character_id] == '2':
-                self.education_distribution_community_a['low education'] += 1
-            elif education_nx[character_id] == '99':
-                self.education_distribution_community_a['unknown'] += 1
-
-            if age_nx[character_id] == '1':
-                self.age_distribution_community_a['<25'] += 1
-            elif age_nx[character_id] == '2':
-                self.age_distribution_community_a['26-35'] += 1
-            elif age_nx[character_id] == '3':
-                self.age_distribution_community_a['36-45'] += 1
-            elif age_nx[character_id] == '4':
-                self.age_distribution_community_a['46-55'] += 1
-            elif age_nx[character_id] == '5':
-                self.age_distribution_community_a['56-64'] += 1
-            elif age_nx[character_id] == '6':
-                self.age_distribution_community_a['65+'] += 1
-            elif age_nx[character_id] == '99':
-                self.age_distribution_community_a['unknown'] += 1
-
-
-        print ('male characters in community_a of book', self.book_id, self.gender_distribution_community_a['male'])
-        print ('female characters in community_a of book', self.book_id, self.gender_distribution_community_a['female'])
-        print ('unknown gender characters in community_a of book', self.book_id, self.gender_distribution_community_a['unknown'])
-
-        print ('non-migrant characters in community_a of book', self.book_id, self.descent_distribution_community_a['non-migrant'])
-        print ('migrant characters in community_a of book', self.book_id, self.descent_distribution_community_a['migrant'])
-        print ('unknown descent characters in community_a of book', self.book_id, self.descent_distribution_community_a['unknown'])
-
-        print ('higher educated characters in community_a of book', self.book_id, self.education_distribution_community_a['high education'])
-        print ('lower educated characters in community_a of book', self.book_id, self.education_distribution_community_a['low education'])
-        print ('unknown education characters in community_a of book', self.book_id, self.education_distribution_community_a['unknown'])
-
-        print ('age <25 characters in community_a of book', self.book_id, self.age_distribution_community_a['<25'])
-        print ('age 26-35 characters in community_a of book', self.book_id, self.age_distribution_community_a['26-35'])
-        print ('age 36-45 characters in community_a of book', self.book_id, self.age_distribution_community_a['36-45'])
-        print ('age 46-55 characters in community_a of book', self.book_id, self.age_distribution_community_a['46-55'])
-        print ('age 56-64 characters in community_a of book', self.book_id, self.age_distribution_community_a['56-64'])
-        print ('age unknown characters in community_a of book', self.book_id, self.age_distribution_community_a['unknown'])
-
-
-        for character_id in self.community_b:
-            """
-                For community_b, store demographic info in four dictionaries (gender, descent, education, age) to compute distribution
+                Store the distributions of the book as a whole (all communities), community_a and community_b in the distribution tables
 
 
             """
-            # print ('character_id:', character_id, 'gender:', gender_nx[character_id])
-            # print ('character_id:', character_id, 'descent:', descent_nx[character_id])
-            # print ('character_id:', character_id, 'education:', education_nx[character_id])
-            # print ('character_id:', character_id, 'age:', age_nx[character_id])
-
-            if gender_nx[character_id] == '1':
-                self.gender_distribution_community_b['male'] += 1
-            elif gender_nx[character_id] == '2':
-                self.gender_distribution_community_b['female'] += 1
-            elif gender_nx[character_id] == '99':
-                self.gender_distribution_community_b['unknown'] += 1
-
-            if descent_nx[character_id] == '0':
-                self.descent_distribution_community_b['non-migrant'] += 1
-            elif descent_nx[character_id] == '1':
-                self.descent_distribution_community_b['migrant'] += 1
-            elif descent_nx[character_id] == '99':
-                self.descent_distribution_community_b['unknown'] += 1
-            
-            if education_nx[character_id] == '1':
-                self.education_distribution_community_b['high education'] += 1
-            elif education_nx[character_id] == '2':
-                self.education_distribution_community_b['low education'] += 1
-            elif education_nx[character_id] == '99':
-                self.education_distribution_community_b['unknown'] += 1
-
-            if age_nx[character_id] == '1':
-                self.age_distribution_community_b['<25'] += 1
-            elif age_nx[character_id] == '2':
-                self.age_distribution_community_b['26-35'] += 1
-            elif age_nx[character_id] == '3':
-                self.age_distribution_community_b['36-45'] += 1
-            elif age_nx[character_id] == '4':
-                self.age_distribution_community_b['46-55'] += 1
-            elif age_nx[character_id] == '5':
-                self.age_distribution_community_b['56-64'] += 1
-            elif age_nx[character_id] == '6':
-                self.age_distribution_community_b['65+'] += 1
-            elif age_nx[character_id] == '99':
-                self.age_distribution_community_b['unknown'] += 1
-
-
-        print ('male characters in community_b of book', self.book_id, self.gender_distribution_community_b['male'])
-        print ('female characters in community_b of book', self.book_id, self.gender_distribution_community_b['female'])
-        print ('unknown gender characters in community_b of book', self.book_id, self.gender_distribution_community_b['unknown'])
-
-        print ('non-migrant characters in community_b of book', self.book_id, self.descent_distribution_community_b['non-migrant'])
-        print ('migrant characters in community_b of book', self.book_id, self.descent_distribution_community_b['migrant'])
-        print ('unknown descent characters in community_b of book', self.book_id, self.descent_distribution_community_b['unknown'])
-
-        print ('higher educated characters in community_b of book', self.book_id, self.education_distribution_community_b['high education'])
-        print ('lower educated characters in community_b of book', self.book_id, self.education_distribution_community_b['low education'])
-        print ('unknown education characters in community_b of book', self.book_id, self.education_distribution_community_b['unknown'])
-
-        print ('age <25 characters in community_b of book', self.book_id, self.age_distribution_community_b['<25'])
-        print ('age 26-35 characters in community_b of book', self.book_id, self.age_distribution_community_b['26-35'])
-        print ('age 36-45 characters in community_b of book', self.book_id, self.age_distribution_community_b['36-45'])
-        print ('age 46-55 characters in community_b of book', self.book_id, self.age_distribution_community_b['46-55'])
-        print ('age 56-64 characters in community_b of book', self.book_id, self.age_distribution_community_b['56-64'])
-        print ('age unknown characters in community_b of book', self.book_id, self.age_distribution_community_b['unknown'])
+            counts = distributions[characteristic]
+            scopes = {'book': counts.sum(axis=0),
+                      'community_a': counts[0] if len(counts) > 0 else np.zeros(len(categories), dtype=np.int64),
+                      'community_b': counts[1] if len(counts) > 1 else np.zeros(len(categories), dtype=np.int64)}
+            for scope in DISTRIBUTION_SCOPES:
+                setattr(self, characteristic + '_distribution_' + scope, dict(zip(categories, scopes[scope].tolist())))
+
+        for scope in DISTRIBUTION_SCOPES:
+            print ('Distributions of book', self.book_id, '(' + scope + ') :', {characteristic: getattr(self, characteristic + '_distribution_' + scope) for characteristic in DISTRIBUTION_CATEGORIES})
 
 
         with open (filename, 'a', newline='') as f:
             csvwriter = csv.writer(f)
 
-            csvwriter.writerow([self.gender_distribution_book['male'], \
-                        self.gender_distribution_book['female'], \
-                        self.gender_distribution_book['unknown'], \
-                        self.gender_distribution_community_a['male'], \
-                        self.gender_distribution_community_a['female'], \
-                        self.gender_distribution_community_a['unknown'], \
-                        self.gender_distribution_community_b['male'], \
-                        self.gender_distribution_community_b['female'], \
-                        self.gender_distribution_community_b['unknown'], \
-                        self.descent_distribution_book['non-migrant'], \
-                        self.descent_distribution_book['migrant'], \
-                        self.descent_distribution_book['unknown'], \
-                        self.descent_distribution_community_a['non-migrant'], \
-                        self.descent_distribution_community_a['migrant'], \
-                        self.descent_distribution_community_a['unknown'], \
-                        self.descent_distribution_community_b['non-migrant'], \
-                        self.descent_distribution_community_b['migrant'], \
-                        self.descent_distribution_community_b['unknown'], \
-                        self.education_distribution_book['high education'], \
-                        self.education_distribution_book['low education'], \
-                        self.education_distribution_book['unknown'], \
-                        self.education_distribution_community_a['high education'], \
-                        self.education_distribution_community_a['low education'], \
-                        self.education_distribution_community_a['unknown'], \
-                        self.education_distribution_community_b['high education'], \
-                        self.education_distribution_community_b['low education'], \
-                        self.education_distribution_community_b['unknown'], \
-                        self.age_distribution_book['<25'], \
-                        self.age_distribution_book['26-35'], \
-                        self.age_distribution_book['36-45'], \
-                        self.age_distribution_book['46-55'], \
-                        self.age_distribution_book['56-64'], \
-                        self.age_distribution_book['65+'], \
-                        self.age_distribution_book['unknown'], \
-                        self.age_distribution_community_a['<25'], \
-                        self.age_distribution_community_a['26-35'], \
-                        self.age_distribution_community_a['36-45'], \
-                        self.age_distribution_community_a['46-55'], \
-                        self.age_distribution_community_a['56-64'], \
-                        self.age_distribution_community_a['65+'], \
-                        self.age_distribution_community_a['unknown'], \
-                        self.age_distribution_community_b['<25'], \
-                        self.age_distribution_community_b['26-35'], \
-                        self.age_distribution_community_b['36-45'], \
-                        self.age_distribution_community_b['46-55'], \
-                        self.age_distribution_community_b['56-64'], \
-                        self.age_distribution_community_b['65+'], \
-                        self.age_distribution_community_b['unknown']])
+            row = [] # Per characteristic: the book, community_a and community_b, with all categories
+            for characteristic, categories in DISTRIBUTION_CATEGORIES.items():
+                for scope in DISTRIBUTION_SCOPES:
+                    distribution = getattr(self, characteristic + '_distribution_' + scope)
+                    row.extend([distribution[category] for category in categories])
+            csvwriter.writerow(row)
 
 
 
@@ -0,0 +1,166 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from networkx.algorithms import community
+from networkstats_af import attribute_table
+
+
+# Categories of the demographic distributions (see Network.detect_communities), and the node attribute value of every category
+DISTRIBUTION_CATEGORIES = {'gender': ('male', 'female', 'unknown'),
+                           'descent': ('non-migrant', 'migrant', 'unknown'),
+                           'education': ('high education', 'low education', 'unknown'),
+                           'age': ('<25', '26-35', '36-45', '46-55', '56-64', '65+', 'unknown')}
+DISTRIBUTION_CODES = {'gender': ('1', '2', '99'),
+                      'descent': ('0', '1', '99'), # 0: Dutch or Belgian, 1: other descent
+                      'education': ('1', '2', '99'),
+                      'age': ('1', '2', '3', '4', '5', '6', '99')}
+
+
+community_workers = 1 # Number of worker processes among which the algorithms of detect_communities are divided, see set_community_workers()
+
+
+def set_community_workers(workers):
+    """ Sets the number of worker processes that run the community detection algorithms of one network side by side
+
+    """
+    global community_workers
+    community_workers = workers
+
+
+
+
+# 2. COMMUNITY DETECTION ALGORITHMS
+
+def greedy_modularity(graph, seed=None):
+    return [set(nodes) for nodes in community.greedy_modularity_communities(graph, weight='weight')]
+
+
+def label_propagation(graph, seed=None):
+    return [set(nodes) for nodes in community.label_propagation_communities(graph)]
+
+
+def asyn_lpa(graph, seed=None):
+    return [set(nodes) for nodes in community.asyn_lpa_communities(graph, weight='weight', seed=seed)]
+
+
+def kernighan_lin(graph, seed=None):
+    return [set(nodes) for nodes in community.kernighan_lin_bisection(graph, weight='weight', seed=seed)]
+
+
+def louvain(graph, seed=None):
+    return [set(nodes) for nodes in community.louvain_communities(graph, weight='weight', seed=seed)]
+
+
+def girvan_newman(graph, seed=None):
+    return [set(nodes) for nodes in next(community.girvan_newman(graph))] # First split of the dendrogram
+
+
+def k_clique(graph, seed=None):
+    return [set(nodes) for nodes in community.k_clique_communities(graph, 3)] # Communities of adjacent triangles, these may overlap and leave nodes out
+
+
+# Functions that divide a networkx Graph into a list of communities (sets of nodes), by name
+COMMUNITY_ALGORITHMS = {'greedy_modularity': greedy_modularity,
+                        'label_propagation': label_propagation,
+                        'asyn_lpa': asyn_lpa,
+                        'kernighan_lin': kernighan_lin,
+                        'louvain': louvain,
+                        'girvan_newman': girvan_newman,
+                        'k_clique': k_clique}
+
+
+
+worker_graph = None # Graph of the network in a worker process of run_algorithms
+
+
+def init_community_worker(graph):
+    """ Stores the network in a worker process once, instead of sending it with every algorithm
+
+    """
+    global worker_graph
+    worker_graph = graph
+
+
+
+def run_worker_algorithm(arguments):
+    algorithm, seed = arguments
+    return COMMUNITY_ALGORITHMS[algorithm](worker_graph, seed)
+
+
+
+def run_algorithms(graph, algorithms, seed=None, workers=None):
+    """ Runs several community detection algorithms on one networkx Graph
+
+    With more than one worker (see set_community_workers) the algorithms run side by side in a pool of worker processes,
+    which all receive the Graph once.
+
+    Output:
+        dictionary with algorithm as key and its list of communities (sets of character_id's) as value
+
+    """
+
+    for algorithm in algorithms:
+        if not algorithm in COMMUNITY_ALGORITHMS:
+            raise ValueError('unknown community detection algorithm: ' + str(algorithm))
+
+    if workers is None:
+        workers = community_workers
+    workers = min(workers, len(algorithms))
+
+    if workers > 1 and not multiprocessing.current_process().daemon: # Worker processes of a pool can not start a pool themselves
+        with ProcessPoolExecutor(workers, initializer=init_community_worker, initargs=(graph,)) as executor:
+            partitions = list(executor.map(run_worker_algorithm, [(algorithm, seed) for algorithm in algorithms]))
+    else:
+        partitions = [COMMUNITY_ALGORITHMS[algorithm](graph, seed) for algorithm in algorithms]
+
+    return dict(zip(algorithms, partitions))
+
+
+
+
+# 3. DEMOGRAPHIC DISTRIBUTIONS
+
+def community_labels(nodes, communities):
+    """ Returns an array with the number of the community of every node (-1 for nodes that are in no community)
+
+    """
+
+    index = {node: nr for nr, node in enumerate(nodes)}
+    labels = np.full(len(nodes), -1, dtype=np.int64)
+    for label, members in enumerate(communities):
+        for node in members:
+            labels[index[node]] = label
+    return labels
+
+
+
+def community_distributions(graph, communities):
+    """ Counts the characters per category of gender, descent, education and age in every community, with one grouped count per attribute
+
+    Nodes whose attribute is not set or has a value without category are not counted
+
+    Output:
+        dictionary with attribute as key and an array (communities x categories of DISTRIBUTION_CATEGORIES) of counts as value;
+        the distribution of the whole book is the sum over the communities
+
+    """
+
+    nodes, table = attribute_table(graph, tuple(DISTRIBUTION_CATEGORIES))
+    labels = community_labels(nodes, communities)
+    nrofcommunities = len(communities)
+
+    distributions = {}
+    for attribute, categories in DISTRIBUTION_CATEGORIES.items():
+        codes, values = table[attribute]
+        category_of_value = np.array([DISTRIBUTION_CODES[attribute].index(value) if value in DISTRIBUTION_CODES[attribute] else -1 for value in values], dtype=np.int64)
+        nodecategories = category_of_value[codes]
+        counted = (labels >= 0) & (nodecategories >= 0)
+        counts = np.bincount(labels[counted] * len(categories) + nodecategories[counted], minlength=nrofcommunities * len(categories))
+        distributions[attribute] = counts.reshape(nrofcommunities, len(categories))
+    return distributions
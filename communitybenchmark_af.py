@@ -0,0 +1,220 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import math
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from networkx.algorithms import community
+from communities_af import COMMUNITY_ALGORITHMS
+
+
+# Columns of the benchmark rows, one row per algorithm, network and seed
+BENCHMARK_COLUMNS = ['book_id', 'algorithm', 'seed', 'nodes', 'edges', 'communities', 'seconds', 'peak_memory', 'modularity', 'nmi_reference', 'ari_reference', 'nmi_repeat', 'ari_repeat']
+
+
+# 2. PARTITION AGREEMENT
+
+def partition_labels(nodes, communities):
+    """ Returns an array with a community label for every node, so that every partition covers all nodes once:
+    nodes in several communities (k_clique) get the first one, nodes in no community get a community of their own
+
+    """
+
+    index = {node: nr for nr, node in enumerate(nodes)}
+    labels = np.full(len(nodes), -1, dtype=np.int64)
+    for label, members in enumerate(communities):
+        for node in members:
+            if labels[index[node]] == -1:
+                labels[index[node]] = label
+    missing = labels == -1
+    labels[missing] = len(communities) + np.arange(missing.sum())
+    return labels
+
+
+
+def contingency_table(labels1, labels2):
+    """ Returns the number of nodes in every pair of communities of two partitions (as an array)
+
+    """
+
+    values1, codes1 = np.unique(labels1, return_inverse=True)
+    values2, codes2 = np.unique(labels2, return_inverse=True)
+    table = np.zeros((len(values1), len(values2)))
+    np.add.at(table, (codes1.ravel(), codes2.ravel()), 1)
+    return table
+
+
+
+def normalized_mutual_information(labels1, labels2):
+    """ Normalized mutual information of two partitions (mutual information divided by the mean of the entropies, 1 for equal partitions)
+
+    """
+
+    n = len(labels1)
+    if n == 0:
+        return 1.0
+    table = contingency_table(labels1, labels2) / n
+    rows = table.sum(axis=1)
+    columns = table.sum(axis=0)
+    entropy1 = -np.sum(rows * np.log(rows))
+    entropy2 = -np.sum(columns * np.log(columns))
+    if entropy1 == 0 and entropy2 == 0: # Both partitions have one community
+        return 1.0
+    nonzero = table > 0
+    mutual = np.sum(table[nonzero] * np.log(table[nonzero] / np.outer(rows, columns)[nonzero]))
+    return float(max(0.0, mutual / ((entropy1 + entropy2) / 2)))
+
+
+
+def adjusted_rand_index(labels1, labels2):
+    """ Adjusted Rand index of two partitions (1 for equal partitions, around 0 for random ones)
+
+    """
+
+    n = len(labels1)
+    if n < 2:
+        return 1.0
+    table = contingency_table(labels1, labels2)
+    pairs = np.sum(table * (table - 1)) / 2
+    pairs1 = np.sum(table.sum(axis=1) * (table.sum(axis=1) - 1)) / 2
+    pairs2 = np.sum(table.sum(axis=0) * (table.sum(axis=0) - 1)) / 2
+    expected = pairs1 * pairs2 / (n * (n - 1) / 2)
+    maximum = (pairs1 + pairs2) / 2
+    if maximum == expected: # Both partitions put all nodes together or all apart
+        return 1.0
+    return float((pairs - expected) / (maximum - expected))
+
+
+
+def partition_modularity(graph, nodes, labels):
+    """ Weighted modularity of a partition given by labels, NaN for networks without edges
+
+    """
+
+    if graph.size(weight='weight') == 0:
+        return float('nan')
+    communities = {}
+    for node, label in zip(nodes, labels.tolist()):
+        communities.setdefault(label, set()).add(node)
+    return community.modularity(graph, list(communities.values()), weight='weight')
+
+
+
+
+# 3. BENCHMARK
+
+def benchmark_network(book_id, graph, algorithms, repeats=3, reference='greedy_modularity', seed=0):
+    """ Runs every algorithm repeats times (with seeds seed, seed+1, ...) on the Graph of one network, one after the other
+
+    Every run is timed and its peak memory (of Python objects, with tracemalloc) is measured. The partitions are compared with that of the
+    reference algorithm (nmi_reference, ari_reference) and with the previous run of the same algorithm (nmi_repeat, ari_repeat:
+    the stability of randomized algorithms, empty for the first run).
+
+    Output:
+        list of rows with the columns of BENCHMARK_COLUMNS
+
+    """
+
+    nodes = list(graph.nodes())
+    referencelabels = None
+    if reference is not None:
+        referencelabels = partition_labels(nodes, COMMUNITY_ALGORITHMS[reference](graph, seed))
+
+    rows = []
+    for algorithm in algorithms:
+        previous = None
+        for repeat in range(repeats):
+            tracemalloc.start()
+            start = time.perf_counter()
+            communities = COMMUNITY_ALGORITHMS[algorithm](graph, seed + repeat)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            labels = partition_labels(nodes, communities)
+            row = {'book_id': book_id, 'algorithm': algorithm, 'seed': seed + repeat, 'nodes': len(nodes), 'edges': graph.number_of_edges(),
+                   'communities': len(communities), 'seconds': seconds, 'peak_memory': peak, 'modularity': partition_modularity(graph, nodes, labels),
+                   'nmi_reference': '', 'ari_reference': '', 'nmi_repeat': '', 'ari_repeat': ''}
+            if referencelabels is not None:
+                row['nmi_reference'] = normalized_mutual_information(referencelabels, labels)
+                row['ari_reference'] = adjusted_rand_index(referencelabels, labels)
+            if previous is not None:
+                row['nmi_repeat'] = normalized_mutual_information(previous, labels)
+                row['ari_repeat'] = adjusted_rand_index(previous, labels)
+            previous = labels
+            rows.append([row[column] for column in BENCHMARK_COLUMNS])
+
+    return rows
+
+
+
+def benchmark_communities(networks, algorithms=None, repeats=3, reference='greedy_modularity', seed=0, filename='community-benchmark.csv'):
+    """ Benchmarks the community detection algorithms on a list of Network objects (see benchmark_network) and
+    writes one row per algorithm, network and run to filename
+
+    Output:
+        comparison table (see comparison_table)
+
+    """
+
+    if algorithms is None:
+        algorithms = list(COMMUNITY_ALGORITHMS)
+    for algorithm in list(algorithms) + ([reference] if reference is not None else []):
+        if not algorithm in COMMUNITY_ALGORITHMS:
+            raise ValueError('unknown community detection algorithm: ' + str(algorithm))
+
+    rows = []
+    with open (filename, 'w', newline='') as f:
+        csvwriter = csv.writer(f)
+        csvwriter.writerow(BENCHMARK_COLUMNS)
+        for network in networks:
+            print ('benchmarking community detection of book', network.book_id)
+            networkrows = benchmark_network(network.book_id, network.Graph, algorithms, repeats, reference, seed)
+            csvwriter.writerows(networkrows)
+            rows.extend(networkrows)
+
+    return comparison_table(rows)
+
+
+
+def comparison_table(rows):
+    """ Summarizes the benchmark rows per algorithm: total and largest time, largest peak memory, and mean modularity and agreement
+
+    The time is fitted as a power of the size of the networks (seconds ~ nodes^exponent), to show how the algorithms scale
+
+    Output:
+        pandas DataFrame with one row per algorithm
+
+    """
+
+    frame = pd.DataFrame(rows, columns=BENCHMARK_COLUMNS)
+    for column in ('modularity', 'nmi_reference', 'ari_reference', 'nmi_repeat', 'ari_repeat'):
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+
+    table = frame.groupby('algorithm', sort=False).agg(networks=('book_id', 'nunique'),
+                                                        total_seconds=('seconds', 'sum'),
+                                                        max_seconds=('seconds', 'max'),
+                                                        max_peak_memory=('peak_memory', 'max'),
+                                                        modularity=('modularity', 'mean'),
+                                                        communities=('communities', 'mean'),
+                                                        nmi_reference=('nmi_reference', 'mean'),
+                                                        ari_reference=('ari_reference', 'mean'),
+                                                        nmi_repeat=('nmi_repeat', 'mean'),
+                                                        ari_repeat=('ari_repeat', 'mean'))
+
+    exponents = {}
+    for algorithm, group in frame.groupby('algorithm', sort=False):
+        sized = group[(group['nodes'] > 1) & (group['seconds'] > 0)]
+        if sized['nodes'].nunique() > 1:
+            exponents[algorithm] = np.polyfit(np.log(sized['nodes']), np.log(sized['seconds']), 1)[0]
+        else:
+            exponents[algorithm] = math.nan
+    table['scaling_exponent'] = pd.Series(exponents)
+
+    return table.sort_values('total_seconds')
@@ -0,0 +1,253 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import multiprocessing
+import os
+from characternetworks_af import Book
+from tokenizer_af import get_tokenizer_pool
+from tokencache_af import set_sentence_cache, get_sentence_cache
+from centrality_af import batch_centralities, get_centrality_approximation
+
+
+# 2. INPUT
+
+def load_books(csvfiles):
+    """ Creates Book objects, Character objects and name variants for the whole corpus
+
+    Arguments:
+        csvfiles: dictionary with the paths of the csv-files 'books', 'nodes' and 'names'
+
+    Output:
+        allbooks: dictionary with book_id as key and Book object as value
+
+    """
+
+    with open(csvfiles['books'], 'rt') as csvfile1, \
+         open(csvfiles['nodes'], 'rt') as csvfile2, \
+         open(csvfiles['names'], 'rt') as csvfile4:
+        # Csv-file with information on each novel, columns: Book_ID, Title, Author, Publisher, Gender_author, Birthtyear_author Perspective (1stpers, 3rdpers, multi, other)
+        BOOKS_AF = csv.reader(csvfile1, delimiter=',')
+        # Csv-file with information on characters, columns: Book-ID, Character-ID, Name, Gender, Descent, Age, Education, Profession
+        NODES_AF = csv.reader(csvfile2, delimiter=',')
+        # Csv-file with information on name variances, columns: Book-ID, Character-ID, Name-ID, Name-variances
+        NAMES_AF = csv.reader(csvfile4, delimiter=',')
+
+        allbooks = {}
+
+        for line in BOOKS_AF:
+            """ Creates instances of Book for every novel in the corpus
+
+            """
+            book_id = line[0]
+
+            if book_id.isdigit(): # Check if book_id a digit
+
+                title = line[1]
+                name_author = line[2]
+                gender_author = line[3]
+                nationality_author = line[4]
+                publisher = line[5]
+                perspective = line[6]
+                filename = line[7]
+
+                allbooks[book_id] = Book(book_id, title, name_author, gender_author, nationality_author, publisher, perspective, filename)
+
+        for line in NODES_AF:
+            """ Creates instances of Character for every character in the corpus and adds them to instances of Book
+
+            """
+            book_id = line[0]
+
+
+            if book_id.isdigit(): # Check if book_id is a digit
+
+                character_id = line[1]
+                name = line[2]
+                gender = line[3]
+                #descent = line[4]
+                #age = line[5]
+                #education = line[6]
+                #profession = line[7]
+
+                allbooks[book_id].addcharacter(book_id, character_id, name, gender)
+
+
+        for line in NAMES_AF:
+            """ Adds name variants to instances of Character in instances of Book
+
+            """
+            book_id = line[0]
+
+            if book_id.isdigit(): # Check if book_id is a digit
+
+                character_id = line[1]
+                name = line[2]
+                name_variant = line[3]
+
+                if allbooks[book_id].allcharacters[character_id].name != name:
+                    print ('NAMES_AF DOES NOT CORRESPOND WELL WITH NODES_AF IN BOOK', book_id) # Raise error if there are mistakes or typo's in the two corresponding csv-files
+                    print (allbooks[book_id].allcharacters[character_id].name, name) # Print instance to which the error is due
+                    exit(1)
+
+
+                allbooks[book_id].allcharacters[character_id].addnamevariant(name_variant)
+
+
+        # for line in EDGES_AF_test:
+        #     """ Add edges to instances of Network in instances of Book
+
+        #     """
+        #     book_id = line[0]
+
+        #     if book_id.isdigit(): # Check if book_id is a digit
+
+        #         source = line[1]
+        #         target = line[2]
+        #         relation_type = line[3]
+
+
+        #         allbooks[book_id].network.add_edge(source, target, relation_type)
+
+    return allbooks
+
+
+
+def book_directory(bookpath, book):
+    """ Returns the directory of the plain text file of a Book object
+
+    bookpath is either one directory, or a dictionary with a directory per perspective (1, 2, 3, 4)
+
+    """
+
+    if isinstance(bookpath, dict):
+        return bookpath[book.perspective]
+    return bookpath
+
+
+
+
+# 3. COMPUTATION
+
+def compute_book(book, bookpath):
+    """ Computes all necessary steps for the construction of the character network of one Book object
+
+    Output:
+        (rows, errorrows): list of rows with all character info + their scores for the 5 centrality measures (see Network.rankings_rows),
+        and the rows with the standard errors of approximate betweenness and closeness (see Network.error_rows, empty for exact scores)
+
+    """
+
+    print('computing network of book '+str(book.book_id))
+
+    book.readfile(book_directory(bookpath, book)) # Call method readfile on Book objects with perspective (1, 2, 3)
+
+    book.novel_word_count() # Call method novel_word_count on each Book object
+
+    book.compute_network() # Computes weight of relations between Characters objects in Book objects
+
+    rows = book.network.rankings_rows()
+
+    errorrows = []
+    if get_centrality_approximation() is not None:
+        errorrows = book.network.error_rows()
+
+    book.free_text_views() # Free the derived text views of the book, they are not needed anymore
+
+    return rows, errorrows
+
+
+
+def rank_books_batch(books):
+    """ Ranks the characters of a list of Book objects whose weights are computed (compute_network with rank=False)
+
+    Degree, eigenvector and Katz centrality of all networks are computed at once, on one block-diagonal adjacency matrix
+    (see batch_centralities in centrality_af.py); betweenness and closeness are still computed per network
+
+    """
+
+    networks = []
+    for book in books:
+        book.network.normalize_weights(book.word_count) # Normalize weights by dividing through word_count
+        networks.append(book.network.nodes_and_edges(book.allcharacters))
+
+    for book, centralities in zip(books, batch_centralities(networks)):
+        book.network.networkx_ranking(book.allcharacters, centralities=centralities) # Rank all characters in Book objects with the centralities of the batch
+
+
+
+def estimate_cost(book, bookpath):
+    """ Rough estimate of the time needed to compute the network of a Book object: file size times number of characters
+
+    Only used to order the books, so that the most expensive books are started first
+
+    """
+
+    try:
+        filesize = os.path.getsize(os.path.join(book_directory(bookpath, book), book.filename))
+    except OSError:
+        filesize = 0
+    return filesize * (1 + len(book.allcharacters))
+
+
+
+def compute_book_task(arguments):
+    """ Computes one Book object in a worker process of compute_books_pool
+
+    Output:
+        (book_id, rows, errorrows, tokenizer statistics of the worker process)
+
+    """
+
+    book, bookpath = arguments
+    try:
+        rows, errorrows = compute_book(book, bookpath)
+    except SystemExit as exc: # exit() in a worker would leave the pool waiting forever
+        raise RuntimeError('computing book ' + str(book.book_id) + ' stopped with exit code ' + str(exc.code))
+    return (book.book_id, rows, errorrows, get_tokenizer_pool().stats())
+
+
+
+def compute_books_pool(books, bookpath, csvfile, workers, results=None, errorsfile=None):
+    """ Computes the networks of a list of Book objects with a pool of worker processes
+
+    Books are sent to the workers in order of estimated cost (longest first), and the rows are
+    appended to csvfile in the order of the list, as soon as all books before them are done.
+    The rows of every book are also added to results (a ResultsStore, see results_af.py) as soon as it is finished,
+    and the standard errors of approximate scores are appended to errorsfile in the same order.
+
+    Output:
+        tokenizerstats: dictionary with process id as key and tokenizer statistics (see TokenizerPool.stats) as value
+
+    """
+
+    order = {}
+    for nr, book in enumerate(books):
+        order[book.book_id] = nr
+
+    scheduled = sorted(books, key=lambda book: estimate_cost(book, bookpath), reverse=True)
+
+    finished = {}
+    nextnr = 0
+    tokenizerstats = {}
+
+    with multiprocessing.Pool(workers, initializer=set_sentence_cache, initargs=(get_sentence_cache(),)) as pool:
+        for book_id, rows, errorrows, stats in pool.imap_unordered(compute_book_task, [(book, bookpath) for book in scheduled]):
+            finished[order[book_id]] = (rows, errorrows)
+            tokenizerstats[stats['pid']] = stats
+            if results is not None:
+                results.add_book(book_id, rows)
+
+            while nextnr in finished: # Write all books that are next in line
+                rows, errorrows = finished.pop(nextnr)
+                with open (csvfile, 'a', newline='') as f:
+                    csv.writer(f).writerows(rows)
+                if errorsfile is not None:
+                    with open (errorsfile, 'a', newline='') as f:
+                        csv.writer(f).writerows(errorrows)
+                nextnr += 1
+
+    return tokenizerstats
@@ -0,0 +1,185 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import hashlib
+import json
+import os
+import tempfile
+from corpus_af import book_directory
+from centrality_af import get_centrality_engine, get_centrality_approximation
+
+
+# Increase when a change in the code changes the results, so that all books are computed again
+PIPELINE_VERSION = '3' # 2: word count used in normalize_weights counts words instead of characters, 3: first-person narrator per subbook
+
+
+# 2. FINGERPRINTS
+
+def hash_rows(rows):
+    return hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()
+
+
+
+def hash_file(path):
+    """ Returns the SHA-256 of a file, or None if it can not be read
+
+    """
+
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024*1024), b''):
+                digest.update(block)
+    except IOError:
+        return None
+    return digest.hexdigest()
+
+
+
+def centrality_settings():
+    """ Returns the settings of the centralities that change the results: the engine and the sample size, target error
+    and seed of approximate betweenness and closeness (see set_centrality_engine and set_centrality_approximation in centrality_af.py)
+
+    """
+
+    return {'engine': get_centrality_engine(), 'approximation': get_centrality_approximation()}
+
+
+
+def book_fingerprints(csvfiles, allbooks, bookpath, metadata=None):
+    """ Computes the fingerprint of every Book object: the hashes of everything its results depend on
+
+    The rows of the books are read from metadata (a MetadataStore, see metadata_af.py) if given, otherwise from the csv-files
+
+    Output:
+        fingerprints: dictionary with book_id as key and a dictionary with hashes of the novel file, the rows
+        of the book in BOOKS/NODES/NAMES, the pipeline version and the centrality settings as value
+        (so exact and approximate scores, or scores of different engines, are never mixed in one output)
+
+    """
+
+    rows = {}
+    for table in ('books', 'nodes', 'names'):
+        if metadata is not None:
+            for book_id, lines in metadata.rows(table, list(allbooks)).items():
+                rows.setdefault(book_id, {'books': [], 'nodes': [], 'names': []})[table].extend(lines)
+            continue
+        with open(csvfiles[table], 'rt') as csvfile:
+            for line in csv.reader(csvfile, delimiter=','):
+                book_id = line[0] if line else ''
+                if book_id in allbooks:
+                    rows.setdefault(book_id, {'books': [], 'nodes': [], 'names': []})[table].append(line)
+
+    centrality = hash_rows(centrality_settings())
+    fingerprints = {}
+    for book_id in allbooks:
+        book = allbooks[book_id]
+        bookrows = rows.get(book_id, {'books': [], 'nodes': [], 'names': []})
+        fingerprints[book_id] = {'text': hash_file(os.path.join(book_directory(bookpath, book), book.filename)),
+                                 'books': hash_rows(bookrows['books']),
+                                 'nodes': hash_rows(bookrows['nodes']),
+                                 'names': hash_rows(bookrows['names']),
+                                 'pipeline': PIPELINE_VERSION,
+                                 'centrality': centrality}
+    return fingerprints
+
+
+
+
+# 3. CLASS MANIFEST
+
+class Manifest:
+
+    """ A record of the fingerprints of the books in the last computed output, to recompute only the books whose input changed
+
+    Attributes:
+        path: A string representing the path of the manifest (json)
+        books: A dictionary with book_id as key and the fingerprint with which the book was computed as value
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.books = {}
+        if os.path.exists(path):
+            with open(path, 'rt') as f:
+                self.books = json.load(f)['books']
+
+
+
+    def changed(self, fingerprints, csvfile):
+        """ Returns the book_id's of the books that have to be computed again: new books, books with a different
+        fingerprint, and books that are missing in csvfile
+
+        """
+
+        inoutput = set(read_rankings(csvfile))
+        changed = []
+        for book_id in fingerprints:
+            if self.books.get(book_id) != fingerprints[book_id] or not book_id in inoutput:
+                changed.append(book_id)
+        return changed
+
+
+
+    def update(self, fingerprints, book_ids):
+        """ Stores the fingerprints of the books in book_ids (after they are computed), and forgets books that are not in fingerprints anymore
+
+        """
+
+        for book_id in book_ids:
+            self.books[book_id] = fingerprints[book_id]
+        for book_id in list(self.books):
+            if not book_id in fingerprints:
+                del self.books[book_id]
+
+
+
+    def save(self):
+        fd, temppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'pipeline': PIPELINE_VERSION, 'books': self.books}, f, indent=1, sort_keys=True)
+        os.replace(temppath, self.path)
+
+
+
+
+# 4. MERGING RESULTS
+
+def read_rankings(csvfile):
+    """ Reads the rows of a rankings csv-file (see Network.rankings_rows), grouped by book_id
+
+    Output:
+        dictionary with book_id as key and the list of rows of that book as value (empty if csvfile does not exist)
+
+    """
+
+    rankings = {}
+    if os.path.exists(csvfile):
+        with open(csvfile, 'rt', newline='') as f:
+            for line in csv.reader(f):
+                if line:
+                    rankings.setdefault(line[0], []).append(line)
+    return rankings
+
+
+
+def merge_rankings(csvfile, newcsvfile, book_ids):
+    """ Replaces the rows of the books in newcsvfile in csvfile, and writes csvfile again with the books in the order of book_ids
+
+    Books that are not in book_ids anymore are left out
+
+    """
+
+    rankings = read_rankings(csvfile)
+    rankings.update(read_rankings(newcsvfile))
+
+    fd, temppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csvfile)), suffix='.tmp')
+    with os.fdopen(fd, 'w', newline='') as f:
+        csvwriter = csv.writer(f)
+        for book_id in book_ids:
+            csvwriter.writerows(rankings.get(book_id, []))
+    os.replace(temppath, csvfile)
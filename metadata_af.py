@@ -0,0 +1,155 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+from characternetworks_af import Book
+
+
+METADATA_TABLES = ('books', 'nodes', 'names')
+METADATA_VERSION = '1' # Increase when the layout of the database changes, so that it is built again
+
+
+# 2. CLASS METADATASTORE
+
+class MetadataStore:
+
+    """ An indexed copy of BOOKS_AF, NODES_AF and NAMES_AF in a SQLite database, from which only the Book objects of one task are created
+
+    The database is built from the csv-files when it does not exist yet, or when one of the csv-files changed (size or modification time).
+    Every row is stored with its book_id (indexed), its line number and the row itself, so that the rows of a book are read without
+    parsing the whole csv-files.
+
+    Attributes:
+        path: A string representing the path of the database
+        csvfiles: dictionary with the paths of the csv-files 'books', 'nodes' and 'names'
+    """
+
+    def __init__(self, path, csvfiles):
+        self.path = path
+        self.csvfiles = csvfiles
+        if self.is_stale():
+            self.build()
+        self.connection = sqlite3.connect(path)
+
+
+
+    def sources(self):
+        """ Returns the size and modification time of every csv-file, to find out whether the database is up to date
+
+        """
+
+        sources = {'version': METADATA_VERSION}
+        for table in METADATA_TABLES:
+            status = os.stat(self.csvfiles[table])
+            sources[table] = [os.path.abspath(self.csvfiles[table]), status.st_size, status.st_mtime_ns]
+        return sources
+
+
+
+    def is_stale(self):
+        if not os.path.exists(self.path):
+            return True
+        try:
+            connection = sqlite3.connect(self.path)
+            try:
+                stored = connection.execute('SELECT sources FROM sources').fetchone()
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError:
+            return True
+        return stored is None or json.loads(stored[0]) != self.sources()
+
+
+
+    def build(self):
+        """ Builds the database from the csv-files in a temporary file, which then replaces the database at once
+        (so that other tasks that start at the same time never read a half-built database)
+
+        """
+
+        print ('building metadata index', self.path)
+        sources = self.sources()
+        fd, temppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        os.close(fd)
+        connection = sqlite3.connect(temppath)
+        try:
+            with connection:
+                connection.execute('CREATE TABLE sources (sources TEXT)')
+                connection.execute('INSERT INTO sources VALUES (?)', (json.dumps(sources),))
+                for table in METADATA_TABLES:
+                    connection.execute('CREATE TABLE ' + table + ' (book_id TEXT NOT NULL, nr INTEGER NOT NULL, line TEXT NOT NULL)')
+                    with open(self.csvfiles[table], 'rt') as csvfile:
+                        rows = ((line[0], nr, json.dumps(line)) for nr, line in enumerate(csv.reader(csvfile, delimiter=',')) if line and line[0].isdigit())
+                        connection.executemany('INSERT INTO ' + table + ' VALUES (?, ?, ?)', rows)
+                    connection.execute('CREATE INDEX ' + table + '_book_id ON ' + table + ' (book_id, nr)')
+        finally:
+            connection.close()
+        os.replace(temppath, self.path)
+
+
+
+    def book_ids(self):
+        """ Returns the book_id's of all books in BOOKS_AF, sorted as numbers
+
+        """
+
+        return sorted([book_id for (book_id,) in self.connection.execute('SELECT DISTINCT book_id FROM books')], key=int)
+
+
+
+    def rows(self, table, book_ids):
+        """ Returns the rows of a table (as read from the csv-file) for a list of book_id's
+
+        Output:
+            dictionary with book_id as key and the list of its rows in the order of the csv-file as value
+
+        """
+
+        rows = {}
+        for book_id in book_ids:
+            rows[book_id] = [json.loads(line) for (line,) in self.connection.execute('SELECT line FROM ' + table + ' WHERE book_id = ? ORDER BY nr', (book_id,))]
+        return rows
+
+
+
+    def load_books(self, book_ids):
+        """ Creates the Book objects, Character objects and name variants of the books in book_ids only (see corpus_af.load_books)
+
+        Output:
+            dictionary with book_id as key and Book object as value
+
+        """
+
+        allbooks = {}
+
+        for book_id, lines in self.rows('books', book_ids).items():
+            for line in lines:
+                allbooks[book_id] = Book(line[0], line[1], line[2], line[3], line[4], line[5], line[6], line[7])
+
+        for book_id, lines in self.rows('nodes', book_ids).items():
+            for line in lines:
+                allbooks[book_id].addcharacter(book_id, line[1], line[2], line[3])
+
+        for book_id, lines in self.rows('names', book_ids).items():
+            for line in lines:
+                character_id = line[1]
+                name = line[2]
+                if allbooks[book_id].allcharacters[character_id].name != name:
+                    print ('NAMES_AF DOES NOT CORRESPOND WELL WITH NODES_AF IN BOOK', book_id) # Raise error if there are mistakes or typo's in the two corresponding csv-files
+                    print (allbooks[book_id].allcharacters[character_id].name, name) # Print instance to which the error is due
+                    exit(1)
+                allbooks[book_id].allcharacters[character_id].addnamevariant(line[3])
+
+        return allbooks
+
+
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,229 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import argparse
+import os
+import re
+import sys
+
+
+MODULE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+# 2. CLASS NAMEVARIANTMATCHER
+
+class NameVariantMatcher:
+
+    """ A one-pass multi-pattern matcher that replaces all name variants of all characters in a Book object with their markers
+
+    The name variants are stored in a prefix tree (trie) which is compiled into a single regular expression,
+    so that the whole text is scanned only once (Aho-Corasick style) instead of once for every name variant.
+    At every position in the text the longest name variant wins (leftmost-longest), which corresponds to the
+    'longest namevariant first' rule of Book.replace_namevariants. A name variant that contains a name variant which the
+    old str.replace loop replaces before it (e.g. 'Marianne' after 'Maria') is never replaced by that loop, so it is left out.
+
+    Attributes:
+        replacements: A dictionary with the name variants that are matched as keys and markers 'book_id_character_id_name_namevariant' as values
+        order: A list of tuples (name variant, marker) in the order in which the old str.replace loop would process them
+        is_exact: A boolean which is True when the one-pass scan gives the same text as the old str.replace loop
+            (for all texts in which name variants only overlap each other within words, see check_exact)
+        pattern: A compiled regular expression matching all name variants (None if there are no name variants)
+    """
+
+    def __init__(self, allcharacters):
+        self.replacements = {}
+        self.order = []
+
+        for character_id in allcharacters:
+            character = allcharacters[character_id]
+            for namevariant in sorted(character.namevariants,key=len,reverse=True): # Start with the longest namevariant per character
+                marked_name = '|'.join(list(character.name)) # Alter each name so that names won't be overwritten multiple times
+                marked_namevariant = '|'.join(list(namevariant)) # Alter each namevariant so that namevariant won't be overwritten multiple times
+                marker = character.book_id+'_'+character.character_id+'_'+marked_name.replace(' ','+++')+'_'+marked_namevariant.replace(' ','+++')
+                self.order.append((namevariant, marker))
+                if not namevariant in self.replacements: # If two characters share a namevariant, the first character wins (as with str.replace)
+                    self.replacements[namevariant] = marker
+
+        self.remove_broken_namevariants()
+        self.is_exact = self.check_exact()
+
+        self.pattern = None
+        if self.replacements:
+            self.pattern = re.compile(self.trie_to_regex(self.build_trie(self.replacements)))
+
+
+
+    def remove_broken_namevariants(self):
+        """ Leaves out the name variants that the old str.replace loop never replaces: a name variant that contains
+        another name variant which is replaced before it (e.g. 'Pieter Blaesz' after 'Piet') is broken up by that replacement
+        in every place where it occurs. The same holds for a name variant that is shared with an earlier character.
+
+        """
+
+        namevariants = list(self.replacements) # Unique name variants in the order in which they are replaced
+        for nr2, namevariant2 in enumerate(namevariants):
+            for namevariant1 in namevariants[:nr2]:
+                if namevariant1 in namevariant2:
+                    del self.replacements[namevariant2]
+                    break
+
+
+
+    def build_trie(self, namevariants):
+        """ Builds a prefix tree of all name variants
+
+        Every node is a dictionary with characters as keys and child nodes as values, the key '' marks the end of a name variant
+
+        """
+
+        trie = {}
+        for namevariant in namevariants:
+            node = trie
+            for char in namevariant:
+                node = node.setdefault(char, {})
+            node[''] = True
+        return trie
+
+
+
+    def trie_to_regex(self, node):
+        """ Converts a (sub)tree of the prefix tree into a regular expression
+
+        Optional groups are greedy, so longer name variants are tried before the shorter ones they start with
+
+        """
+
+        alternatives = []
+        for char in sorted(key for key in node if key != ''):
+            alternatives.append(re.escape(char) + self.trie_to_regex(node[char]))
+
+        if not alternatives:
+            return ''
+
+        if len(alternatives) == 1:
+            regex = alternatives[0]
+        else:
+            regex = '(?:' + '|'.join(alternatives) + ')'
+
+        if '' in node: # A name variant ends here, so the rest is optional
+            if len(alternatives) == 1:
+                regex = '(?:' + regex + ')'
+            regex += '?'
+
+        return regex
+
+
+
+    def check_exact(self):
+        """ Checks whether the one-pass scan gives the same markedtext as calling str.replace for every name variant in turn
+
+        This is the case when:
+            - no name variant is empty, one character long, or contains digits, '_', '|' or '+' (which could match inside markers)
+            - no two name variants that are matched (see remove_broken_namevariants) can partially overlap each other
+              at a word boundary (see overlap_at_word_boundary), as 'Jan Piet' and 'Piet Bos' in 'Jan Piet Bos'
+
+        A name variant that contains a later one is replaced first in both cases (the longest match wins), so containment
+        does not matter. Overlaps within words (as 'Wim' and 'meneer Veninga' in 'Wimeneer Veninga') are not checked, as
+        names do not occur like that in a text. Otherwise Book.replace_namevariants falls back on the old str.replace loop.
+
+        """
+
+        for namevariant, marker in self.order:
+            if len(namevariant) < 2:
+                return False
+            for char in namevariant:
+                if char.isdigit() or char in '_|+':
+                    return False
+
+        namevariants = list(self.replacements)
+        for namevariant1 in namevariants:
+            for namevariant2 in namevariants: # Including namevariant1 itself, as in 'Jan Jan'
+                if overlap_at_word_boundary(namevariant1, namevariant2):
+                    return False
+
+        return True
+
+
+
+    def sub(self, text, start=0, end=None):
+        """ Replaces all name variants in text[start:end] with their markers in one scan
+
+        A range is read directly from text, so text[start:end] itself is never copied
+
+        """
+
+        if end is None:
+            end = len(text)
+
+        if start == 0 and end == len(text):
+            if self.pattern is None:
+                return text
+            replacements = self.replacements
+            return self.pattern.sub(lambda match: replacements[match.group(0)], text)
+
+        if self.pattern is None:
+            return text[start:end]
+
+        pieces = []
+        position = start
+        for match in self.pattern.finditer(text, start, end):
+            pieces.append(text[position:match.start()])
+            pieces.append(self.replacements[match.group(0)])
+            position = match.end()
+        pieces.append(text[position:end])
+        return ''.join(pieces)
+
+
+
+
+# 3. OVERLAPS AND FALLBACK CHECK
+
+def overlap_at_word_boundary(namevariant1, namevariant2):
+    """ Checks whether the end of namevariant1 is the start of namevariant2, such that the overlapping characters begin at the
+    start of a word of namevariant1 or end at the end of a word of namevariant2, as 'Jan Piet' and 'Piet Bos' in 'Jan Piet Bos'
+    or 'Claude' and 'de Jongen' in 'Claude Jongen' (but not 'Wim' and 'meneer Veninga', which only overlap in 'Wimeneer Veninga')
+
+    """
+
+    for overlap in range(1, min(len(namevariant1), len(namevariant2))):
+        if namevariant1[-overlap:] == namevariant2[:overlap]:
+            starts_word = not namevariant1[-overlap-1].isalnum() or not namevariant1[-overlap].isalnum()
+            ends_word = not namevariant2[overlap].isalnum() or not namevariant2[overlap-1].isalnum()
+            if starts_word or ends_word:
+                return True
+    return False
+
+
+
+def fallback_books(books):
+    """ Returns the book_id's of the Book objects whose name variants can not be replaced in one scan (see check_exact),
+    so that Book.replace_namevariants falls back on the str.replace loop
+
+    """
+
+    return [book_id for book_id in books if not NameVariantMatcher(books[book_id].allcharacters).is_exact]
+
+
+
+argparser = argparse.ArgumentParser(description='Checks for how many books of the corpus the name variants are replaced with the slow str.replace loop')
+argparser.add_argument('--books', default=os.path.join(MODULE_DIRECTORY, 'BOOKS_AF.csv'), type=str, help='csv-file with the books')
+argparser.add_argument('--nodes', default=os.path.join(MODULE_DIRECTORY, 'NODES_AF.csv'), type=str, help='csv-file with the characters')
+argparser.add_argument('--names', default=os.path.join(MODULE_DIRECTORY, 'NAMES_AF.csv'), type=str, help='csv-file with the name variants')
+argparser.add_argument('--maximum', default=0.05, type=float, help='largest acceptable fraction of books that fall back on str.replace')
+
+
+if __name__ == '__main__':
+
+    from corpus_af import load_books # Not at the top, as characternetworks_af imports this module
+
+    parameters = vars(argparser.parse_args())
+    books = load_books({'books': parameters['books'], 'nodes': parameters['nodes'], 'names': parameters['names']})
+    fallback = fallback_books(books)
+    for book_id in fallback:
+        print ('book', book_id, books[book_id].title, 'falls back on str.replace')
+    print (len(fallback), 'of', len(books), 'books fall back on str.replace')
+    if len(fallback) > parameters['maximum'] * len(books):
+        sys.exit(1)
@@ -0,0 +1,180 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+
+# Node attributes of which the assortativity is computed, in the order of the columns of networkstats.csv
+ASSORTATIVITY_ATTRIBUTES = ('gender', 'descent', 'age', 'education')
+
+
+# 2. NODE ATTRIBUTES
+
+def attribute_table(graph, attributes=ASSORTATIVITY_ATTRIBUTES):
+    """ Reads the node attributes of a networkx Graph into one column of integer codes per attribute
+
+    Nodes without an attribute get the code of None, as with networkx (so attributes that are not set do not raise an error)
+
+    Output:
+        (nodes, table) with nodes in the order of the Graph and table a dictionary with attribute as key and
+        (array of codes per node, list of values per code) as value
+
+    """
+
+    nodes = list(graph.nodes())
+    table = {}
+    for attribute in attributes:
+        values = []
+        codes_of_values = {}
+        codes = np.empty(len(nodes), dtype=np.int64)
+        for nr, node in enumerate(nodes):
+            value = graph.nodes[node].get(attribute)
+            if not value in codes_of_values:
+                codes_of_values[value] = len(values)
+                values.append(value)
+            codes[nr] = codes_of_values[value]
+        table[attribute] = (codes, values)
+    return nodes, table
+
+
+
+def graph_adjacency(graph, nodes, weight='weight'):
+    """ Returns the symmetric weighted adjacency matrix (CSR) of a networkx Graph, with rows and columns in the order of nodes
+
+    Edges without weight get weight 1, as with networkx
+
+    """
+
+    index = {node: nr for nr, node in enumerate(nodes)}
+    rows = []
+    columns = []
+    values = []
+    for u, v, data in graph.edges(data=True):
+        rows.append(index[u])
+        columns.append(index[v])
+        values.append(data.get(weight, 1))
+        if u != v:
+            rows.append(index[v])
+            columns.append(index[u])
+            values.append(data.get(weight, 1))
+    n = len(nodes)
+    return scipy.sparse.csr_matrix((np.array(values, dtype=float), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))), shape=(n, n))
+
+
+
+
+# 3. STATISTICS
+
+def triangle_counts(adjacency):
+    """ Counts the triangles of every node once, for both transitivity and the clustering coefficient
+
+    Self loops are left out, as with networkx. The weighted triangles are those of nx.clustering: the geometric mean of the
+    three weights (scaled by the largest weight) summed over all triangles of a node.
+
+    Output:
+        (degrees, triangles, weighted_triangles) as arrays, with triangles and weighted_triangles counted twice per triangle (as networkx does)
+
+    """
+
+    offdiagonal = adjacency - scipy.sparse.diags(adjacency.diagonal())
+    offdiagonal.eliminate_zeros()
+    structure = offdiagonal.copy()
+    structure.data = np.ones_like(structure.data)
+
+    degrees = np.asarray(structure.sum(axis=1)).ravel()
+    triangles = np.asarray((structure @ structure).multiply(structure).sum(axis=1)).ravel()
+
+    weighted = offdiagonal.copy()
+    if weighted.nnz:
+        weighted.data = np.cbrt(weighted.data / adjacency.data.max()) # The largest weight includes self loops, as with networkx
+    weighted_triangles = np.asarray((weighted @ weighted).multiply(weighted).sum(axis=1)).ravel()
+
+    return degrees, triangles, weighted_triangles
+
+
+
+def mixing_matrix(adjacency, codes, size):
+    """ Returns the normalized attribute mixing matrix: the fraction of edge ends (both directions of every edge)
+    that join a node with code i to a node with code j
+
+    """
+
+    coo = adjacency.tocoo()
+    counts = np.bincount(codes[coo.row] * size + codes[coo.col], minlength=size * size).reshape(size, size).astype(float)
+    total = counts.sum()
+    if total > 0:
+        counts /= total
+    return counts
+
+
+
+def assortativity(mixing):
+    """ Attribute assortativity coefficient from a mixing matrix (as nx.attribute_assortativity_coefficient), NaN if it is undefined
+    (e.g. when all nodes have the same value)
+
+    """
+
+    s = float((mixing.sum(axis=0) * mixing.sum(axis=1)).sum())
+    t = float(mixing.trace())
+    if s == 1.0:
+        return float('nan')
+    return (t - s) / (1 - s)
+
+
+
+def network_statistics(graph, attributes=ASSORTATIVITY_ATTRIBUTES, weight='weight'):
+    """ Computes the statistics of compute_networkstats in one pass over one sparse adjacency matrix of a networkx Graph
+
+    The triangles are counted once and used for both transitivity and the (weighted) clustering coefficient, and the
+    assortativity of every attribute comes from a single mixing matrix. The results equal those of nx.density, nx.transitivity,
+    nx.average_clustering (weighted), nx.is_connected and nx.attribute_assortativity_coefficient (up to rounding).
+
+    Output:
+        dictionary with number_of_nodes, number_of_edges, density, triadic_closure, clustering_coefficient, is_connected
+        and the assortativity of every attribute (e.g. gender_assortativity)
+
+    """
+
+    nodes, table = attribute_table(graph, attributes)
+    adjacency = graph_adjacency(graph, nodes, weight)
+    n = len(nodes)
+    number_of_edges = graph.number_of_edges()
+
+    statistics = {'number_of_nodes': n, 'number_of_edges': number_of_edges}
+    statistics['density'] = 2.0 * number_of_edges / (n * (n - 1)) if n > 1 else 0
+
+    degrees, triangles, weighted_triangles = triangle_counts(adjacency)
+    triads = float((degrees * (degrees - 1)).sum())
+    statistics['triadic_closure'] = float(triangles.sum()) / triads if triangles.sum() > 0 else 0 # 0 without triangles, as nx.transitivity
+
+    possible = degrees * (degrees - 1)
+    clustering = np.divide(weighted_triangles, possible, out=np.zeros(n), where=(weighted_triangles > 0) & (possible > 0))
+    statistics['clustering_coefficient'] = float(clustering.mean()) if n > 0 else 0.0
+
+    statistics['is_connected'] = n > 0 and scipy.sparse.csgraph.connected_components(adjacency, directed=False, return_labels=False) == 1
+
+    for attribute in attributes:
+        codes, values = table[attribute]
+        statistics[attribute + '_assortativity'] = assortativity(mixing_matrix(adjacency, codes, len(values)))
+
+    return statistics
+
+
+
+
+# 4. OUTPUT
+
+def write_networkstats(networks, filename='networkstats.csv'):
+    """ Writes the statistics of a list of Network objects to a csv-file at once (see Network.networkstats_row)
+
+    """
+
+    with open (filename, 'a', newline='') as f:
+        csvwriter = csv.writer(f)
+        csvwriter.writerows([network.networkstats_row() for network in networks])
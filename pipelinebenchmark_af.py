@@ -0,0 +1,205 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import argparse
+import csv
+import math
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from corpus_af import load_books, book_directory
+from syntheticnovels_af import generate_corpus
+
+
+# Steps of the pipeline that are timed, in the order in which they run
+PIPELINE_STAGES = ('readfile', 'replace_namevariants', 'tokenize_text', 'count_names', 'co_occurrence_matrix', 'compute_network', 'networkx_ranking', 'write_to_csv')
+
+# Columns of the timing rows, one row per scale, book and stage
+TIMING_COLUMNS = ['scale', 'book_id', 'perspective', 'castsize', 'words', 'stage', 'seconds']
+
+
+# 2. TIMING
+
+def timed(function, *arguments):
+    start = time.perf_counter()
+    function(*arguments)
+    return time.perf_counter() - start
+
+
+
+def time_book(stagesbook, networkbook, bookpath, csvfile):
+    """ Times the steps of the pipeline for one novel
+
+    The separate steps (replace_namevariants, tokenize_text, count_names and co_occurrence_matrix) are timed on
+    stagesbook; compute_network as a whole (which runs these steps as well, or splits a multi-novel into subbooks), networkx_ranking
+    and write_to_csv on networkbook, a second Book object of the same novel. The separate steps are skipped for multi-novels
+    (perspective 3), whose steps only run on the subbooks within compute_network.
+
+    Output:
+        dictionary with stage as key and seconds as value
+
+    """
+
+    seconds = {}
+    directory = book_directory(bookpath, networkbook)
+
+    if stagesbook.perspective in ('1', '2'):
+        stagesbook.readfile(directory)
+        stagesbook.novel_word_count()
+        seconds['replace_namevariants'] = timed(stagesbook.replace_namevariants)
+        seconds['tokenize_text'] = timed(stagesbook.tokenize_text)
+        seconds['count_names'] = timed(stagesbook.count_names)
+        seconds['co_occurrence_matrix'] = timed(stagesbook.co_occurrence_matrix)
+        stagesbook.free_text_views()
+
+    seconds['readfile'] = timed(networkbook.readfile, directory)
+    networkbook.novel_word_count()
+    seconds['compute_network'] = timed(networkbook.compute_network, False)
+
+    def rank():
+        networkbook.network.normalize_weights(networkbook.word_count)
+        networkbook.network.networkx_ranking(networkbook.allcharacters)
+    seconds['networkx_ranking'] = timed(rank)
+    seconds['write_to_csv'] = timed(networkbook.write_to_csv, csvfile)
+    networkbook.free_text_views()
+
+    return seconds
+
+
+
+def benchmark_scale(scale, directory, novels, seed=0, repeats=1):
+    """ Generates a synthetic corpus (see generate_corpus) and times the pipeline on every novel, repeats times
+
+    Output:
+        list of rows with the columns of TIMING_COLUMNS (the fastest of the repeats per stage)
+
+    """
+
+    bookpath, csvfiles = generate_corpus(directory, novels, seed)
+    csvfile = os.path.join(directory, 'character-rankings.csv')
+
+    fastest = {}
+    for repeat in range(repeats):
+        if os.path.exists(csvfile):
+            os.remove(csvfile) # Only the rankings of the last repeat are kept
+        stagesbooks = load_books(csvfiles)
+        networkbooks = load_books(csvfiles) # Every step runs on fresh Book objects
+        for book_id in networkbooks:
+            print ('timing book', book_id, 'of scale', scale)
+            for stage, seconds in time_book(stagesbooks[book_id], networkbooks[book_id], bookpath, csvfile).items():
+                fastest[(book_id, stage)] = min(seconds, fastest.get((book_id, stage), math.inf))
+
+    rows = []
+    for book_id, settings in zip(networkbooks, novels):
+        for stage in PIPELINE_STAGES:
+            if (book_id, stage) in fastest:
+                rows.append([scale, book_id, settings['perspective'], settings['castsize'], settings['words'], stage, fastest[(book_id, stage)]])
+    return rows
+
+
+
+
+# 3. SCALING CURVES
+
+def scaling_curves(rows):
+    """ Summarizes the timings per stage and scale, and fits every stage as a power of the text length and of the cast size
+    (seconds ~ words^exponent, seconds ~ castsize^exponent, over all novels). When words and cast size grow together over the
+    scales, both exponents describe the same growth; vary one of them only to separate them.
+
+    Output:
+        (curves, exponents): pandas DataFrames with the total seconds per stage (rows) and scale (columns), and the exponents per stage
+
+    """
+
+    frame = pd.DataFrame(rows, columns=TIMING_COLUMNS)
+    curves = frame.pivot_table(index='stage', columns='scale', values='seconds', aggfunc='sum', sort=False).reindex([stage for stage in PIPELINE_STAGES if stage in set(frame['stage'])])
+
+    exponents = {}
+    for stage, group in frame.groupby('stage', sort=False):
+        group = group[group['seconds'] > 0]
+        exponents[stage] = {}
+        for variable in ('words', 'castsize'):
+            if group[variable].nunique() > 1:
+                exponents[stage][variable + '_exponent'] = np.polyfit(np.log(group[variable]), np.log(group['seconds']), 1)[0]
+            else:
+                exponents[stage][variable + '_exponent'] = math.nan
+    exponents = pd.DataFrame.from_dict(exponents, orient='index').reindex(curves.index)
+
+    return curves, exponents
+
+
+
+def plot_curves(rows, filename):
+    """ Plots the seconds of every stage against the text length (log-log), one line per stage
+
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    frame = pd.DataFrame(rows, columns=TIMING_COLUMNS)
+    figure, axes = plt.subplots(figsize=(8, 6))
+    for stage in PIPELINE_STAGES:
+        points = frame[frame['stage'] == stage].groupby('words')['seconds'].mean()
+        if len(points):
+            axes.plot(points.index, points.values, marker='o', label=stage)
+    axes.set_xscale('log')
+    axes.set_yscale('log')
+    axes.set_xlabel('words per novel')
+    axes.set_ylabel('seconds')
+    axes.legend()
+    figure.savefig(filename)
+    plt.close(figure)
+
+
+
+
+# 4. SCRIPT
+
+argparser = argparse.ArgumentParser(description='Times the steps of the character network pipeline on synthetic novels of several sizes')
+argparser.add_argument('--words', default=[10000, 40000, 160000], type=int, nargs='+', help='number of words per novel, one scale per value')
+argparser.add_argument('--castsizes', default=[10, 20, 40], type=int, nargs='+', help='number of characters per novel, per scale (the last value is used for the remaining scales)')
+argparser.add_argument('--namevariants', default=3, type=int, help='number of name variants per character')
+argparser.add_argument('--mentiondensity', default=0.03, type=float, help='fraction of the words that are mentions of a character')
+argparser.add_argument('--perspectives', default=['1', '2', '3'], nargs='+', choices=['1', '2', '3'], help='one novel per perspective per scale (3: multi-novel with subbook markers)')
+argparser.add_argument('--subbooks', default=3, type=int, help='number of subbooks of the multi-novels')
+argparser.add_argument('--repeats', default=1, type=int, help='number of times every novel is timed (the fastest time counts)')
+argparser.add_argument('--seed', default=0, type=int, help='seed of the generator of the synthetic novels')
+argparser.add_argument('--directory', default=None, type=str, help='directory in which the synthetic corpora are written (a temporary directory if not given)')
+argparser.add_argument('--output', default='pipeline-benchmark.csv', type=str, help='csv-file with the timing of every scale, novel and stage, the curves are written to <name>_curves.csv')
+argparser.add_argument('--plot', default=None, type=str, help='image file with the scaling curves (log-log)')
+
+
+if __name__ == '__main__':
+
+    parameters = vars(argparser.parse_args())
+
+    with tempfile.TemporaryDirectory() as temporarydirectory:
+        directory = parameters['directory'] or temporarydirectory
+
+        rows = []
+        for scalenr, words in enumerate(parameters['words']):
+            castsize = parameters['castsizes'][min(scalenr, len(parameters['castsizes']) - 1)]
+            scale = str(words) + ' words, ' + str(castsize) + ' characters'
+            novels = [{'castsize': castsize, 'namevariants': parameters['namevariants'], 'words': words, 'mentiondensity': parameters['mentiondensity'],
+                       'perspective': perspective, 'subbooks': parameters['subbooks']} for perspective in parameters['perspectives']]
+            rows.extend(benchmark_scale(scale, os.path.join(directory, 'scale_' + str(scalenr + 1)), novels, parameters['seed'] + scalenr, parameters['repeats']))
+
+    with open(parameters['output'], 'w', newline='') as f:
+        csvwriter = csv.writer(f)
+        csvwriter.writerow(TIMING_COLUMNS)
+        csvwriter.writerows(rows)
+
+    curves, exponents = scaling_curves(rows)
+    root, extension = os.path.splitext(parameters['output'])
+    curves.join(exponents).to_csv(root + '_curves' + extension)
+    print (curves.join(exponents).to_string())
+
+    if parameters['plot']:
+        plot_curves(rows, parameters['plot'])
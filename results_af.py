@@ -0,0 +1,152 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import os
+import sqlite3
+import pandas as pd
+
+
+# Columns of the rankings (see Network.rankings_rows) with their SQLite types
+RANKINGS_COLUMNS = [('book_id', 'TEXT NOT NULL'),
+                    ('character_id', 'TEXT NOT NULL'),
+                    ('name', 'TEXT'),
+                    ('gender', 'TEXT'),
+                    ('degree', 'REAL'),
+                    ('betweenness', 'REAL'),
+                    ('closeness', 'REAL'),
+                    ('eigenvector', 'REAL'),
+                    ('katz', 'REAL'),
+                    ('gender_author', 'TEXT'),
+                    ('corpus', 'TEXT')]
+
+
+# 2. CLASS RESULTSSTORE
+
+class ResultsStore:
+
+    """ A SQLite database with the rankings of all books of the corpus, in one table with a typed schema
+
+    The table 'rankings' has the columns of RANKINGS_COLUMNS, a primary key (book_id, character_id) and an index on character_id,
+    so that the rankings of a book or a character are read without parsing the whole output. Rows are buffered and written
+    in one transaction per flush; the rows of a book replace all its earlier rows, so a rerun into the same database updates it.
+
+    Attributes:
+        path: A string representing the path of the database
+        buffer: A dictionary with book_id as key and the rows of the book that are not written yet as value
+        buffersize: An integer representing the number of buffered books after which they are written
+    """
+
+    def __init__(self, path, buffersize=100):
+        self.path = path
+        self.buffer = {}
+        self.buffersize = buffersize
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS rankings (' + ', '.join(name + ' ' + sqltype for name, sqltype in RANKINGS_COLUMNS) + ', PRIMARY KEY (book_id, character_id))')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS rankings_character_id ON rankings (character_id)')
+        self.connection.commit()
+
+
+
+    def add_book(self, book_id, rows):
+        """ Buffers the rows of a book (see Network.rankings_rows), which replace its earlier rows when they are written
+
+        A book that is added again before the flush replaces its buffered rows as well
+
+        """
+
+        self.buffer[book_id] = rows
+        if len(self.buffer) >= self.buffersize:
+            self.flush()
+
+
+
+    def add_rankings(self, rankings):
+        """ Buffers the rows of several books, with rankings a dictionary with book_id as key and rows as value (see manifest_af.read_rankings)
+
+        """
+
+        for book_id in rankings:
+            self.add_book(book_id, rankings[book_id])
+
+
+
+    def flush(self):
+        """ Writes all buffered books in one transaction
+
+        """
+
+        if not self.buffer:
+            return
+        with self.connection:
+            self.connection.executemany('DELETE FROM rankings WHERE book_id = ?', [(book_id,) for book_id in self.buffer])
+            self.connection.executemany('INSERT OR REPLACE INTO rankings VALUES (' + ', '.join(['?'] * len(RANKINGS_COLUMNS)) + ')', # A character that occurs twice in the rows of a book keeps its last row
+                                        [self.typed_row(row) for book_id in self.buffer for row in self.buffer[book_id]])
+        self.buffer = {}
+
+
+
+    def typed_row(self, row):
+        """ Converts the values of a row to the types of RANKINGS_COLUMNS (rows read from a csv-file only contain strings)
+
+        """
+
+        typed = []
+        for value, (name, sqltype) in zip(row, RANKINGS_COLUMNS):
+            if sqltype == 'REAL':
+                typed.append(float(value))
+            else:
+                typed.append(str(value))
+        return typed
+
+
+
+    def remove_books(self, book_ids):
+        """ Removes books from the database (e.g. books that are not in the corpus anymore)
+
+        """
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM rankings WHERE book_id = ?', [(book_id,) for book_id in book_ids])
+
+
+
+    def book_ids(self):
+        return [book_id for (book_id,) in self.connection.execute('SELECT DISTINCT book_id FROM rankings')]
+
+
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+
+
+# 3. LOADING RESULTS
+
+def load_rankings(path, book_ids=None):
+    """ Loads the rankings from a database written by ResultsStore
+
+    Arguments:
+        path: path of the database
+        book_ids: list of book_id's to load (all books if None)
+
+    Output:
+        pandas DataFrame with the columns of RANKINGS_COLUMNS
+
+    """
+
+    if not os.path.exists(path):
+        raise IOError('no rankings database at ' + path)
+
+    connection = sqlite3.connect(path)
+    try:
+        if book_ids is None:
+            return pd.read_sql_query('SELECT * FROM rankings', connection)
+        book_ids = list(book_ids)
+        return pd.read_sql_query('SELECT * FROM rankings WHERE book_id IN (' + ', '.join(['?'] * len(book_ids)) + ')', connection, params=book_ids)
+    finally:
+        connection.close()
@@ -0,0 +1,185 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import numpy as np
+import scipy.sparse
+
+
+# 2. CLASS WEIGHTMATRIX
+
+class WeightMatrix:
+
+    """ A sparse accumulator of the weights between the characters of a Network object, indexed by character index
+
+    Weights are appended as (row, column, value) triplets (COO) and summed per pair when the matrix is used. The pairs keep
+    the order in which they were first added (sources in order of their first weight, targets per source in order of their
+    first weight), which is the order of the nested dictionaries that were used before, so networks are built in the same order.
+
+    Attributes:
+        rows: A list or array of the source index of every weight that was added
+        columns: A list or array of the target index of every weight that was added
+        values: A list or array of the weights that were added
+    """
+
+    __slots__ = ('rows', 'columns', 'values', 'coalesced')
+
+    def __init__(self, rows=(), columns=(), values=()):
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self.values = list(values)
+        self.coalesced = None # (rows, columns, values) as arrays with one entry per pair, in order of first addition
+
+
+
+    def add(self, row, column, value):
+        self.rows.append(row)
+        self.columns.append(column)
+        self.values.append(value)
+        self.coalesced = None
+
+
+
+    def add_many(self, rows, columns, values):
+        self.rows.extend(rows)
+        self.columns.extend(columns)
+        self.values.extend(values)
+        self.coalesced = None
+
+
+
+    def add_matrix(self, other, mapping=None):
+        """ Adds the weights of another WeightMatrix (a matrix sum), with mapping an array that converts the indices of other into indices of this matrix
+
+        """
+
+        rows, columns, values = other.pairs()
+        if mapping is not None:
+            rows = mapping[rows]
+            columns = mapping[columns]
+        self.add_many(rows.tolist(), columns.tolist(), values.tolist())
+
+
+
+    def pairs(self):
+        """ Returns the summed weight per pair as arrays (rows, columns, values), in order of first addition
+
+        """
+
+        if self.coalesced is None:
+            rows = np.asarray(self.rows, dtype=np.int64)
+            columns = np.asarray(self.columns, dtype=np.int64)
+            values = np.asarray(self.values, dtype=float)
+            if len(rows) == 0:
+                self.coalesced = (rows, columns, values)
+                return self.coalesced
+
+            size = int(max(rows.max(), columns.max())) + 1
+            keys = rows * size + columns
+            uniquekeys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            sums = np.bincount(inverse.ravel(), weights=values, minlength=len(uniquekeys))
+
+            uniquerows = uniquekeys // size
+            uniquecolumns = uniquekeys % size
+            rowfirst = np.full(size, len(rows), dtype=np.int64) # Position of the first weight of every source
+            np.minimum.at(rowfirst, rows, np.arange(len(rows)))
+            order = np.lexsort((first, rowfirst[uniquerows])) # Sources in order of their first weight, then targets in order of their first weight
+
+            self.coalesced = (uniquerows[order], uniquecolumns[order], sums[order])
+        return self.coalesced
+
+
+
+    def divide(self, divisor):
+        """ Returns a new WeightMatrix with all summed weights divided by divisor (one vectorized division)
+
+        """
+
+        rows, columns, values = self.pairs()
+        if divisor == 0 and len(values):
+            raise ZeroDivisionError('division by zero') # As dividing the weights one by one would
+        divided = WeightMatrix()
+        divided.rows, divided.columns, divided.values = rows, columns, values / divisor
+        divided.coalesced = (rows, columns, divided.values)
+        return divided
+
+
+
+    def tocsr(self, size):
+        """ Returns the summed weights as a size x size scipy CSR matrix
+
+        """
+
+        rows, columns, values = self.pairs()
+        return scipy.sparse.csr_matrix((values, (rows, columns)), shape=(size, size))
+
+
+
+    def __len__(self):
+        return len(self.pairs()[0])
+
+
+
+
+# 3. CLASS RELATIONMATRIX
+
+class RelationMatrix:
+
+    """ The types of relation between the characters of a Network object (lover, friend, enemy, ...), parallel to its WeightMatrix
+
+    Only pairs with a relation type are stored, as (row, column, code) triplets with the codes pointing into labels; every other
+    pair has the default type ('geen'). When a type is set twice for a pair, the last one counts.
+
+    Attributes:
+        default: A string representing the relation type of pairs without a type
+        labels: A list of the relation types, the code of a type is its position in this list
+        rows, columns, codes: Lists with the source index, target index and code of every relation type that was set
+    """
+
+    __slots__ = ('default', 'labels', 'codes_of_labels', 'rows', 'columns', 'codes')
+
+    def __init__(self, default='geen'):
+        self.default = default
+        self.labels = []
+        self.codes_of_labels = {}
+        self.rows = []
+        self.columns = []
+        self.codes = []
+
+
+
+    def set(self, row, column, label):
+        if not label in self.codes_of_labels:
+            self.codes_of_labels[label] = len(self.labels)
+            self.labels.append(label)
+        self.rows.append(row)
+        self.columns.append(column)
+        self.codes.append(self.codes_of_labels[label])
+
+
+
+    def get(self, row, column):
+        """ Returns the relation type of a pair (the default if it has none)
+
+        """
+
+        for nr in range(len(self.rows) - 1, -1, -1): # The last type that was set counts
+            if self.rows[nr] == row and self.columns[nr] == column:
+                return self.labels[self.codes[nr]]
+        return self.default
+
+
+
+    def tocsr(self, size):
+        """ Returns a size x size CSR matrix with code+1 of the relation type of every pair (0 for the default type)
+
+        """
+
+        last = {}
+        for row, column, code in zip(self.rows, self.columns, self.codes):
+            last[(row, column)] = code + 1
+        rows = np.array([pair[0] for pair in last], dtype=np.int64)
+        columns = np.array([pair[1] for pair in last], dtype=np.int64)
+        return scipy.sparse.csr_matrix((np.array(list(last.values()), dtype=np.int64), (rows, columns)), shape=(size, size))
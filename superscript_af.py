@@ -16,126 +16,154 @@ import glob
 import sys
 import errno
 import csv
-from characternetworks_af import Book, Character, Network
+from characternetworks_af import Book, Character, Network, set_subbook_workers
+from corpus_af import load_books, book_directory, compute_books_pool, rank_books_batch
+from workqueue_af import WorkQueue, run_queue_worker
+from manifest_af import Manifest, book_fingerprints, merge_rankings, read_rankings
+from results_af import ResultsStore
+from metadata_af import MetadataStore
+from networkstats_af import write_networkstats
+from communities_af import COMMUNITY_ALGORITHMS, set_community_workers
+from communitybenchmark_af import benchmark_communities
+import multiprocessing
+from tokenizer_af import get_tokenizer_pool
+from tokencache_af import SentenceCache, set_sentence_cache, get_sentence_cache
+from centrality_af import CENTRALITY_ENGINES, set_centrality_engine, set_centrality_approximation, set_betweenness_workers
 
 from variables_af import *
 
 argparser = argparse.ArgumentParser(description='computes character network of (subset of) novels')
 argparser.add_argument('--task', default=1, type=int, help='number of task when parallelising')
 argparser.add_argument('--total', default=1, type=int, help='total number of tasks when parallelising')
-args = argparser.parse_args()
-parameters=vars(args)
-task = parameters['task']
-total = parameters['total']
-if task > total:
-    sys.exit('task can not be higher than total!')
+argparser.add_argument('--workers', default=1, type=int, help='number of worker processes (books are sent to the workers longest first)')
+argparser.add_argument('--subbookworkers', default=1, type=int, help='number of worker processes for the subbooks of a multi-novel (perspective 3), only used when --workers is 1')
+argparser.add_argument('--queue', default=None, type=str, help='shared directory of a work queue, so several nodes can compute the corpus together and resume after a crash')
+argparser.add_argument('--leasetimeout', default=600, type=int, help='seconds after which a book claimed by a node without heartbeat is claimed again (with --queue)')
+argparser.add_argument('--maxattempts', default=3, type=int, help='number of times a failing book is tried (with --queue)')
+argparser.add_argument('--incremental', action='store_true', help='only compute books whose novel, BOOKS/NODES/NAMES rows, pipeline version or centrality settings (--centrality, --samplesize, --targeterror) changed since the last run, and merge them into the existing output')
+argparser.add_argument('--tokencache', default=None, type=str, help='directory of the on-disk cache of tokenized sentences (no cache if not given)')
+argparser.add_argument('--tokencachesize', default=1024, type=int, help='maximum size of the cache of tokenized sentences in MB')
+argparser.add_argument('--centrality', default='sparse', choices=CENTRALITY_ENGINES, help='engine for the centralities: sparse linear algebra and shared shortest paths (centrality_af.py) or networkx')
+argparser.add_argument('--samplesize', default=None, type=int, help='approximate betweenness and closeness from the shortest paths of this number of randomly chosen nodes (for large networks), their standard errors are written to <rankings>_errors.csv')
+argparser.add_argument('--targeterror', default=None, type=float, help='approximate betweenness and closeness, with the number of sampled nodes chosen for this error (if --samplesize is not given)')
+argparser.add_argument('--betweennessworkers', default=multiprocessing.cpu_count(), type=int, help='number of worker processes for betweenness and closeness of networks with at least --betweennessthreshold nodes, only used when --workers is 1')
+argparser.add_argument('--betweennessthreshold', default=1000, type=int, help='number of nodes from which on betweenness and closeness are computed in parallel')
+argparser.add_argument('--results', default=None, type=str, help='SQLite database to which the rankings of this task are written as well, with a typed schema and indexes (see results_af.py)')
+argparser.add_argument('--batchranking', action='store_true', help='compute degree, eigenvector and Katz centrality of all books of this task at once on one block-diagonal matrix, after all weights are computed (only without --workers and --queue)')
+argparser.add_argument('--networkstats', default=None, type=str, help='csv-file to which the network statistics of the books of this task are written at once (see networkstats_af.py, only without --workers and --queue)')
+argparser.add_argument('--communities', default=None, type=str, help='csv-file to which the demographic distributions of the communities of the books of this task are written (only without --workers and --queue)')
+argparser.add_argument('--communityalgorithm', default='kernighan_lin', choices=sorted(COMMUNITY_ALGORITHMS), help='community detection algorithm whose communities are written to --communities')
+argparser.add_argument('--communityalgorithms', default=[], nargs='*', choices=sorted(COMMUNITY_ALGORITHMS), help='other community detection algorithms that run on the same networks at the same time (their communities are printed)')
+argparser.add_argument('--communityworkers', default=1, type=int, help='number of worker processes that run the community detection algorithms of a network side by side')
+argparser.add_argument('--benchmarkcommunities', default=None, type=str, help='csv-file to which a benchmark of the community detection algorithms on the networks of this task is written (time, peak memory, modularity, NMI/ARI), with a comparison table in <name>_comparison.csv (only without --workers and --queue)')
+argparser.add_argument('--benchmarkalgorithms', default=None, nargs='*', choices=sorted(COMMUNITY_ALGORITHMS), help='algorithms to benchmark (all if not given)')
+argparser.add_argument('--benchmarkrepeats', default=3, type=int, help='number of runs (with different seeds) of every algorithm per network in the benchmark')
+argparser.add_argument('--metadata', default=None, type=str, help='SQLite index of BOOKS/NODES/NAMES (built when missing or outdated), so that only the books of this task are created')
+
+
+if __name__ == '__main__': # Worker processes import this file as well, they should not run the script
+
+    args = argparser.parse_args()
+    parameters=vars(args)
+    task = parameters['task']
+    total = parameters['total']
+    workers = parameters['workers']
+    if task > total:
+        sys.exit('task can not be higher than total!')
+    if workers < 1:
+        sys.exit('workers should be at least 1!')
+    if parameters['incremental'] and parameters['queue']:
+        sys.exit('--incremental can not be combined with --queue!')
+    if parameters['batchranking'] and (workers > 1 or parameters['queue']):
+        sys.exit('--batchranking can not be combined with --workers or --queue!')
+    if parameters['networkstats'] and (workers > 1 or parameters['queue']):
+        sys.exit('--networkstats can not be combined with --workers or --queue!')
+    if parameters['communities'] and (workers > 1 or parameters['queue']):
+        sys.exit('--communities can not be combined with --workers or --queue!')
+    if parameters['benchmarkcommunities'] and (workers > 1 or parameters['queue']):
+        sys.exit('--benchmarkcommunities can not be combined with --workers or --queue!')
+    if parameters['tokencache']:
+        set_sentence_cache(SentenceCache(parameters['tokencache'], parameters['tokencachesize']*1024*1024))
+    set_subbook_workers(parameters['subbookworkers'])
+    set_centrality_engine(parameters['centrality'])
+    set_centrality_approximation(parameters['samplesize'], parameters['targeterror'])
+    set_betweenness_workers(parameters['betweennessworkers'], parameters['betweennessthreshold'])
+    set_community_workers(parameters['communityworkers'])
     
 
-# 2. INPUT
+    # 2. INPUT
 
-with open(csvfiles['books'], 'rt') as csvfile1, \
-     open(csvfiles['nodes'], 'rt') as csvfile2, \
-     open(csvfiles['names'], 'rt') as csvfile4:
-    # Csv-file with information on each novel, columns: Book_ID, Title, Author, Publisher, Gender_author, Birthtyear_author Perspective (1stpers, 3rdpers, multi, other)
-    BOOKS_AF = csv.reader(csvfile1, delimiter=',')
-    # Csv-file with information on characters, columns: Book-ID, Character-ID, Name, Gender, Descent, Age, Education, Profession
-    NODES_AF = csv.reader(csvfile2, delimiter=',')
-    # Csv-file with information on name variances, columns: Book-ID, Character-ID, Name-ID, Name-variances
-    NAMES_AF = csv.reader(csvfile4, delimiter=',')
-
-    
-# 3. CREATE BOOK OBJECTS, CHARACTER OBJECTS, ADD NAME VARIANTS TO CHARACTER OBJECTS IN BOOKS OBJECTS, ADD EDGES TO NETWORK OBJECTS IN BOOK OBJECTS
-
-    allbooks = {}
-
-    for line in BOOKS_AF: 
-        """ Creates instances of Book for every novel in the corpus
-
-        """
-        book_id = line[0]
-
-        if book_id.isdigit(): # Check if book_id a digit
-
-            title = line[1]
-            name_author = line[2]
-            gender_author = line[3]
-            nationality_author = line[4]
-            publisher = line[5]
-            perspective = line[6]
-            filename = line[7]
-
-            allbooks[book_id] = Book(book_id, title, name_author, gender_author, nationality_author, publisher, perspective, filename)
-
-    for line in NODES_AF:
-        """ Creates instances of Character for every character in the corpus and adds them to instances of Book
-
-        """
-        book_id = line[0]
-
-
-        if book_id.isdigit(): # Check if book_id is a digit
-
-            character_id = line[1]
-            name = line[2]
-            gender = line[3]
-            #descent = line[4]
-            #age = line[5]
-            #education = line[6]
-            #profession = line[7]
-
-            allbooks[book_id].addcharacter(book_id, character_id, name, gender)
+    # 3. CREATE BOOK OBJECTS, CHARACTER OBJECTS, ADD NAME VARIANTS TO CHARACTER OBJECTS IN BOOKS OBJECTS, ADD EDGES TO NETWORK OBJECTS IN BOOK OBJECTS
 
-
-    for line in NAMES_AF:
-        """ Adds name variants to instances of Character in instances of Book 
-
-        """
-        book_id = line[0]
-
-        if book_id.isdigit(): # Check if book_id is a digit
-
-            character_id = line[1]
-            name = line[2]
-            name_variant = line[3]
-
-            if allbooks[book_id].allcharacters[character_id].name != name:
-                print ('NAMES_AF DOES NOT CORRESPOND WELL WITH NODES_AF IN BOOK', book_id) # Raise error if there are mistakes or typo's in the two corresponding csv-files
-                print (allbooks[book_id].allcharacters[character_id].name, name) # Print instance to which the error is due
-                exit(1)
-
-
-            allbooks[book_id].allcharacters[character_id].addnamevariant(name_variant)
-
-
-    # for line in EDGES_AF_test:
-    #     """ Add edges to instances of Network in instances of Book 
-
-    #     """
-    #     book_id = line[0]
-
-    #     if book_id.isdigit(): # Check if book_id is a digit
-
-    #         source = line[1]
-    #         target = line[2]
-    #         relation_type = line[3]
-
-
-    #         allbooks[book_id].network.add_edge(source, target, relation_type)
+    metadata = None
+    if parameters['metadata']:
+        metadata = MetadataStore(parameters['metadata'], csvfiles) # Only the book_id's are read here, the Book objects of this task are created below
+        bookids = metadata.book_ids()
+    else:
+        allbooks = load_books(csvfiles)
+        bookids = sorted(allbooks.keys(),key=int)
 
 
     # 4. OUTPUT
 
-    bookids = sorted(allbooks.keys(),key=int)
     tasksize = len(bookids) / total
     startnr = int((task-1) * tasksize)
     endnr = int((task) * tasksize)
 
     taskbookids = bookids[startnr:endnr]
 
+    if metadata is not None:
+        allbooks = metadata.load_books(taskbookids)
+
     csvfile = 'character_rankings.csv'
     if total > 1:
         csvfile = 'character_rankings_task_'+str(task)+'.csv'
 
+    errorsfile = None
+    root, extension = os.path.splitext(csvfile)
+    if parameters['samplesize'] is not None or parameters['targeterror'] is not None:
+        """ The standard errors of the approximate betweenness and closeness of every character are written next to the rankings (see Network.error_rows)
+
+        """
+        errorsfile = root + '_errors' + extension
+        if os.path.exists(errorsfile) and not parameters['incremental']:
+            os.remove(errorsfile) # Written again for all books of this task
+    elif os.path.exists(root + '_errors' + extension):
+        os.remove(root + '_errors' + extension) # Left by an approximate run, the scores of this run are exact
+
+    if parameters['incremental']:
+        """ Only computes the books that changed since the last run, the rows are written to a separate file and merged into csvfile afterwards
+
+        """
+        fingerprints = book_fingerprints(csvfiles, {book_id: allbooks[book_id] for book_id in taskbookids}, bookpath, metadata)
+        manifest = Manifest(csvfile + '.manifest.json')
+        changedbookids = set(manifest.changed(fingerprints, csvfile))
+
+        alltaskbookids = taskbookids
+        taskbookids = [book_id for book_id in alltaskbookids if book_id in changedbookids]
+        print (len(taskbookids), 'of', len(alltaskbookids), 'books changed since the last run')
+
+        rankingsfile = csvfile
+        csvfile = rankingsfile + '.new'
+        if os.path.exists(csvfile):
+            os.remove(csvfile) # Left behind by a run that crashed
+        if errorsfile is not None:
+            rankingserrorsfile = errorsfile
+            errorsfile = rankingserrorsfile + '.new'
+            if os.path.exists(errorsfile):
+                os.remove(errorsfile)
+
+    results = None
+    if parameters['results']:
+        """ The rankings of every book of this task are added to the database as soon as the book is finished, replacing its earlier rows
+
+        """
+        resultsfile = parameters['results']
+        if total > 1:
+            root, extension = os.path.splitext(resultsfile)
+            resultsfile = root + '_task_' + str(task) + extension
+        results = ResultsStore(resultsfile)
+
     # csvfile2 = 'networkstats.csv'
     # if total > 1:
     #     csvfile2 = 'networkstats_task_'+str(task)+'.csv'
@@ -150,6 +178,36 @@ with open(csvfiles['books'], 'rt') as csvfile1, \
 
 
 
+    if parameters['queue']:
+        """ Computes the books of this task together with other nodes that use the same queue directory, and merges the results when all books are finished
+
+        """
+        settings = {'lease_timeout': parameters['leasetimeout'], 'heartbeat': max(1, parameters['leasetimeout'] // 10), 'max_attempts': parameters['maxattempts']}
+        taskbooks = {book_id: allbooks[book_id] for book_id in taskbookids}
+        if workers > 1:
+            with multiprocessing.Pool(workers, initializer=set_sentence_cache, initargs=(get_sentence_cache(),)) as pool:
+                pool.map(run_queue_worker, [(parameters['queue'], settings, taskbooks, bookpath)] * workers)
+        else:
+            WorkQueue(parameters['queue'], **settings).run(taskbooks, bookpath)
+
+        missing = WorkQueue(parameters['queue'], **settings).merge(taskbookids, csvfile, results, errorsfile)
+        if missing:
+            print ('Books that failed', parameters['maxattempts'], 'times and are missing in', csvfile, ':', missing)
+            if results is not None:
+                results.remove_books(missing)
+        taskbookids = []
+
+
+    elif workers > 1:
+        """ Computes the books of this task in a pool of worker processes, the rows are written in the order of taskbookids
+
+        """
+        tokenizerstats = compute_books_pool([allbooks[book_id] for book_id in taskbookids], bookpath, csvfile, workers, results, errorsfile)
+        for stats in tokenizerstats.values():
+            get_tokenizer_pool().add_stats(stats) # Report on the tokenizers of all worker processes
+        taskbookids = []
+
+
     for book_id in taskbookids: 
         """ Computes all necessary steps for the construction of character networks and outputs centrality values per character to new csv file
 
@@ -159,13 +217,20 @@ with open(csvfiles['books'], 'rt') as csvfile1, \
         print('computing network of book '+str(book_id))
         #allbooks[book_id].readfile(bookpath[allbooks[book_id].perspective]) # Call method readfile on Book objects with perspective (1, 2, 3)
 
-        allbooks[book_id].readfile(bookpath) # Call method readfile on Book objects with perspective (1, 2, 3)
+        allbooks[book_id].readfile(book_directory(bookpath, allbooks[book_id])) # Call method readfile on Book objects with perspective (1, 2, 3)
 
         allbooks[book_id].novel_word_count() # Call method novel_word_count on each Book object
 
-        allbooks[book_id].compute_network() # Computes weight of relations between Characters objects in Book objects
+        allbooks[book_id].compute_network(rank=not parameters['batchranking']) # Computes weight of relations between Characters objects in Book objects
         
-        allbooks[book_id].write_to_csv(csvfile) # Writes to a csv file all character info + their scores for the 5 centrality measures
+        if not parameters['batchranking']:
+            allbooks[book_id].write_to_csv(csvfile) # Writes to a csv file all character info + their scores for the 5 centrality measures
+            if results is not None:
+                results.add_book(book_id, allbooks[book_id].network.rankings_rows())
+            if errorsfile is not None:
+                allbooks[book_id].network.write_errors_to_csv(errorsfile) # The standard errors of the approximate scores
+
+        allbooks[book_id].free_text_views() # Free the derived text views of the book, they are not needed anymore
 
 
         #allbooks[book_id].network.compute_networkstats(csvfile2)
@@ -175,6 +240,74 @@ with open(csvfiles['books'], 'rt') as csvfile1, \
         # allbooks[book_id].network.draw_network(gephi_file)
 
 
+    if parameters['batchranking'] and taskbookids:
+        """ Ranks the characters of all books of this task at once and writes them in the order of taskbookids
+
+        """
+        rank_books_batch([allbooks[book_id] for book_id in taskbookids])
+        for book_id in taskbookids:
+            allbooks[book_id].write_to_csv(csvfile)
+            if results is not None:
+                results.add_book(book_id, allbooks[book_id].network.rankings_rows())
+            if errorsfile is not None:
+                allbooks[book_id].network.write_errors_to_csv(errorsfile)
+
+
+    if parameters['networkstats'] and taskbookids:
+        """ Writes the network statistics of all books of this task at once, in the order of taskbookids
+
+        """
+        write_networkstats([allbooks[book_id].network for book_id in taskbookids], parameters['networkstats'])
+
+
+    if parameters['communities']:
+        for book_id in taskbookids:
+            allbooks[book_id].network.detect_communities(parameters['communities'], parameters['communityalgorithm'], parameters['communityalgorithms'])
+
+
+    if parameters['benchmarkcommunities'] and taskbookids:
+        """ Runs every community detection algorithm on every network of this task and compares their cost and results
+
+        """
+        comparison = benchmark_communities([allbooks[book_id].network for book_id in taskbookids], parameters['benchmarkalgorithms'], parameters['benchmarkrepeats'],
+                                           filename=parameters['benchmarkcommunities'])
+        root, extension = os.path.splitext(parameters['benchmarkcommunities'])
+        comparison.to_csv(root + '_comparison' + extension)
+        print (comparison.to_string())
+
+
+    if parameters['incremental']:
+        merge_rankings(rankingsfile, csvfile, alltaskbookids) # Replace the rows of the changed books in the existing output
+        if os.path.exists(csvfile):
+            os.remove(csvfile)
+        if errorsfile is not None:
+            merge_rankings(rankingserrorsfile, errorsfile, alltaskbookids) # The errors file has the book_id in its first column as well
+            if os.path.exists(errorsfile):
+                os.remove(errorsfile)
+            errorsfile = rankingserrorsfile
+        manifest.update(fingerprints, changedbookids)
+        manifest.save()
+        csvfile = rankingsfile
+
+
+    if results is not None:
+        if parameters['incremental']:
+            """ The unchanged books are already in the database, unless it was not used in the earlier runs
+
+            """
+            stored = set(results.book_ids())
+            unstored = [book_id for book_id in alltaskbookids if not book_id in stored and not book_id in changedbookids]
+            if unstored:
+                rankings = read_rankings(csvfile)
+                results.add_rankings({book_id: rankings[book_id] for book_id in unstored if book_id in rankings})
+        results.close()
+
+
+    print(get_tokenizer_pool().report()) # Time spent on setting up Ucto versus tokenizing
+    if get_sentence_cache() is not None:
+        print(get_sentence_cache().report())
+
+
 
 
 
@@ -0,0 +1,254 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import csv
+import itertools
+import os
+import random
+from namematcher_af import overlap_at_word_boundary
+
+
+MODULE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Words that make up most of a Dutch text, with their relative frequencies
+FUNCTION_WORDS = [('de', 60), ('het', 35), ('een', 35), ('en', 30), ('van', 25), ('in', 20), ('niet', 15), ('dat', 15), ('is', 15),
+                  ('hij', 14), ('zij', 12), ('was', 12), ('op', 10), ('te', 10), ('met', 10), ('zei', 9), ('voor', 8), ('er', 8), ('maar', 8),
+                  ('om', 7), ('aan', 7), ('ook', 6), ('als', 6), ('nog', 6), ('naar', 5), ('wel', 5), ('toen', 5), ('dan', 4), ('haar', 4), ('zijn', 4)]
+SENTENCE_STARTS = ['De', 'Het', 'Een', 'Hij', 'Zij', 'Ze', 'Toen', 'Maar', 'Dan', 'Daarna', 'Wij', 'Er']
+FIRST_PERSON_WORDS = [('ik', 10), ('mij', 3), ('mijn', 3), ('me', 2)]
+
+# Building blocks of Dutch-like content words and surnames
+ONSETS = ['b', 'd', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'z', 'st', 'kl', 'gr', 'br', 'sch', 'dr', 'sl']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'aa', 'ee', 'oo', 'ie', 'oe', 'ij', 'ui', 'eu']
+CODAS = ['', '', 'n', 'k', 't', 'l', 'r', 's', 'm', 'nd', 'ng', 'cht', 'rt']
+SURNAME_PREFIXES = ['', '', '', 'van ', 'de ', 'van der ', 'ter ', 'van den ']
+SURNAME_SUFFIXES = ['', 'sen', 'ma', 'stra', 'ink', 'man', 'ens', 'huis', 'berg']
+TITLES = {'1': 'meneer ', '2': 'mevrouw ', '99': 'dokter '}
+
+
+# 2. NAMES
+
+def read_first_names(filename):
+    """ Reads the first names of a name list of the repository (one 'name;frequency' per line)
+
+    """
+
+    names = []
+    with open(os.path.join(MODULE_DIRECTORY, filename), 'rt') as csvfile:
+        for line in csv.reader(csvfile, delimiter=';'):
+            if line and line[0].isalpha():
+                names.append(line[0])
+    return names
+
+
+
+def syllables(rng, count):
+    return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(count))
+
+
+
+def overlaps(namevariant, namevariants):
+    """ Checks whether namevariant partially overlaps itself or one of namevariants at a word boundary (as 'Wouter' and 'ter Horst'),
+    which would make Book.replace_namevariants fall back on the str.replace loop (see NameVariantMatcher.check_exact)
+
+    """
+
+    for other in list(namevariants) + [namevariant]:
+        if overlap_at_word_boundary(namevariant, other) or overlap_at_word_boundary(other, namevariant):
+            return True
+    return False
+
+
+
+def make_cast(rng, castsize, namevariants):
+    """ Creates the characters of a novel: a unique first name (from the Dutch name lists) and surname per character,
+    and up to namevariants name variants (first name, full name, surname, title + surname, nickname, ...). Name variants that
+    overlap each other are avoided, so that the name variants of every novel are replaced in one scan.
+
+    Output:
+        list of (name, gender, list of name variants) per character, the first character being the main character
+
+    """
+
+    firstnames = {'1': read_first_names('male_names_dutch.csv'), '2': read_first_names('female_names_dutch.csv')}
+    usedfirstnames = set()
+    usedsurnames = set()
+    usedvariants = set() # Name variants are unique within a novel
+    cast = []
+
+    for nr in range(castsize):
+        gender = rng.choice(['1', '1', '2', '2', '99'] if nr else ['1', '2'])
+        candidates = firstnames['1' if gender == '99' else gender]
+        firstname = rng.choice(candidates)
+        while firstname in usedfirstnames or overlaps(firstname, usedvariants):
+            firstname = rng.choice(candidates) if len(usedfirstnames) < len(candidates) // 2 else syllables(rng, 2).capitalize()
+        usedfirstnames.add(firstname)
+
+        surname = rng.choice(SURNAME_PREFIXES) + syllables(rng, rng.randint(1, 2)).capitalize() + rng.choice(SURNAME_SUFFIXES)
+        while surname in usedsurnames or overlaps(surname, usedvariants):
+            surname = rng.choice(SURNAME_PREFIXES) + syllables(rng, 2).capitalize() + rng.choice(SURNAME_SUFFIXES)
+        usedsurnames.add(surname)
+
+        name = firstname + ' ' + surname
+        variants = []
+        for variant in [firstname, name, surname, TITLES[gender] + surname, firstname[:3] + 'tje', firstname + ' ' + surname[0].upper() + surname[1:]]:
+            if len(variants) < namevariants and not variant in usedvariants and not overlaps(variant, usedvariants):
+                variants.append(variant)
+                usedvariants.add(variant)
+        for _ in range(100): # Give up on a name variant that keeps overlapping (the character gets fewer variants)
+            if len(variants) >= namevariants:
+                break
+            variant = firstname + ' ' + syllables(rng, 1).capitalize() + ' ' + surname # Names with a middle name
+            if not variant in usedvariants and not overlaps(variant, usedvariants):
+                variants.append(variant)
+                usedvariants.add(variant)
+        cast.append((name, gender, variants))
+
+    return cast
+
+
+
+
+# 3. TEXT
+
+def make_lexicon(rng, size=2000):
+    """ Returns a list of (word, weight) of Dutch-like content words with Zipf-distributed frequencies
+
+    """
+
+    words = list(dict.fromkeys(syllables(rng, rng.choice([1, 1, 2, 2, 3])) for _ in range(size)))
+    return [(word, 1.0 / rank) for rank, word in enumerate(words, 1)]
+
+
+
+def generate_text(rng, cast, words, mentiondensity, firstperson=False, scenelength=200):
+    """ Generates a Dutch-like text of about words words, in which the characters of cast are mentioned with one of their name variants
+
+    The text consists of scenes of about scenelength words in which a few characters are active (chosen by a Zipf distribution, so
+    there are main and minor characters), so that the characters form communities. About mentiondensity of all words are mentions.
+
+    Arguments:
+        cast: list of (name, gender, name variants), see make_cast
+        firstperson: whether the first character of cast is a first person narrator (referred to with 'ik' instead of by name)
+
+    Output:
+        the text as a string
+
+    """
+
+    lexicon = make_lexicon(rng)
+    vocabulary = FUNCTION_WORDS + [(word, 20.0 * weight) for word, weight in lexicon] + (FIRST_PERSON_WORDS if firstperson else [])
+    tokens = [word for word, weight in vocabulary]
+    cumulative = list(itertools.accumulate(weight for word, weight in vocabulary))
+
+    characterweights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(cast) + 1)))
+    mentionable = range(1 if firstperson else 0, len(cast))
+
+    paragraphs = []
+    written = 0
+    while written < words:
+        """ One scene: a paragraph with a few active characters
+
+        """
+        active = set(rng.choices(range(len(cast)), cum_weights=characterweights, k=rng.randint(2, 5))) & set(mentionable)
+        if not active and len(mentionable):
+            active = {rng.choice(mentionable)}
+        active = sorted(active)
+
+        sentences = []
+        scenewords = 0
+        while scenewords < scenelength and written + scenewords < words:
+            length = rng.randint(4, 18)
+            sentence = [rng.choice(SENTENCE_STARTS)]
+            for word in rng.choices(tokens, cum_weights=cumulative, k=length - 1):
+                if active and rng.random() < mentiondensity:
+                    sentence.append(rng.choice(cast[rng.choice(active)][2])) # A name variant of an active character
+                else:
+                    sentence.append(word)
+            sentences.append(' '.join(sentence) + rng.choice(['.', '.', '.', '!', '?']))
+            scenewords += length
+        paragraphs.append(' '.join(sentences))
+        written += scenewords
+
+    return '\n\n'.join(paragraphs) + '\n'
+
+
+
+def generate_novel(rng, book_id, castsize=20, namevariants=3, words=50000, mentiondensity=0.03, perspective='2', subbooks=3):
+    """ Generates a synthetic novel with its rows for BOOKS_AF, NODES_AF and NAMES_AF
+
+    Arguments:
+        perspective: '1' (first person narrator, character 1), '2' (third person) or '3' (multi-novel with subbooks between
+            [START_..] and [END_..] markers, alternately told by a first person narrator and in the third person)
+        subbooks: number of subbooks of a multi-novel
+
+    Output:
+        (text, bookrow, noderows, namerows)
+
+    """
+
+    cast = make_cast(rng, castsize, namevariants)
+
+    if perspective == '3':
+        parts = []
+        for subbooknr in range(subbooks):
+            narrator = subbooknr % len(cast)
+            if subbooknr % 2 == 0: # First person subbook of one of the main characters
+                marker = book_id + '_' + str(narrator + 1) + '_' + cast[narrator][0]
+                subcast = [cast[narrator]] + cast[:narrator] + cast[narrator+1:]
+                parts.append('[START_' + marker + ']\n' + generate_text(rng, subcast, words // subbooks, mentiondensity, firstperson=True) + '[END_' + marker + ']\n')
+            else:
+                marker = book_id + '_' + str(narrator + 1) + '_pers3'
+                parts.append('[START_' + marker + ']\n' + generate_text(rng, cast, words // subbooks, mentiondensity) + '[END_' + marker + ']\n')
+        text = '\n'.join(parts)
+    else:
+        text = generate_text(rng, cast, words, mentiondensity, firstperson=(perspective == '1'))
+
+    filename = 'synthetic_' + book_id + '.txt'
+    bookrow = [book_id, 'Synthetische roman ' + book_id, 'Auteur, A', rng.choice(['0', '1']), '0', 'Synthetisch', perspective, filename]
+    noderows = [[book_id, str(nr), name, gender] for nr, (name, gender, variants) in enumerate(cast, 1)]
+    namerows = [[book_id, str(nr), name, variant] for nr, (name, gender, variants) in enumerate(cast, 1) for variant in variants]
+
+    return text, bookrow, noderows, namerows
+
+
+
+def generate_corpus(directory, novels, seed=0):
+    """ Writes a synthetic corpus: the texts and BOOKS_AF, NODES_AF and NAMES_AF csv-files that describe them
+
+    Arguments:
+        directory: directory of the corpus (created if it does not exist), the texts are written to directory/texts
+        novels: list of dictionaries with the arguments of generate_novel (castsize, namevariants, words, mentiondensity, perspective, subbooks) per novel
+
+    Output:
+        (bookpath, csvfiles) as in variables_af.py
+
+    """
+
+    rng = random.Random(seed)
+    textdirectory = os.path.join(directory, 'texts')
+    os.makedirs(textdirectory, exist_ok=True)
+    csvfiles = {'books': os.path.join(directory, 'BOOKS_AF.csv'), 'nodes': os.path.join(directory, 'NODES_AF.csv'), 'names': os.path.join(directory, 'NAMES_AF.csv')}
+
+    with open(csvfiles['books'], 'w', newline='') as booksfile, \
+         open(csvfiles['nodes'], 'w', newline='') as nodesfile, \
+         open(csvfiles['names'], 'w', newline='') as namesfile:
+        books = csv.writer(booksfile)
+        nodes = csv.writer(nodesfile)
+        names = csv.writer(namesfile)
+        books.writerow(['book_id', 'title', 'name_author', 'gender_author', 'nationality_author', 'publisher', 'perspective', 'filename'])
+        nodes.writerow(['book_id', 'character_id', 'name', 'gender'])
+        names.writerow(['book_id', 'character_id', 'name', 'name_variant'])
+
+        for book_id, settings in enumerate(novels, 1):
+            text, bookrow, noderows, namerows = generate_novel(rng, str(book_id), **settings)
+            with open(os.path.join(textdirectory, bookrow[7]), 'w') as f:
+                f.write(text)
+            books.writerow(bookrow)
+            nodes.writerows(noderows)
+            names.writerows(namerows)
+
+    return textdirectory, csvfiles
@@ -0,0 +1,206 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import math
+import random
+import networkx as nx
+import numpy as np
+import pytest
+import centrality_af
+from centrality_af import adjacency_matrix, degree_centrality, eigenvector_centrality, katz_centrality, batch_centralities, \
+                          shortest_path_centralities, approximate_shortest_path_centralities, set_betweenness_workers
+
+
+def random_network(rng, n, density, maxweight):
+    """ A connected random network as built by Network.networkx_ranking: nodes, a list of (source, target, weight) and the Graph
+
+    """
+
+    nodes = [str(nr) for nr in range(1, n + 1)]
+    rng.shuffle(nodes)
+    edges = [(nodes[nr], nodes[nr + 1], rng.uniform(0.001, maxweight)) for nr in range(n - 1)] # A path, so the network is connected
+    for i in range(n):
+        for j in range(i + 2, n):
+            if rng.random() < density:
+                edges.append((nodes[i], nodes[j], rng.uniform(0.001, maxweight)))
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_weighted_edges_from(edges)
+    return nodes, edges, graph
+
+
+
+def random_networks():
+    """ 100 random networks of 3 to 60 nodes, with small weights (as the normalized weights of the books) and large weights
+    (for which alpha 0.1 of Katz centrality does not converge)
+
+    """
+
+    rng = random.Random(13)
+    return [random_network(rng, rng.randint(3, 60), rng.choice([0.05, 0.2, 0.5]), rng.choice([0.01, 1.0, 5.0])) for _ in range(100)]
+
+
+NETWORKS = random_networks()
+
+
+def assert_close(scores, expected, tolerance):
+    assert set(scores) == set(expected)
+    for node in expected:
+        assert abs(scores[node] - expected[node]) <= tolerance * max(1.0, abs(expected[node])), (node, scores[node], expected[node])
+
+
+
+
+# 2. EQUIVALENCE WITH NETWORKX
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_degree(network):
+    nodes, edges, graph = network
+    assert_close(degree_centrality(nodes, adjacency_matrix(nodes, edges)), nx.degree_centrality(graph), 1e-15)
+
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_eigenvector(network):
+    nodes, edges, graph = network
+    eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency_matrix(nodes, edges))
+    assert_close(eigenvector_dict, nx.eigenvector_centrality_numpy(graph, weight='weight'), 1e-9)
+
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_katz(network):
+    """ Equal to networkx when alpha 0.1 converges, otherwise alpha is 90% of 1/spectral radius
+
+    """
+
+    nodes, edges, graph = network
+    adjacency = adjacency_matrix(nodes, edges)
+    eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency)
+    katz_dict, alpha = katz_centrality(nodes, adjacency, spectral_radius)
+
+    if 0.1 < 1.0 / spectral_radius:
+        assert alpha == 0.1
+        assert_close(katz_dict, nx.katz_centrality_numpy(graph, alpha=0.1, weight='weight'), 1e-9)
+        assert_close(katz_dict, nx.katz_centrality(graph, weight='weight', max_iter=10000), 1e-5) # Power iteration, as in the networkx engine
+    else:
+        assert math.isclose(alpha, 0.9 / spectral_radius, rel_tol=1e-12)
+        with pytest.raises(nx.PowerIterationFailedConvergence):
+            nx.katz_centrality(graph, weight='weight')
+        assert_close(katz_dict, nx.katz_centrality_numpy(graph, alpha=alpha, weight='weight'), 1e-9)
+
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_betweenness_and_closeness(network):
+    nodes, edges, graph = network
+    betweenness_dict, closeness_dict = shortest_path_centralities(graph, weight='weight')
+    assert_close(betweenness_dict, nx.betweenness_centrality(graph, weight='weight'), 1e-12)
+    assert_close(closeness_dict, nx.closeness_centrality(graph, distance='weight'), 1e-12)
+
+
+
+def test_two_nodes():
+    """ networkx can not compute the eigenvector centrality of two nodes (ARPACK needs more), the sparse engine can
+
+    """
+
+    nodes, edges = ['1', '2'], [('1', '2', 0.3)]
+    eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency_matrix(nodes, edges))
+    assert_close(eigenvector_dict, dict.fromkeys(nodes, 1 / math.sqrt(2)), 1e-12)
+    assert math.isclose(spectral_radius, 0.3)
+
+
+
+def test_large_network():
+    """ Networks larger than DENSE_LIMIT are solved with the sparse eigensolver and a sparse solve
+
+    """
+
+    nodes, edges, graph = random_network(random.Random(14), centrality_af.DENSE_LIMIT + 100, 0.01, 0.01)
+    adjacency = adjacency_matrix(nodes, edges)
+    eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency)
+    assert_close(eigenvector_dict, nx.eigenvector_centrality_numpy(graph, weight='weight'), 1e-9)
+    katz_dict, alpha = katz_centrality(nodes, adjacency, spectral_radius)
+    assert alpha == 0.1
+    assert_close(katz_dict, nx.katz_centrality_numpy(graph, alpha=0.1, weight='weight'), 1e-9)
+
+
+
+def test_disconnected_eigenvector():
+    """ networkx raises on a disconnected network, the sparse engine returns the eigenvector of the component with the
+    largest eigenvalue (the other components get 0)
+
+    """
+
+    rng = random.Random(15)
+    nodes1, edges1, graph1 = random_network(rng, 8, 0.5, 1.0)
+    nodes2 = [str(nr) for nr in range(101, 106)]
+    edges2 = [(nodes2[nr], nodes2[nr + 1], 0.01) for nr in range(len(nodes2) - 1)] # A path with small weights, so a smaller eigenvalue
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes1 + nodes2)
+    graph.add_weighted_edges_from(edges1 + edges2)
+
+    with pytest.raises(nx.AmbiguousSolution):
+        nx.eigenvector_centrality_numpy(graph, weight='weight')
+
+    eigenvector_dict, spectral_radius = eigenvector_centrality(nodes1 + nodes2, adjacency_matrix(nodes1 + nodes2, edges1 + edges2))
+    assert math.isclose(np.linalg.norm(list(eigenvector_dict.values())), 1.0)
+    assert_close({node: eigenvector_dict[node] for node in nodes1}, nx.eigenvector_centrality_numpy(graph1, weight='weight'), 1e-9)
+    assert_close({node: eigenvector_dict[node] for node in nodes2}, dict.fromkeys(nodes2, 0.0), 1e-9)
+
+
+
+
+# 3. BATCHES, WORKERS AND APPROXIMATION
+
+def test_batch_centralities():
+    """ The centralities of all networks at once equal those per network
+
+    """
+
+    batch = batch_centralities([(nodes, edges) for nodes, edges, graph in NETWORKS])
+    for (nodes, edges, graph), centralities in zip(NETWORKS, batch):
+        adjacency = adjacency_matrix(nodes, edges)
+        eigenvector_dict, spectral_radius = eigenvector_centrality(nodes, adjacency)
+        katz_dict, alpha = katz_centrality(nodes, adjacency, spectral_radius)
+        assert_close(centralities['degree'], degree_centrality(nodes, adjacency), 1e-15)
+        assert_close(centralities['eigenvector'], eigenvector_dict, 1e-9)
+        assert_close(centralities['katz'], katz_dict, 1e-9)
+        assert math.isclose(centralities['alpha'], alpha, rel_tol=1e-9)
+
+
+
+def test_worker_processes():
+    """ Betweenness and closeness divided among worker processes equal those of one process
+
+    """
+
+    for nodes, edges, graph in NETWORKS[:5]:
+        expected = shortest_path_centralities(graph, weight='weight')
+        workers, threshold = centrality_af.betweenness_workers, centrality_af.betweenness_threshold
+        set_betweenness_workers(2, 1)
+        try:
+            betweenness_dict, closeness_dict = shortest_path_centralities(graph, weight='weight')
+        finally:
+            set_betweenness_workers(workers, threshold)
+        assert_close(betweenness_dict, expected[0], 1e-12)
+        assert_close(closeness_dict, expected[1], 1e-12)
+
+
+
+def test_approximation_of_all_nodes():
+    """ A sample of all nodes gives the exact scores, with errors 0
+
+    """
+
+    nodes, edges, graph = max(NETWORKS, key=lambda network: len(network[0]))
+    betweenness_dict, closeness_dict, betweenness_error, closeness_error, sample_size = approximate_shortest_path_centralities(graph, sample_size=len(nodes))
+    assert sample_size == len(nodes)
+    assert_close(betweenness_dict, nx.betweenness_centrality(graph, weight='weight'), 1e-12)
+    assert_close(closeness_dict, nx.closeness_centrality(graph, distance='weight'), 1e-12)
+    assert set(betweenness_error.values()) == {0.0}
+    assert set(closeness_error.values()) == {0.0}
@@ -0,0 +1,76 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import os
+from results_af import ResultsStore, load_rankings
+
+
+def rows_of_book(book_id, score):
+    """ Rows as returned by Network.rankings_rows, with every centrality set to score
+
+    """
+
+    return [[book_id, character_id, 'naam ' + character_id, '1', score, score, score, score, score, '2', 'corpus_ES-1960s'] for character_id in ('1', '2', '3')]
+
+
+
+# 2. RERUNS
+
+def test_rerun_replaces_rows(tmp_path):
+    """ A second run into the same database replaces the rows of its books, without an IntegrityError
+
+    """
+
+    path = os.path.join(str(tmp_path), 'rankings.db')
+
+    store = ResultsStore(path)
+    store.add_book('1', rows_of_book('1', 0.1))
+    store.add_book('2', rows_of_book('2', 0.2))
+    store.close()
+
+    store = ResultsStore(path) # The rerun
+    store.add_book('1', rows_of_book('1', 0.5))
+    store.close()
+
+    rankings = load_rankings(path)
+    assert len(rankings) == 6
+    assert sorted(rankings[rankings['book_id'] == '1']['degree']) == [0.5, 0.5, 0.5]
+    assert sorted(rankings[rankings['book_id'] == '2']['degree']) == [0.2, 0.2, 0.2]
+
+
+
+def test_duplicate_rows_of_a_book(tmp_path):
+    """ Rows of a character that occur twice (e.g. read from a csv-file to which a book was appended twice) keep the last row
+
+    """
+
+    path = os.path.join(str(tmp_path), 'rankings.db')
+
+    store = ResultsStore(path, buffersize=1)
+    store.add_book('1', rows_of_book('1', 0.1) + rows_of_book('1', 0.3))
+    store.add_book('1', rows_of_book('1', 0.4)) # Added again after a flush
+    store.close()
+
+    rankings = load_rankings(path, ['1'])
+    assert len(rankings) == 3
+    assert list(rankings['degree']) == [0.4, 0.4, 0.4]
+
+
+
+def test_rows_read_from_csv(tmp_path):
+    """ Rows of strings (e.g. from the done/ files of a work queue) are stored with the types of the schema
+
+    """
+
+    path = os.path.join(str(tmp_path), 'rankings.db')
+
+    store = ResultsStore(path)
+    store.add_book('7', [[str(value) for value in row] for row in rows_of_book('7', 0.25)])
+    store.close()
+
+    rankings = load_rankings(path)
+    assert list(rankings['katz']) == [0.25, 0.25, 0.25]
+    assert list(rankings['character_id']) == ['1', '2', '3']
@@ -0,0 +1,203 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+
+
+# 2. CLASS SENTENCECACHE
+
+class SentenceCache:
+
+    """ An on-disk cache of tokenized texts (Book.markedtext_sentences), so that reruns can skip the tokenization of unchanged books
+
+    Every entry is stored in its own file, named after the SHA-256 hash of the tokenizer (see tokenizer_fingerprint in tokenizer_af.py) and the marked text (content-addressed).
+    An entry file consists of a fixed header followed by the zlib-compressed sentences (UTF-8, separated by newlines):
+
+        magic (4 bytes) | version (2 bytes) | number of sentences (4 bytes) | length of payload (4 bytes) | CRC32 of payload (4 bytes) | key (32 bytes) | payload
+
+    Entries that do not verify (wrong magic, version, key, length, checksum or number of sentences) are removed and treated as missing.
+    When the cache grows beyond max_bytes, the least recently used entries are removed.
+
+    Attributes:
+        directory: A string representing the directory in which the entries are stored
+        max_bytes: An integer representing the maximum total size of all entries in bytes
+        hits: An integer representing the number of texts found in the cache
+        misses: An integer representing the number of texts not found in the cache
+    """
+
+    magic = b'AFTS'
+    version = 1 # Increase when the way Book.tokenize_text post-processes sentences changes
+    header = struct.Struct('>4sHIII32s')
+    suffix = '.sentences'
+
+    def __init__(self, directory, max_bytes=1024**3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+
+
+    def key(self, text, tokenizer):
+        """ Returns the key (SHA-256 digest) of a text tokenized with a tokenizer, given by its fingerprint (the Ucto version
+        and the contents of its configuration, see tokenizer_fingerprint in tokenizer_af.py)
+
+        """
+
+        digest = hashlib.sha256()
+        digest.update(tokenizer.encode('utf-8'))
+        digest.update(b'\0' + str(self.version).encode('ascii') + b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.digest()
+
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key.hex() + self.suffix)
+
+
+
+    def get(self, text, tokenizer):
+        """ Returns the cached list of sentences of a text, or None if it is not in the cache
+
+        """
+
+        key = self.key(text, tokenizer)
+        path = self.path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            self.misses += 1
+            return None
+
+        sentences = self.decode(data, key)
+        if sentences is None:
+            print ('Removing corrupt entry from sentence cache:', path)
+            self.remove(path)
+            self.misses += 1
+            return None
+
+        os.utime(path) # Mark entry as recently used
+        self.hits += 1
+        return sentences
+
+
+
+    def put(self, text, tokenizer, sentences):
+        """ Stores the list of sentences of a text in the cache, and evicts old entries if the cache has become too large
+
+        """
+
+        key = self.key(text, tokenizer)
+        data = self.encode(sentences, key)
+
+        fd, temppath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temppath, self.path(key)) # Atomic, so parallel tasks never read a half-written entry
+        except:
+            self.remove(temppath)
+            raise
+
+        self.evict()
+
+
+
+    def encode(self, sentences, key):
+        for sentence in sentences:
+            if '\n' in sentence:
+                raise ValueError('sentences in the cache can not contain newlines')
+        payload = zlib.compress('\n'.join(sentences).encode('utf-8'))
+        return self.header.pack(self.magic, self.version, len(sentences), len(payload), zlib.crc32(payload), key) + payload
+
+
+
+    def decode(self, data, key):
+        """ Returns the list of sentences stored in data, or None if data does not verify
+
+        """
+
+        if len(data) < self.header.size:
+            return None
+        magic, version, nr_of_sentences, length, checksum, storedkey = self.header.unpack_from(data)
+        payload = data[self.header.size:]
+        if magic != self.magic or version != self.version or storedkey != key or length != len(payload) or checksum != zlib.crc32(payload):
+            return None
+        try:
+            text = zlib.decompress(payload).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError):
+            return None
+        sentences = text.split('\n') if nr_of_sentences else []
+        if len(sentences) != nr_of_sentences:
+            return None
+        return sentences
+
+
+
+    def evict(self):
+        """ Removes the least recently used entries until the total size of the cache is at most max_bytes
+
+        """
+
+        entries = []
+        totalsize = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue # Removed by another task in the meantime
+            entries.append((stat.st_mtime, stat.st_size, path))
+            totalsize += stat.st_size
+
+        for mtime, size, path in sorted(entries):
+            if totalsize <= self.max_bytes:
+                break
+            self.remove(path)
+            totalsize -= size
+
+
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+
+    def report(self):
+        return 'Sentence cache (' + self.directory + '): ' + str(self.hits) + ' hit(s), ' + str(self.misses) + ' miss(es)'
+
+
+
+
+# 3. PROCESS-LEVEL CACHE
+
+sentence_cache = None
+
+
+def set_sentence_cache(cache):
+    """ Sets the SentenceCache used by Book.tokenize_text (None disables the cache)
+
+    """
+
+    global sentence_cache
+    sentence_cache = cache
+
+
+def get_sentence_cache():
+    return sentence_cache
@@ -0,0 +1,241 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import hashlib
+import importlib.metadata
+import os
+import sys
+import threading
+import time
+import ucto
+
+
+# Directories in which Ucto looks for a configuration that is not given as a path, in this order
+UCTO_CONFIGURATION_DIRECTORIES = [os.path.join(os.environ.get('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config')), 'ucto'),
+                                  os.path.join(sys.prefix, 'share', 'ucto'),
+                                  '/usr/local/share/ucto',
+                                  '/usr/share/ucto']
+
+
+# 2. CLASS TOKENIZERPOOL
+
+class TokenizerPool:
+
+    """ A pool of Ucto tokenizers which are reused for all Book objects in a run, so that the configuration is loaded only once per tokenizer
+
+    A tokenizer is taken from the pool for every text and put back afterwards. When all tokenizers are in use
+    (by other threads), a new one is created. Every process has its own pool, see get_tokenizer_pool().
+
+    Attributes:
+        configurationfile: A string representing the Ucto configuration (e.g. 'tokconfig-nld')
+        idle: A list of tokenizers that are not in use
+        nr_of_tokenizers: An integer representing the number of tokenizers created by the pool
+        nr_of_texts: An integer representing the number of texts tokenized with the pool
+        setup_time: A float representing the seconds spent on creating tokenizers (loading the configuration)
+        tokenize_time: A float representing the seconds spent on tokenizing texts
+    """
+
+    def __init__(self, configurationfile="tokconfig-nld"):
+        self.configurationfile = configurationfile
+        self.idle = []
+        self.lock = threading.Lock()
+        self.nr_of_tokenizers = 0
+        self.nr_of_texts = 0
+        self.setup_time = 0.0
+        self.tokenize_time = 0.0
+
+
+
+    def acquire(self):
+        """ Takes a tokenizer from the pool, or creates a new one if none is available
+
+        """
+
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+
+        starttime = time.perf_counter()
+        tokenizer = ucto.Tokenizer(self.configurationfile) # Loading the configuration is the expensive part
+        setup_time = time.perf_counter() - starttime
+
+        with self.lock:
+            self.nr_of_tokenizers += 1
+            self.setup_time += setup_time
+
+        return tokenizer
+
+
+
+    def release(self, tokenizer):
+        """ Puts a tokenizer back in the pool
+
+        """
+
+        with self.lock:
+            self.idle.append(tokenizer)
+
+
+
+    def sentences(self, text):
+        """ Tokenizes text with a tokenizer from the pool
+
+        Output:
+            a list of strings, each string represents a sentence as returned by Ucto
+
+        """
+
+        tokenizer = self.acquire()
+        try:
+            starttime = time.perf_counter()
+            tokenizer.process(text)
+            sentences = list(tokenizer.sentences()) # Read all sentences, so the tokenizer is empty before it is reused
+            tokenize_time = time.perf_counter() - starttime
+        except:
+            tokenizer = None # Do not reuse a tokenizer in an unknown state
+            raise
+        finally:
+            if tokenizer is not None:
+                self.release(tokenizer)
+
+        with self.lock:
+            self.nr_of_texts += 1
+            self.tokenize_time += tokenize_time
+
+        return sentences
+
+
+
+    def stats(self):
+        """ Returns the statistics of the pool as a dictionary, e.g. to send them from a worker process to the main process
+
+        """
+
+        with self.lock:
+            return {'pid': os.getpid(), 'nr_of_tokenizers': self.nr_of_tokenizers, 'nr_of_texts': self.nr_of_texts, 'setup_time': self.setup_time, 'tokenize_time': self.tokenize_time}
+
+
+
+    def add_stats(self, stats):
+        """ Adds the statistics of another pool (see stats()) to this pool, e.g. to report on all worker processes at once
+
+        """
+
+        with self.lock:
+            self.nr_of_tokenizers += stats['nr_of_tokenizers']
+            self.nr_of_texts += stats['nr_of_texts']
+            self.setup_time += stats['setup_time']
+            self.tokenize_time += stats['tokenize_time']
+
+
+
+    def report(self):
+        """ Returns a string reporting how long the setup of the tokenizers took compared with tokenizing
+
+        """
+
+        return ('Ucto (' + self.configurationfile + '): ' + str(self.nr_of_tokenizers) + ' tokenizer(s) set up in ' + '%.2f' % self.setup_time + 's, ' +
+                str(self.nr_of_texts) + ' text(s) tokenized in ' + '%.2f' % self.tokenize_time + 's')
+
+
+
+
+# 3. PROCESS-LEVEL POOLS
+
+tokenizer_pools = {} # (process id, configurationfile) as key, TokenizerPool as value
+tokenizer_pools_lock = threading.Lock()
+
+
+def get_tokenizer_pool(configurationfile="tokconfig-nld"):
+    """ Returns the TokenizerPool of the current process for a configuration
+
+    The process id is part of the key, so that processes started with fork (e.g. by multiprocessing)
+    create their own tokenizers instead of sharing the ones of their parent
+
+    """
+
+    key = (os.getpid(), configurationfile)
+    with tokenizer_pools_lock:
+        if not key in tokenizer_pools:
+            tokenizer_pools[key] = TokenizerPool(configurationfile)
+        return tokenizer_pools[key]
+
+
+
+
+# 4. TOKENIZER FINGERPRINT
+
+def find_configuration(configurationfile):
+    """ Returns the path of an Ucto configuration as Ucto finds it (the path itself, or the file in one of UCTO_CONFIGURATION_DIRECTORIES),
+    or None if it is not found
+
+    """
+
+    if os.path.isfile(configurationfile):
+        return configurationfile
+    for directory in UCTO_CONFIGURATION_DIRECTORIES:
+        path = os.path.join(directory, configurationfile)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+
+def configuration_files(path):
+    """ Returns the configuration file and the files that it includes ('%include name', the files name.* next to it)
+
+    """
+
+    names = set()
+    with open(path, 'rt', errors='replace') as f:
+        for line in f:
+            if line.startswith('%include'):
+                parts = line.split()
+                if len(parts) > 1:
+                    names.add(parts[1])
+
+    directory = os.path.dirname(os.path.abspath(path))
+    files = [path]
+    for filename in sorted(os.listdir(directory)):
+        filepath = os.path.join(directory, filename)
+        if os.path.isfile(filepath) and (filename in names or filename.split('.')[0] in names):
+            files.append(filepath)
+    return files
+
+
+
+def ucto_version():
+    try:
+        return importlib.metadata.version('python-ucto')
+    except importlib.metadata.PackageNotFoundError:
+        return str(getattr(ucto, '__version__', 'unknown'))
+
+
+
+tokenizer_fingerprints = {} # configurationfile as key, fingerprint as value
+
+
+def tokenizer_fingerprint(configurationfile="tokconfig-nld"):
+    """ Returns a fingerprint of the tokenizer: the name of the configuration with the SHA-256 of the version of Ucto
+    and of the contents of the configuration file and the files it includes. The sentences in a SentenceCache are keyed
+    by it, so they are not reused after an upgrade of Ucto or of its configuration. Computed once per process.
+
+    """
+
+    if not configurationfile in tokenizer_fingerprints:
+        digest = hashlib.sha256()
+        digest.update(('ucto ' + ucto_version() + '\0').encode('utf-8'))
+        path = find_configuration(configurationfile)
+        if path is None:
+            print ('Ucto configuration', configurationfile, 'not found, cached sentences are only keyed by its name and the version of Ucto')
+        else:
+            for filepath in configuration_files(path):
+                digest.update(os.path.basename(filepath).encode('utf-8') + b'\0')
+                with open(filepath, 'rb') as f:
+                    digest.update(f.read())
+                digest.update(b'\0')
+        tokenizer_fingerprints[configurationfile] = configurationfile + ':' + digest.hexdigest()
+    return tokenizer_fingerprints[configurationfile]
@@ -0,0 +1,350 @@
+# #!/usr/bin/env python
+
+# # -*- coding: utf-8 -*-
+
+# 1. IMPORTS
+
+import copy
+import csv
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from corpus_af import compute_book, estimate_cost
+
+
+# 2. CLASS WORKQUEUE
+
+class WorkQueue:
+
+    """ A work queue in a shared directory, so that several machines (nodes) can compute the books of the corpus together
+
+    Every book is a work item. A node claims a book by creating a lease file, which it keeps alive with heartbeats
+    while it computes the book. Leases that are not renewed within lease_timeout seconds (e.g. because a node crashed)
+    expire and can be claimed by another node. Failed books are retried until max_attempts is reached; an expired lease
+    counts as a failed attempt as well, so a book that crashes every node that computes it is given up too.
+    The rows of every finished book are written to their own file, so a crashed run resumes without recomputing them.
+
+    Layout of the directory:
+        leases/<book_id>.lease: the book is being computed by the node in the file (mtime = last heartbeat)
+        done/<book_id>.csv: the rows of a finished book
+        done/<book_id>.errors.csv: the standard errors of the approximate scores of a finished book (see Network.error_rows)
+        failed/<book_id>.<attempt>.txt: the error of a failed attempt (or the lease of an attempt that expired)
+
+    Attributes:
+        directory: A string representing the shared directory of the queue
+        node: A string representing the name of this node (hostname:pid)
+        lease_timeout: A number representing the seconds after which a lease without heartbeat expires
+        heartbeat: A number representing the seconds between two heartbeats
+        max_attempts: An integer representing how often a book is tried before it is given up
+        poll: A number representing the seconds to wait before looking for work again when all open books are leased
+    """
+
+    def __init__(self, directory, lease_timeout=600, heartbeat=60, max_attempts=3, poll=30):
+        self.directory = directory
+        self.node = socket.gethostname() + ':' + str(os.getpid())
+        self.lease_timeout = lease_timeout
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self.poll = poll
+        for subdirectory in ('leases', 'done', 'failed'):
+            os.makedirs(os.path.join(self.directory, subdirectory), exist_ok=True)
+
+
+
+    def lease_path(self, book_id):
+        return os.path.join(self.directory, 'leases', book_id + '.lease')
+
+    def done_path(self, book_id):
+        return os.path.join(self.directory, 'done', book_id + '.csv')
+
+    def errors_path(self, book_id):
+        return os.path.join(self.directory, 'done', book_id + '.errors.csv')
+
+
+
+    def is_done(self, book_id):
+        return os.path.exists(self.done_path(book_id))
+
+    def attempts(self, book_id):
+        """ Returns the number of failed attempts of a book
+
+        """
+        prefix = book_id + '.'
+        return sum(1 for filename in os.listdir(os.path.join(self.directory, 'failed')) if filename.startswith(prefix))
+
+    def is_given_up(self, book_id):
+        return self.attempts(book_id) >= self.max_attempts
+
+    def is_leased(self, book_id):
+        """ Returns True if the book has a lease which has not expired
+
+        """
+        try:
+            return time.time() - os.path.getmtime(self.lease_path(book_id)) < self.lease_timeout
+        except OSError:
+            return False
+
+
+
+    def claim(self, book_ids):
+        """ Claims the first book in book_ids that is not done, not given up and not leased by another node
+
+        Output:
+            book_id of the claimed book, or None if no book can be claimed now
+
+        """
+
+        for book_id in book_ids:
+            if self.is_done(book_id) or self.is_given_up(book_id):
+                continue
+
+            path = self.lease_path(book_id)
+            if os.path.exists(path):
+                if self.is_leased(book_id):
+                    continue
+                expiredpath = path + '.expired.' + self.node
+                try:
+                    os.rename(path, expiredpath) # Only one node can move the expired lease away
+                    expired = time.time() - os.path.getmtime(expiredpath) >= self.lease_timeout # Checked on the moved file itself
+                except OSError:
+                    continue
+                if not expired: # Another node renewed or claimed the lease between the check and the rename, so it is put back
+                    try:
+                        os.link(expiredpath, path) # Fails if yet another node has created a lease in the meantime
+                    except OSError:
+                        pass
+                    self.remove(expiredpath)
+                    continue
+                try:
+                    with open(expiredpath, 'rt') as f:
+                        lease = f.read()
+                except OSError:
+                    lease = ''
+                self.remove(expiredpath)
+                self.record_failure(book_id, 'lease expired (the node may have crashed):\n' + lease)
+                if self.is_given_up(book_id):
+                    print ('Lease on book', book_id, 'expired, giving it up after', self.attempts(book_id), 'attempts')
+                    continue
+                print ('Lease on book', book_id, 'expired, claiming it again')
+
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY) # Atomic: fails if another node created the lease first
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'node': self.node, 'claimed': time.time(), 'attempt': self.attempts(book_id) + 1}, f)
+
+            if self.is_done(book_id): # Finished by another node between the check above and the lease
+                self.remove(path)
+                continue
+
+            return book_id
+
+        return None
+
+
+
+    def complete(self, book_id, rows, errorrows=None):
+        """ Writes the rows of a finished book (and the standard errors of its approximate scores, if any) and releases its lease
+
+        Writing the same book twice (e.g. by a node whose lease had expired) gives the same file, so this is idempotent
+
+        """
+
+        if errorrows: # Before the rows, so that a book that is done has its errors as well
+            fd, temppath = tempfile.mkstemp(dir=os.path.join(self.directory, 'done'), suffix='.tmp')
+            with os.fdopen(fd, 'w', newline='') as f:
+                csv.writer(f).writerows(errorrows)
+            os.replace(temppath, self.errors_path(book_id))
+
+        fd, temppath = tempfile.mkstemp(dir=os.path.join(self.directory, 'done'), suffix='.tmp')
+        with os.fdopen(fd, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        os.replace(temppath, self.done_path(book_id))
+        self.release(book_id)
+
+
+
+    def fail(self, book_id, error):
+        """ Records a failed attempt of a book and releases its lease, so that it can be retried
+
+        """
+
+        self.record_failure(book_id, error)
+        self.release(book_id)
+
+
+
+    def record_failure(self, book_id, error):
+        """ Writes the error of a failed attempt of a book to failed/, where the attempts of every book are counted
+
+        The file is created atomically, so when two nodes record a failure of the same book at the same time,
+        the second one takes the next attempt number instead of overwriting the file of the first
+
+        """
+
+        attempt = self.attempts(book_id) + 1
+        while True:
+            try:
+                fd = os.open(os.path.join(self.directory, 'failed', book_id + '.' + str(attempt) + '.txt'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                attempt += 1
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.node + '\n' + error)
+
+
+
+    def holds_lease(self, book_id):
+        """ Returns True if the lease of a book exists and belongs to this node
+
+        """
+
+        try:
+            with open(self.lease_path(book_id), 'rt') as f:
+                lease = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return lease.get('node') == self.node
+
+
+
+    def release(self, book_id):
+        """ Removes the lease of a book, but only if this node holds it: when the lease of this node had expired,
+        the book may have been claimed by another node, whose lease is left alone
+
+        """
+
+        if self.holds_lease(book_id):
+            self.remove(self.lease_path(book_id))
+
+
+
+    def keep_alive(self, book_id, stop):
+        """ Renews the lease of a book every self.heartbeat seconds until stop (a threading.Event) is set
+
+        The heartbeat stops when the lease does not belong to this node anymore (it expired and another node claimed the book),
+        so that it does not keep the lease of the other node alive
+
+        """
+
+        while not stop.wait(self.heartbeat):
+            if not self.holds_lease(book_id):
+                print ('Lease on book', book_id, 'is not held by node', self.node, 'anymore, its heartbeat stops')
+                return
+            try:
+                os.utime(self.lease_path(book_id))
+            except OSError:
+                pass
+
+
+
+    def is_finished(self, book_ids):
+        """ Returns True if every book is done or given up
+
+        """
+
+        for book_id in book_ids:
+            if not (self.is_done(book_id) or self.is_given_up(book_id)):
+                return False
+        return True
+
+
+
+    def run(self, allbooks, bookpath):
+        """ Claims and computes books until every book of allbooks is done or given up
+
+        Books are claimed in order of estimated cost (longest first). When all open books are leased by
+        other nodes, the node waits, because their leases may expire.
+
+        """
+
+        book_ids = sorted(allbooks, key=lambda book_id: estimate_cost(allbooks[book_id], bookpath), reverse=True)
+
+        while True:
+            book_id = self.claim(book_ids)
+
+            if book_id is None:
+                if self.is_finished(book_ids):
+                    break
+                time.sleep(self.poll)
+                continue
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self.keep_alive, args=(book_id, stop), daemon=True)
+            heartbeat.start()
+            try:
+                rows, errorrows = compute_book(copy.deepcopy(allbooks[book_id]), bookpath) # A copy, so a retry on this node starts from a clean Book object
+            except KeyboardInterrupt:
+                self.release(book_id)
+                raise
+            except BaseException: # Also catches exit() in the computation of a book
+                print ('Computing book', book_id, 'failed on node', self.node)
+                self.fail(book_id, traceback.format_exc())
+                continue
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            self.complete(book_id, rows, errorrows)
+
+
+
+    def merge(self, book_ids, csvfile, results=None, errorsfile=None):
+        """ Writes the rows of all finished books to csvfile, in the order of book_ids, and adds them to results
+        (a ResultsStore, see results_af.py) if given. The standard errors of approximate scores are written to errorsfile if given.
+
+        Output:
+            missing: list of book_id's that are not done (given up)
+
+        """
+
+        missing = []
+        fd, temppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csvfile)), suffix='.tmp')
+        with os.fdopen(fd, 'w', newline='') as f:
+            for book_id in book_ids:
+                if not self.is_done(book_id):
+                    missing.append(book_id)
+                    continue
+                with open(self.done_path(book_id), 'rt', newline='') as bookfile:
+                    rows = bookfile.read()
+                f.write(rows)
+                if results is not None:
+                    results.add_book(book_id, [line for line in csv.reader(rows.splitlines()) if line])
+        os.replace(temppath, csvfile)
+
+        if errorsfile is not None:
+            fd, temppath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(errorsfile)), suffix='.tmp')
+            with os.fdopen(fd, 'w', newline='') as f:
+                for book_id in book_ids:
+                    if self.is_done(book_id) and os.path.exists(self.errors_path(book_id)):
+                        with open(self.errors_path(book_id), 'rt', newline='') as bookfile:
+                            f.write(bookfile.read())
+            os.replace(temppath, errorsfile)
+
+        return missing
+
+
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+
+def run_queue_worker(arguments):
+    """ Runs a WorkQueue in a worker process (for several workers on one node), every worker process is a node of its own
+
+    Arguments:
+        (directory, settings, allbooks, bookpath), with settings a dictionary of keyword arguments for WorkQueue
+
+    """
+
+    directory, settings, allbooks, bookpath = arguments
+    WorkQueue(directory, **settings).run(allbooks, bookpath)